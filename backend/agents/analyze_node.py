@@ -4,7 +4,10 @@ import re
 
 try:
     from backend.services.llm import get_llm, ANALYZE_PROMPT_VERSION
-    from backend.services.cache import cache_get, cache_set
+    from backend.services.cache import cache_get, cache_set, make_cache_key
+    from backend.services.singleflight import get_singleflight
+    from backend.services.metrics import span
+    from backend.agents.email_segments import llm_email_text, split_email
     from backend.agents.heuristics import (
         extract_due_date,
         extract_urgency,
@@ -12,10 +15,14 @@ try:
         extract_parties,
         extract_questions,
         refine_topic,
+        scan_text,
     )
 except ModuleNotFoundError:
     from services.llm import get_llm, ANALYZE_PROMPT_VERSION
-    from services.cache import cache_get, cache_set
+    from services.cache import cache_get, cache_set, make_cache_key
+    from services.singleflight import get_singleflight
+    from services.metrics import span
+    from agents.email_segments import llm_email_text, split_email
     from agents.heuristics import (
         extract_due_date,
         extract_urgency,
@@ -23,10 +30,13 @@ except ModuleNotFoundError:
         extract_parties,
         extract_questions,
         refine_topic,
+        scan_text,
     )
 
 logger = logging.getLogger(__name__)
 
+_FLIGHT = get_singleflight("analysis")
+
 
 async def analyze_email_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -36,8 +46,10 @@ async def analyze_email_node(state: Dict[str, Any]) -> Dict[str, Any]:
     email_text = state["email_text"]
     debug = state.get("debug", False)
 
-    cache_key = f"analysis:v{ANALYZE_PROMPT_VERSION}:{hash(email_text)}"
-    cached = cache_get(cache_key)
+    cache_key = make_cache_key("analysis", ANALYZE_PROMPT_VERSION, email_text)
+    with span("analyze.cache_lookup") as tags:
+        cached = cache_get(cache_key)
+        tags["cache"] = "hit" if cached else "miss"
     if cached:
         if debug:
             state.setdefault("trace", []).append({"node": "analyze_email", "cached": True})
@@ -61,12 +73,22 @@ async def analyze_email_node(state: Dict[str, Any]) -> Dict[str, Any]:
         "Return JSON ONLY with keys: intent, primary_topic, parties{client,counterparty}, agreement_reference{type,date}, questions[], requested_due_date, urgency_level."
     )
 
-    # We keep reasoning out of the final response. The LLM wrapper handles safe JSON extraction.
-    result = await llm.structured_json(prompt=prompt, email_text=email_text)
-    # Normalize to API schema (strings with empty defaults, objects for parties and agreement)
-    normalized = _normalize_analysis(result, email_text=email_text)
-
-    cache_set(cache_key, normalized, ttl_seconds=60 * 60)
+    async def _analyze() -> Dict[str, Any]:
+        # We keep reasoning out of the final response. The LLM wrapper handles safe JSON extraction.
+        # Newest message within the token budget; quoted history and disclaimers mostly dropped
+        with span("analyze.segment"):
+            llm_input = llm_email_text(email_text)
+        with span("analyze.llm"):
+            result = await llm.structured_json(prompt=prompt, email_text=llm_input)
+        # Normalize to API schema (strings with empty defaults, objects for parties and agreement)
+        with span("analyze.normalize"):
+            normalized = _normalize_analysis(result, email_text=email_text)
+        with span("analyze.cache_write"):
+            cache_set(cache_key, normalized, ttl_seconds=60 * 60)
+        return normalized
+
+    # Identical concurrent requests share one LLM call
+    normalized = await _FLIGHT.do(cache_key, _analyze)
 
     if debug:
         state.setdefault("trace", []).append({"node": "analyze_email", "output": normalized})
@@ -76,6 +98,8 @@ async def analyze_email_node(state: Dict[str, Any]) -> Dict[str, Any]:
 
 def _normalize_analysis(data: Dict[str, Any], email_text: str | None = None) -> Dict[str, Any]:
     out: Dict[str, Any] = {}
+    # Heuristics read the newest message and its signature, not quoted replies or disclaimers
+    email_text = split_email(email_text).message if email_text else email_text
     # Intent mapping to our preferred labels, but expose as free string
     raw_intent = str((data.get("intent") or "")).strip().lower()
     intent_map = {
@@ -102,8 +126,8 @@ def _normalize_analysis(data: Dict[str, Any], email_text: str | None = None) ->
 
     # Primary topic refined generically
     topic = data.get("primary_topic") or ""
-    et = (email_text or "").lower()
-    out["primary_topic"] = refine_topic(et, topic)
+    scan = scan_text(email_text or "")
+    out["primary_topic"] = refine_topic(email_text or "", topic)
 
     # Parties: override with heuristic extraction (ignore LLM hallucinations)
     raw_client = ""
@@ -135,7 +159,7 @@ def _normalize_analysis(data: Dict[str, Any], email_text: str | None = None) ->
         else:
             atype = token
     # If email mentions MSA and atype empty, fill
-    if not atype and "msa" in et:
+    if not atype and "msa" in scan.hits:
         atype = "MSA"
     out["agreement_reference"] = {"type": atype, "date": adate}
 
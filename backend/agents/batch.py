@@ -0,0 +1,229 @@
+"""Bulk triage: run the pipeline over a stream of JSONL email records.
+
+Each input record is a JSON object with "email_text" and optional "id" and
+"contract_snippet" (a line may also be passed unparsed). Identical emails are
+processed once and the result is shared, as long as the earlier run is still
+in flight or among the last `window` distinct runs; an older repeat runs the
+pipeline again (and usually hits the analysis/draft caches). At most
+`concurrency` pipelines run at a time, and at most `window` records are in
+flight or waiting to be emitted, so memory stays bounded however long the
+input is.
+
+run_batch yields one NDJSON-ready dict per input record, in input order or in
+completion order, followed by a final {"summary": {...}} record with
+throughput and per-stage latency.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Union
+
+try:
+    from backend.services.cache import make_cache_key
+except ModuleNotFoundError:
+    from services.cache import make_cache_key
+
+from .graph import run_pipeline
+
+logger = logging.getLogger(__name__)
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "64"))
+ORDERS = ("input", "completion")
+
+Record = Union[str, bytes, Dict[str, Any]]
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _latency_summary(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50": round(_percentile(values, 50), 3),
+        "p95": round(_percentile(values, 95), 3),
+        "max": round(values[-1], 3) if values else 0.0,
+    }
+
+
+class BatchStats:
+    """Counters and latency samples for one batch run."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.items = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.pipeline_ms: List[float] = []
+        self.stage_ms: Dict[str, List[float]] = {}
+
+    def record_run(self, elapsed_ms: float, timings: Optional[Dict[str, float]]) -> None:
+        self.pipeline_ms.append(elapsed_ms)
+        for stage, ms in (timings or {}).items():
+            self.stage_ms.setdefault(stage, []).append(ms)
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "items": self.items,
+            "unique": len(self.pipeline_ms),
+            "duplicates": self.duplicates,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(self.items / elapsed, 2) if elapsed > 0 else 0.0,
+            "pipeline_ms": _latency_summary(self.pipeline_ms),
+            "stages_ms": {stage: _latency_summary(v) for stage, v in sorted(self.stage_ms.items())},
+        }
+
+
+def _parse(record: Record) -> Dict[str, Any]:
+    if isinstance(record, (str, bytes)):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError("record must be a JSON object")
+    email_text = record.get("email_text")
+    if not isinstance(email_text, str) or not email_text.strip():
+        raise ValueError("'email_text' must be a non-empty string")
+    return record
+
+
+async def _aiter(records: Union[Iterable[Record], AsyncIterator[Record]]) -> AsyncIterator[Record]:
+    if hasattr(records, "__aiter__"):
+        async for rec in records:  # type: ignore[union-attr]
+            yield rec
+    else:
+        for rec in records:  # type: ignore[union-attr]
+            yield rec
+
+
+async def run_batch(
+    records: Union[Iterable[Record], AsyncIterator[Record]],
+    *,
+    concurrency: int = BATCH_CONCURRENCY,
+    order: str = "input",
+    mode: str = "process",
+    window: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Run the pipeline over records and yield one result dict each, then the summary."""
+    if order not in ORDERS:
+        raise ValueError(f"Unknown batch order: {order}")
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    slots = asyncio.Semaphore(concurrency)
+    window = window or concurrency * 4
+    # Bounds records in flight plus finished records held back for input order
+    pending = asyncio.Semaphore(window)
+    stats = BatchStats()
+    # Runs by dedupe key, least recently used first; finished runs beyond `window` are dropped
+    unique: "OrderedDict[str, asyncio.Task]" = OrderedDict()
+
+    def _remember(key: str, task: asyncio.Task) -> None:
+        unique[key] = task
+        for old in list(unique):
+            if len(unique) <= window:
+                break
+            if unique[old].done():
+                del unique[old]
+    done: asyncio.Queue = asyncio.Queue()
+    item_tasks: set = set()
+    total: Optional[int] = None
+
+    async def _run(email_text: str, contract_snippet: Optional[str]) -> Dict[str, Any]:
+        async with slots:
+            t0 = time.perf_counter()
+            out = await run_pipeline(email_text=email_text, contract_snippet=contract_snippet, mode=mode)
+            elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        stats.record_run(elapsed_ms, out.get("timings"))
+        return {
+            "analysis": out.get("analysis"),
+            "draft": out.get("draft"),
+            "risk_score": out.get("risk_score"),
+            "elapsed_ms": round(elapsed_ms, 3),
+        }
+
+    async def _item(index: int, record: Record) -> None:
+        result: Dict[str, Any] = {"index": index}
+        try:
+            rec = _parse(record)
+            result["id"] = rec.get("id")
+            snippet = rec.get("contract_snippet")
+            key = make_cache_key("batch", mode, rec["email_text"], snippet or "")
+            task = unique.get(key)
+            if task is None:
+                task = asyncio.ensure_future(_run(rec["email_text"], snippet))
+                _remember(key, task)
+            else:
+                unique.move_to_end(key)
+                result["duplicate"] = True
+                stats.duplicates += 1
+            # Shielded so a cancelled duplicate does not cancel the shared run
+            result.update(await asyncio.shield(task))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            stats.errors += 1
+            result["error"] = str(e)
+        done.put_nowait((index, result))
+
+    async def _produce() -> None:
+        nonlocal total
+        count = 0
+        async for record in _aiter(records):
+            if isinstance(record, (str, bytes)) and not record.strip():
+                continue
+            await pending.acquire()
+            task = asyncio.ensure_future(_item(count, record))
+            item_tasks.add(task)
+            task.add_done_callback(item_tasks.discard)
+            count += 1
+        total = count
+        done.put_nowait(None)  # wake the consumer so it sees the total
+
+    producer = asyncio.ensure_future(_produce())
+    held: Dict[int, Dict[str, Any]] = {}
+    next_index = 0
+    emitted = 0
+    try:
+        while total is None or emitted < total:
+            if producer.done() and producer.exception() is not None:
+                raise producer.exception()  # type: ignore[misc]
+            if producer.done():
+                item = await done.get()
+            else:
+                # Also wake up if the producer fails, so its error is not swallowed
+                getter = asyncio.ensure_future(done.get())
+                await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                item = getter.result()
+            if item is None:
+                continue
+            index, result = item
+            if order == "completion":
+                ready = [result]
+            else:
+                held[index] = result
+                ready = []
+                while next_index in held:
+                    ready.append(held.pop(next_index))
+                    next_index += 1
+            for result in ready:
+                stats.items += 1
+                emitted += 1
+                pending.release()
+                yield result
+        yield {"summary": stats.summary()}
+    finally:
+        # Consumer gone (e.g. client disconnected): stop scheduling and cancel work
+        producer.cancel()
+        for task in list(item_tasks) + list(unique.values()):
+            task.cancel()
@@ -1,55 +1,27 @@
-from typing import Dict, Any
-import json
+from typing import Any, AsyncIterator, Dict, Tuple
 import logging
 
 try:
     from backend.services.llm import get_llm, DRAFT_PROMPT_VERSION
-    from backend.services.cache import cache_get, cache_set
-    from backend.services.vectorstore import retrieve_relevant_clauses
+    from backend.services.cache import cache_get, cache_set, make_cache_key
+    from backend.services.vectorstore import aretrieve_relevant_clauses
+    from backend.services.singleflight import get_singleflight
+    from backend.services.metrics import span
+    from backend.agents.email_segments import llm_email_text
 except ModuleNotFoundError:
     from services.llm import get_llm, DRAFT_PROMPT_VERSION
-    from services.cache import cache_get, cache_set
-    from services.vectorstore import retrieve_relevant_clauses
+    from services.cache import cache_get, cache_set, make_cache_key
+    from services.vectorstore import aretrieve_relevant_clauses
+    from services.singleflight import get_singleflight
+    from services.metrics import span
+    from agents.email_segments import llm_email_text
 
 logger = logging.getLogger(__name__)
 
+_FLIGHT = get_singleflight("draft")
 
-async def draft_reply_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Inputs: state with email_text, analysis, contract_snippet
-    Outputs: state with draft (string) and risk_score (int)
-    """
-    email_text = state["email_text"]
-    analysis = state.get("analysis")
-    # Normalize analysis to a plain dict (FastAPI may pass a Pydantic model instance)
-    if analysis and not isinstance(analysis, dict):
-        # Pydantic v1 uses .dict(), v2 uses .model_dump()
-        if hasattr(analysis, "model_dump"):
-            analysis = analysis.model_dump()
-        elif hasattr(analysis, "dict"):
-            analysis = analysis.dict()
-    contract_snippet = state.get("contract_snippet")
-    variant = (state.get("variant") or "").upper().strip() or None
-    debug = state.get("debug", False)
-
-    # Retrieval augmented: fetch relevant clauses
-    retrieved = retrieve_relevant_clauses(contract_snippet or "")
-
-    # Stable cache key: hash of email_text + normalized analysis JSON + contract snippet
-    analysis_key_fragment = hash(json.dumps(analysis, sort_keys=True)) if analysis else 0
-    cache_key = f"draft:v{DRAFT_PROMPT_VERSION}:{hash(email_text)}:{analysis_key_fragment}:{hash(contract_snippet or '')}:{variant or ''}"
-    cached = cache_get(cache_key)
-    if cached:
-        draft_cached = cached.get("draft") if isinstance(cached, dict) else None
-        if isinstance(draft_cached, str) and draft_cached.strip():
-            if debug:
-                state.setdefault("trace", []).append({"node": "draft_reply", "cached": True})
-            return {"draft": draft_cached, "risk_score": cached.get("risk_score")}
-        else:
-            logger.warning("Ignoring invalid cached draft (None or empty); regenerating.")
-
-    llm = get_llm()
 
+def _system_prompt(variant: str | None) -> str:
     base_guidelines = (
         "You are a careful legal assistant. Draft a professional email reply.\n"
         "- Refer to clauses 9.1, 9.2, 10.2 when relevant.\n"
@@ -57,49 +29,36 @@ async def draft_reply_node(state: Dict[str, Any]) -> Dict[str, Any]:
         "- Avoid strong commitments.\n"
     )
     if variant == "B":
-        system = (
+        return (
             base_guidelines
             + "- Provide a slightly more detailed structure with short bullet points for key actions.\n"
             + "- Offer two alternative phrasings for the main position where helpful.\n"
             + "- Aim for 150-220 words.\n"
         )
-    else:
-        system = (
-            base_guidelines
-            + "- Keep it clear and concise in 80-140 words; paragraphs only (no bullets).\n"
-        )
+    return (
+        base_guidelines
+        + "- Keep it clear and concise in 80-140 words; paragraphs only (no bullets).\n"
+    )
 
-    try:
-        draft = await llm.generate_draft(
-            system_prompt=system,
-            email_text=email_text,
-            analysis=analysis,
-            contract_snippet=contract_snippet,
-            retrieved_clauses=retrieved,
+
+def _fallback_draft(variant: str | None) -> str:
+    if variant == "B":
+        return (
+            "Subject: Re: Your email\n\n"
+            "Thank you for your message.\n\n"
+            "- We acknowledge the request and will review the relevant clauses (9.1, 9.2, 10.2) as applicable.\n"
+            "- We will coordinate internally and revert with options.\n\n"
+            "Best regards,\nLegal Team"
         )
-    except Exception as e:
-        logger.error("LLM draft generation failed: %s", e)
-        # Fallback minimal draft
-        draft = None
-
-    # Ensure non-empty string draft
-    if not isinstance(draft, str) or not draft.strip():
-        if variant == "B":
-            draft = (
-                "Subject: Re: Your email\n\n"
-                "Thank you for your message.\n\n"
-                "- We acknowledge the request and will review the relevant clauses (9.1, 9.2, 10.2) as applicable.\n"
-                "- We will coordinate internally and revert with options.\n\n"
-                "Best regards,\nLegal Team"
-            )
-        else:
-            draft = (
-                "Subject: Re: Your email\n\n"
-                "Thank you for your message. We are reviewing the points you raised. "
-                "We will respond with more detail after internal consultation.\n\n"
-                "Best regards,\nLegal Team"
-            )
+    return (
+        "Subject: Re: Your email\n\n"
+        "Thank you for your message. We are reviewing the points you raised. "
+        "We will respond with more detail after internal consultation.\n\n"
+        "Best regards,\nLegal Team"
+    )
 
+
+def _risk_score(analysis: Dict[str, Any] | None) -> int:
     # Simple heuristic risk score (0-100)
     risk = 0
     if analysis:
@@ -114,11 +73,145 @@ async def draft_reply_node(state: Dict[str, Any]) -> Dict[str, Any]:
         questions = analysis.get("questions") or []
         if any(isinstance(q, str) and "liability" in q.lower() for q in questions):
             risk += 20
-    risk = max(0, min(100, risk))
+    return max(0, min(100, risk))
+
+
+def _prepare(state: Dict[str, Any]) -> Tuple[str, Dict[str, Any] | None, str | None, str | None, str]:
+    """Normalize node inputs; returns (email_text, analysis, contract_snippet, variant, cache_key)."""
+    email_text = state["email_text"]
+    analysis = state.get("analysis")
+    # Normalize analysis to a plain dict (FastAPI may pass a Pydantic model instance)
+    if analysis and not isinstance(analysis, dict):
+        # Pydantic v1 uses .dict(), v2 uses .model_dump()
+        if hasattr(analysis, "model_dump"):
+            analysis = analysis.model_dump()
+        elif hasattr(analysis, "dict"):
+            analysis = analysis.dict()
+    contract_snippet = state.get("contract_snippet")
+    variant = (state.get("variant") or "").upper().strip() or None
+
+    # Stable cache key: digest of email_text + canonical analysis JSON + contract snippet + variant
+    cache_key = make_cache_key(
+        "draft", DRAFT_PROMPT_VERSION, email_text, analysis or None, contract_snippet or "", variant or ""
+    )
+    return email_text, analysis, contract_snippet, variant, cache_key
+
+
+def _cached_draft(cache_key: str) -> Dict[str, Any] | None:
+    with span("draft.cache_lookup") as tags:
+        tags["cache"] = "miss"
+        cached = cache_get(cache_key)
+        if cached:
+            draft_cached = cached.get("draft") if isinstance(cached, dict) else None
+            if isinstance(draft_cached, str) and draft_cached.strip():
+                tags["cache"] = "hit"
+                return {"draft": draft_cached, "risk_score": cached.get("risk_score")}
+            logger.warning("Ignoring invalid cached draft (None or empty); regenerating.")
+    return None
+
+
+async def _retrieved(state: Dict[str, Any], contract_snippet: str | None) -> str:
+    retrieved = state.get("retrieved_clauses")
+    if retrieved is None:
+        with span("draft.retrieval"):
+            retrieved = await aretrieve_relevant_clauses(contract_snippet or "")
+    return retrieved
+
+
+async def draft_reply_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Inputs: state with email_text, analysis, contract_snippet (and retrieved_clauses when
+    retrieval already ran)
+    Outputs: state with draft (string) and risk_score (int)
+    """
+    email_text, analysis, contract_snippet, variant, cache_key = _prepare(state)
+    debug = state.get("debug", False)
+
+    cached = _cached_draft(cache_key)
+    if cached:
+        if debug:
+            state.setdefault("trace", []).append({"node": "draft_reply", "cached": True})
+        return cached
+
+    async def _generate() -> Dict[str, Any]:
+        # Retrieval augmented: use the clauses retrieved alongside analysis, else fetch them now
+        retrieved = await _retrieved(state, contract_snippet)
+        llm = get_llm()
+        try:
+            with span("draft.llm"):
+                draft = await llm.generate_draft(
+                    system_prompt=_system_prompt(variant),
+                    email_text=llm_email_text(email_text),
+                    analysis=analysis,
+                    contract_snippet=contract_snippet,
+                    retrieved_clauses=retrieved,
+                )
+        except Exception as e:
+            logger.error("LLM draft generation failed: %s", e)
+            # Fallback minimal draft
+            draft = None
+
+        # Ensure non-empty string draft
+        if not isinstance(draft, str) or not draft.strip():
+            draft = _fallback_draft(variant)
 
-    cache_set(cache_key, {"draft": draft, "risk_score": risk}, ttl_seconds=60 * 60)
+        result = {"draft": draft, "risk_score": _risk_score(analysis)}
+        with span("draft.cache_write"):
+            cache_set(cache_key, result, ttl_seconds=60 * 60)
+        return result
+
+    # Identical concurrent requests share one retrieval + LLM call
+    result = await _FLIGHT.do(cache_key, _generate)
+    draft, risk = result["draft"], result["risk_score"]
 
     if debug:
         state.setdefault("trace", []).append({"node": "draft_reply", "risk_score": risk})
 
     return {"draft": draft, "risk_score": risk}
+
+
+async def stream_draft_reply(state: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+    """Streaming counterpart of draft_reply_node.
+
+    Yields {"event": "token", "text": ...} as the LLM produces text, then one
+    {"event": "done", "draft": ..., "risk_score": ...}. A cached draft is sent
+    as a single token; a completed stream is cached like a regular draft. If
+    the LLM fails before producing text the fallback draft is streamed; if it
+    fails midway an {"event": "error"} precedes "done" and nothing is cached.
+    """
+    email_text, analysis, contract_snippet, variant, cache_key = _prepare(state)
+    risk = _risk_score(analysis)
+
+    cached = _cached_draft(cache_key)
+    if cached:
+        yield {"event": "token", "text": cached["draft"]}
+        yield {"event": "done", **cached}
+        return
+
+    retrieved = await _retrieved(state, contract_snippet)
+    llm = get_llm()
+    parts = []
+    failed = False
+    try:
+        async for chunk in llm.generate_draft_stream(
+            system_prompt=_system_prompt(variant),
+            email_text=llm_email_text(email_text),
+            analysis=analysis,
+            contract_snippet=contract_snippet,
+            retrieved_clauses=retrieved,
+        ):
+            parts.append(chunk)
+            yield {"event": "token", "text": chunk}
+    except Exception as e:
+        logger.error("LLM draft streaming failed: %s", e)
+        if parts:
+            failed = True
+            yield {"event": "error", "detail": "draft generation interrupted"}
+
+    draft = "".join(parts)
+    if not failed and not draft.strip():
+        draft = _fallback_draft(variant)
+        yield {"event": "token", "text": draft}
+    if not failed:
+        cache_set(cache_key, {"draft": draft, "risk_score": risk}, ttl_seconds=60 * 60)
+    yield {"event": "done", "draft": draft, "risk_score": risk}
@@ -0,0 +1,216 @@
+"""Split an email into the newest message, its signature, quoted history and boilerplate.
+
+Replies to legal threads usually carry every earlier message below the new
+one ("On ... wrote:", "-----Original Message-----", Outlook "From:/Sent:"
+headers, ">"-quoted lines) plus confidentiality disclaimers. None of it is
+what the sender is asking now, but all of it was sent to the LLM.
+
+split_email() finds those boundaries with a few compiled regex searches and
+one backwards pass over trailing quoted lines. The heuristics read
+``EmailSegments.message`` (newest message plus its signature, which
+extract_parties uses), so a quoted signature or an old question no longer
+leaks into the analysis. llm_email_text() builds the LLM input: the newest
+message within EMAIL_TOKEN_BUDGET, truncated per EMAIL_TRUNCATION with the
+signature kept, then up to EMAIL_QUOTED_TOKENS of the most recent quoted
+history. Disclaimers are dropped. EMAIL_TOKEN_BUDGET=0 sends the email
+unchanged.
+"""
+from __future__ import annotations
+from typing import NamedTuple, Optional
+from functools import lru_cache
+import os
+import re
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRUNCATION_POLICIES = ("head", "tail", "head_tail")
+
+_TOKEN_BUDGET = int(os.getenv("EMAIL_TOKEN_BUDGET", "2000"))
+_TRUNCATION = os.getenv("EMAIL_TRUNCATION", "head_tail").lower()
+_QUOTED_TOKENS = int(os.getenv("EMAIL_QUOTED_TOKENS", "500"))
+# Rough average for English prose with Gemini's tokenizer; only used for budgeting
+_CHARS_PER_TOKEN = 4
+_MAX_SIGNATURE_LINES = 8
+_MAX_SIGNATURE_CHARS = 400
+_MAX_DISCLAIMER_PARAGRAPHS = 3
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+
+if _TRUNCATION not in TRUNCATION_POLICIES:
+    raise ValueError(f"EMAIL_TRUNCATION must be one of {', '.join(TRUNCATION_POLICIES)}")
+
+# Start of the quoted thread: the earliest reply header wins
+_QUOTE_HEADER = re.compile(
+    r"^[ \t]*(?:"
+    r"On\b[^\n]{0,300}(?:\n[^\n]{0,300})?\bwrote:[ \t]*$"
+    r"|-{2,}[ \t]*(?:Original|Forwarded) Message[ \t]*-{2,}"
+    r"|Begin forwarded message:"
+    r"|_{10,}[ \t]*$"
+    # Outlook headers only when the values look like one: an address, or a name then a dated Sent/Date
+    r"|From:[^\n]*(?:[\w.+-]+@[\w-]+\.\w|\[mailto:)[^\n]*\n(?:[^\n]*\n){0,3}?[ \t]*(?:Sent|Date|To):"
+    r"|From:[ \t]*(?-i:[A-Z])[^\n.?!:;]{0,80}\n(?:[^\n]*\n){0,3}?[ \t]*(?:Sent|Date):[^\n]*\d"
+    r")",
+    re.M | re.I,
+)
+# A notice heading is only boilerplate at the end of the message; the sentence form
+# ("This message is confidential ...") also opens real paragraphs, so it needs a sign-off above it
+_DISCLAIMER = re.compile(
+    r"^[ \t*_-]*(?:(?P<heading>"
+    r"confidential(?:ity)?\s+(?:notice|note|statement|warning)"
+    r"|disclaimer\b"
+    r"|privileged\s+(?:and|&)\s+confidential)"
+    r"|this\s+(?:e-?mail|message|communication|transmission)\b[^\n]{0,80}?"
+    r"\b(?:is|are|may\s+be|may\s+contain|contains?)\b[^\n]{0,40}?\b(?:confidential|privileged)"
+    r")",
+    re.M | re.I,
+)
+# RFC 3676 delimiter or a sign-off on a line of its own
+_SIGN_OFF = re.compile(
+    r"^[ \t]*(?:--[ \t]?"
+    r"|(?:(?:best|kind|warm|many)\s+)?(?:regards|thanks|wishes)"
+    r"|thank\s+you|sincerely(?:\s+yours)?|yours\s+(?:sincerely|faithfully|truly)|best|cheers"
+    r")[ \t]*[,.!]?[ \t]*$",
+    re.M | re.I,
+)
+
+
+class EmailSegments(NamedTuple):
+    body: str        # newest message without its signature
+    signature: str   # sign-off and signature block of the newest message ('' if none found)
+    quoted: str      # earlier messages of the thread, newest first ('' if none)
+    disclaimer: str  # confidentiality boilerplate of the newest message ('' if none)
+    message: str     # body plus signature as written; what the heuristics read
+
+
+def _trailing_quote_start(text: str) -> int:
+    """Offset where a trailing block of '>'-quoted lines begins, or len(text)."""
+    end = len(text)
+    cut = end
+    while end > 0:
+        start = text.rfind("\n", 0, end - 1) + 1 if end > 1 else 0
+        line = text[start:end].strip()
+        if line and not line.startswith(">"):
+            break
+        if line:
+            cut = start
+        end = start
+    return cut
+
+
+def _is_disclaimer(head: str, m: re.Match) -> bool:
+    """A disclaimer match counts only in the trailing block, never in the middle of the body."""
+    before, block = head[:m.start()], head[m.start():]
+    if not before.strip():
+        return False
+    sign_offs = list(_SIGN_OFF.finditer(before))
+    if sign_offs:
+        last = sign_offs[-1]
+        if before[:last.start()].strip() and before[last.start():].strip().count("\n") < _MAX_SIGNATURE_LINES:
+            return True
+    # No sign-off: a notice heading opening the last paragraph(s), which ask nothing
+    return (
+        m.group("heading") is not None
+        and "?" not in block
+        and len(_PARAGRAPH_BREAK.split(block.strip())) <= _MAX_DISCLAIMER_PARAGRAPHS
+    )
+
+
+@lru_cache(maxsize=32)
+def split_email(email_text: str) -> EmailSegments:
+    """Segment one email; cached so the analysis and draft nodes share the work."""
+    text = email_text
+    quote = _QUOTE_HEADER.search(text)
+    cut = quote.start() if quote else len(text)
+    # Bottom-quoted replies: only a trailing '>' block counts, inline quotes stay in the message
+    cut = min(cut, _trailing_quote_start(text[:cut]))
+    if text[:cut].strip():
+        quoted = text[cut:].strip()
+    else:
+        # Nothing above the first header (a bare forward): the whole text is the message
+        cut, quoted = len(text), ""
+
+    head = text[:cut]
+    disclaimer = ""
+    for m in _DISCLAIMER.finditer(head):
+        if _is_disclaimer(head, m):
+            disclaimer = head[m.start():].strip()
+            head = head[:m.start()]
+            break
+
+    # Untouched text keeps its identity, so heuristic caches keyed on it still hit
+    message = email_text if cut == len(text) and not disclaimer else head.rstrip()
+
+    # The last sign-off wins: a "Thanks," line mid-body must not pull the rest of the
+    # message into the signature, which llm_email_text never truncates
+    body, signature = message, ""
+    for m in _SIGN_OFF.finditer(message):
+        tail = message[m.start():].strip()
+        if (
+            message[:m.start()].strip()
+            and "?" not in tail
+            and tail.count("\n") < _MAX_SIGNATURE_LINES
+            and len(tail) <= _MAX_SIGNATURE_CHARS
+        ):
+            body, signature = message[:m.start()].rstrip(), tail
+    return EmailSegments(body, signature, quoted, disclaimer, message)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def _head_end(text: str, n: int) -> int:
+    """End of the first ~n characters, moved back to a word boundary when one is close."""
+    cut = text.rfind(" ", 0, n)
+    return cut if cut > n * 0.8 else n
+
+
+def _tail_start(text: str, n: int) -> int:
+    """Start of the last ~n characters, moved forward to a word boundary when one is close."""
+    start = len(text) - n
+    space = text.find(" ", start, start + n // 5)
+    return space + 1 if space >= 0 else start
+
+
+def _clip(text: str, limit: int, policy: str) -> str:
+    """Shorten text to about `limit` characters per policy, marking what was cut."""
+    if len(text) <= limit:
+        return text
+    head_n = {"head": limit, "tail": 0}.get(policy, limit * 2 // 3)
+    # head_tail: the opening states the matter, the close usually holds the ask
+    end = _head_end(text, head_n) if head_n else 0
+    start = _tail_start(text, limit - head_n) if head_n < limit else len(text)
+    marker = f"[... {start - end} characters omitted ...]"
+    return "\n".join(part for part in (text[:end].rstrip(), marker, text[start:].strip()) if part)
+
+
+def llm_email_text(
+    email_text: str,
+    token_budget: Optional[int] = None,
+    policy: Optional[str] = None,
+    quoted_tokens: Optional[int] = None,
+) -> str:
+    """The part of the email worth sending to the LLM, within the token budget."""
+    budget = _TOKEN_BUDGET if token_budget is None else token_budget
+    if budget <= 0:
+        return email_text
+    policy = policy or _TRUNCATION
+    if policy not in TRUNCATION_POLICIES:
+        raise ValueError(f"truncation policy must be one of {', '.join(TRUNCATION_POLICIES)}")
+    quoted_budget = _QUOTED_TOKENS if quoted_tokens is None else quoted_tokens
+
+    seg = split_email(email_text)
+    limit = budget * _CHARS_PER_TOKEN
+    if len(seg.message) <= limit:
+        out = seg.message
+    else:
+        # The signature is short and names the sender; truncate the body only
+        signature = f"\n\n{seg.signature}" if seg.signature else ""
+        out = _clip(seg.body, max(limit - len(signature), _CHARS_PER_TOKEN), policy) + signature
+
+    room = min(quoted_budget * _CHARS_PER_TOKEN, limit - len(out))
+    if seg.quoted and room > 0:
+        # Most recent quoted messages first: keep the head of the history
+        out = f"{out}\n\n{_clip(seg.quoted, room, 'head')}"
+    return out
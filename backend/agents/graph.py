@@ -1,17 +1,109 @@
-from typing import Dict, Any
+from typing import Annotated, Any, Awaitable, Callable, Dict, List, Optional, TypedDict
+import time
+import asyncio
 import logging
+from contextlib import nullcontext
 
 try:
-    from langgraph.graph import StateGraph, END  # type: ignore
+    from langgraph.graph import StateGraph, START, END  # type: ignore
     _HAS_LANGGRAPH = True
 except Exception:  # ImportError or runtime errors due to version mismatch
     _HAS_LANGGRAPH = False
 
 from .analyze_node import analyze_email_node
 from .draft_node import draft_reply_node
+from .prepare_nodes import retrieve_clauses_node
+
+try:
+    from backend.services.metrics import collect_spans
+except ModuleNotFoundError:
+    from services.metrics import collect_spans
 
 logger = logging.getLogger(__name__)
 
+Node = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+def _merge_timings(left: Optional[Dict[str, float]], right: Optional[Dict[str, float]]) -> Dict[str, float]:
+    return {**(left or {}), **(right or {})}
+
+
+class PipelineGraphState(TypedDict, total=False):
+    email_text: str
+    contract_snippet: Optional[str]
+    analysis: Optional[Dict[str, Any]]
+    variant: Optional[str]
+    debug: bool
+    trace: List[Dict[str, Any]]
+    retrieved_clauses: Optional[str]
+    draft: Optional[str]
+    risk_score: Optional[int]
+    # Parallel nodes each report their own wall-clock time; the reducer merges them
+    timings: Annotated[Dict[str, float], _merge_timings]
+
+
+def _timed(name: str, node: Node) -> Node:
+    """Wrap a node so its update carries {"timings": {name: ms}}."""
+
+    async def _run(state: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        update = await node(state)
+        return {**update, "timings": {name: round((time.perf_counter() - start) * 1000.0, 3)}}
+
+    _run.__name__ = name
+    return _run
+
+
+# Process mode is a DAG: analysis and retrieval only need the request, so they
+# run concurrently and the draft waits for both.
+_PROCESS_FAN_OUT: Dict[str, Node] = {
+    "analyze_email": _timed("analyze_email", analyze_email_node),
+    "retrieve_clauses": _timed("retrieve_clauses", retrieve_clauses_node),
+}
+_DRAFT_NODE = _timed("draft_reply", draft_reply_node)
+
+
+# Compiled graphs are stateless (no checkpointer), so one instance per mode is
+# shared by all requests instead of rebuilding the StateGraph every call.
+_COMPILED_GRAPHS: Dict[str, Any] = {}
+
+
+def _build_graph(mode: str):
+    workflow = StateGraph(PipelineGraphState)
+    workflow.add_node("draft_reply", _DRAFT_NODE)
+
+    if mode == "process":
+        for name, node in _PROCESS_FAN_OUT.items():
+            workflow.add_node(name, node)
+            workflow.add_edge(START, name)
+        # One edge from the whole fan-out: draft_reply runs once, after all of them
+        workflow.add_edge(list(_PROCESS_FAN_OUT), "draft_reply")
+        workflow.add_edge("draft_reply", END)
+    else:  # draft only
+        workflow.set_entry_point("draft_reply")
+        workflow.add_edge("draft_reply", END)
+
+    return workflow.compile()
+
+
+def get_compiled_graph(mode: str):
+    """Return the compiled LangGraph for 'process' or 'draft' mode (None without LangGraph)."""
+    if not _HAS_LANGGRAPH:
+        return None
+    graph = _COMPILED_GRAPHS.get(mode)
+    if graph is None:
+        graph = _COMPILED_GRAPHS[mode] = _build_graph(mode)
+    return graph
+
+
+def warm_up() -> None:
+    """Compile all graphs ahead of the first request (called from the app lifespan)."""
+    if not _HAS_LANGGRAPH:
+        return
+    for mode in ("process", "draft"):
+        get_compiled_graph(mode)
+    logger.info("Compiled LangGraph workflows: %s", ", ".join(sorted(_COMPILED_GRAPHS)))
+
 
 async def run_pipeline(
     *,
@@ -23,11 +115,13 @@ async def run_pipeline(
     debug: bool = False,
 ) -> Dict[str, Any]:
     """
-    Run the 2-node pipeline using LangGraph.
+    Run the pipeline using LangGraph.
     Modes:
       - analyze: only analyze node
       - draft: requires analysis provided, runs draft node
-      - process: analyze then draft
+      - process: analyze and clause retrieval concurrently, then draft
+    The result includes per-node wall-clock "timings" in milliseconds; in process
+    mode the fan-out nodes overlap, so their timings do not add up.
     """
     state: Dict[str, Any] = {
         "email_text": email_text,
@@ -41,48 +135,44 @@ async def run_pipeline(
     if mode not in {"analyze", "draft", "process"}:
         raise ValueError("Invalid mode")
 
-    if mode == "analyze":
-        result = await analyze_email_node(state)
-        state.update(result)
-        return {"analysis": state["analysis"]}
+    timings: Dict[str, float] = {}
+
+    def _apply(update: Dict[str, Any]) -> None:
+        # Fold a node's update back into the local state
+        timings.update(update.pop("timings", None) or {})
+        state.update(update)
 
     if mode == "draft" and not analysis:
         raise ValueError("'draft' mode requires 'analysis' input")
 
-    if _HAS_LANGGRAPH:
-        # Build graph lazily to avoid global import side effects
-        workflow = StateGraph(dict)
-        workflow.add_node("analyze_email", analyze_email_node)
-        workflow.add_node("draft_reply", draft_reply_node)
-
-        if mode == "process":
-            workflow.set_entry_point("analyze_email")
-            workflow.add_edge("analyze_email", "draft_reply")
-            workflow.add_edge("draft_reply", END)
-        else:  # draft only
-            workflow.set_entry_point("draft_reply")
-            workflow.add_edge("draft_reply", END)
+    # Debug runs also get every stage span (cache lookups, retrieval, LLM calls) in the trace
+    with collect_spans() if debug else nullcontext() as spans:
+        if mode == "analyze":
+            _apply(await _timed("analyze_email", analyze_email_node)(state))
+        elif _HAS_LANGGRAPH:
+            graph = get_compiled_graph(mode)
 
-        graph = workflow.compile()
-
-        async for event in graph.astream(state):
-            if debug:
+            async for event in graph.astream(state):
                 for k, v in event.items():
                     if k == "__end__":
                         continue
-                    # Append minimal trace info (no chain-of-thought)
-                    state.setdefault("trace", []).append({"event": k})
-    else:
-        logger.warning("LangGraph not available; running sequentially")
-        if mode == "process":
-            # analyze then draft sequentially
-            result = await analyze_email_node(state)
-            state.update(result)
-            result = await draft_reply_node(state)
-            state.update(result)
-        else:  # draft only
-            result = await draft_reply_node(state)
-            state.update(result)
+                    if isinstance(v, dict):
+                        _apply(dict(v))
+                    if debug:
+                        # Append minimal trace info (no chain-of-thought)
+                        state.setdefault("trace", []).append({"event": k})
+        else:
+            logger.warning("LangGraph not available; running without it")
+            if mode == "process":
+                # Same DAG as the graph: fan out, then draft
+                for update in await asyncio.gather(*(node(state) for node in _PROCESS_FAN_OUT.values())):
+                    _apply(update)
+            _apply(await _DRAFT_NODE(state))
+    if spans:
+        state.setdefault("trace", []).extend(spans)
+
+    if mode == "analyze":
+        return {"analysis": state["analysis"], "trace": state.get("trace"), "timings": timings}
 
     # Final state is in 'state' after running graph
     return {
@@ -90,4 +180,5 @@ async def run_pipeline(
         "draft": state.get("draft"),
         "risk_score": state.get("risk_score"),
         "trace": state.get("trace"),
+        "timings": timings,
     }
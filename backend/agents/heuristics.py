@@ -4,17 +4,26 @@ The LLM provides a first-pass JSON. These functions gently refine without
 inventing data. All functions must be side-effect free.
 """
 from __future__ import annotations
-from typing import List, Tuple, Optional
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Tuple, Optional, Union
+from functools import lru_cache
 import re
 
+try:
+    import ahocorasick  # type: ignore
+    HAVE_AHOCORASICK = True
+except Exception:
+    HAVE_AHOCORASICK = False
+
+# (pattern, normalized value, literal every match contains); the literal lets the
+# shared keyword scan skip patterns that cannot match before running them
 _DUE_DATE_PATTERNS = [
-    (re.compile(r"\b(end of (the )?week)\b", re.I), "end of week"),
-    (re.compile(r"\bby end of week\b", re.I), "end of week"),
-    (re.compile(r"\beow\b", re.I), "end of week"),
-    (re.compile(r"\bby friday\b", re.I), "end of week"),
-    (re.compile(r"\bby (monday|tuesday|wednesday|thursday|friday)\b", re.I), None),  # keep phrase as-is
-    (re.compile(r"\bby (eod|close of business)\b", re.I), "end of day"),
-    (re.compile(r"\bwithin (\d{1,2}) days\b", re.I), None),
+    (re.compile(r"\b(end of (the )?week)\b", re.I), "end of week", "week"),
+    (re.compile(r"\bby end of week\b", re.I), "end of week", "week"),
+    (re.compile(r"\beow\b", re.I), "end of week", "eow"),
+    (re.compile(r"\bby friday\b", re.I), "end of week", "by "),
+    (re.compile(r"\bby (monday|tuesday|wednesday|thursday|friday)\b", re.I), None, "by "),  # keep phrase as-is
+    (re.compile(r"\bby (eod|close of business)\b", re.I), "end of day", "by "),
+    (re.compile(r"\bwithin (\d{1,2}) days\b", re.I), None, "within"),
 ]
 
 _HIGH_URGENCY_KEYWORDS = {
@@ -31,6 +40,10 @@ INTENT_SYNONYM_GROUPS = [
     ("negotiation", {"negotiate", "negotiation", "counteroffer", "counter"}),
 ]
 
+_APPROVAL_KEYWORDS = {"approve", "approval"}
+_CLARIFY_KEYWORDS = {"clarify", "clarification"}
+_TOPIC_CHANGE_KEYWORDS = {"amend", "amendment", "change", "update", "revision"}
+
 QUESTION_TRIGGERS = ["could you", "can you", "would you", "please", "do you", "what is", "how", "why", "when", "which", "who"]
 QUESTION_HINT_PATTERNS = [
     re.compile(r"\bcan we\b", re.I),
@@ -44,14 +57,113 @@ QUESTION_HINT_PATTERNS = [
     re.compile(r"\bplease confirm\b", re.I),
     re.compile(r"\bwould you\b", re.I),
 ]
+# All hint patterns as one alternation: one search per sentence instead of ten
+_QUESTION_HINT = re.compile("|".join(f"(?:{p.pattern})" for p in QUESTION_HINT_PATTERNS), re.I)
+_SENTENCE_SPLIT = re.compile(r"(?<=[?!.])\s+")
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+# Lead-ins stripped (in this order, each at most once) and trailing '?'s, for near-duplicate detection
+_CORE_STRIP = re.compile(
+    r"^(?:additionally,\s*)?(?:please\s+advise\s+whether\s*)?(?:can we\s+)?"
+    r"(?:could you\s+)?(?:would you\s+)?(?:please\s+)?|\?+$"
+)
+
+
+class LazyHits:
+    """Keyword hits looked up with ``in`` only when a heuristic asks, each answered once.
+
+    The fallback without an automaton: like the per-heuristic checks it
+    replaces, a lookup stops at the first keyword of a group that occurs, so
+    cue-rich emails never pay for a check of every keyword.
+    """
+
+    __slots__ = ("_lower", "_seen")
+
+    def __init__(self, lower: str):
+        self._lower = lower
+        self._seen: Dict[str, bool] = {}
+
+    def __contains__(self, keyword: str) -> bool:
+        found = self._seen.get(keyword)
+        if found is None:
+            found = self._seen[keyword] = keyword in self._lower
+        return found
+
+    def isdisjoint(self, keywords: Iterable[str]) -> bool:
+        return not any(k in self for k in keywords)
+
+
+class KeywordMatcher:
+    """Finds every keyword occurring as a substring of a text.
+
+    With pyahocorasick (a declared requirement) this is one pass of a C
+    Aho-Corasick automaton over the text, however many keywords there are.
+    On 50KB threads without cues that is ~13x faster than the old
+    per-heuristic ``in`` checks, which each read the whole text; when cues
+    occur early those checks stop at the first hit and the automaton is on
+    par (0.9x, bench_heuristics). Checking every keyword with ``in`` up front
+    would be 0.4x there, so without the automaton ``hits()`` returns a
+    LazyHits that keeps the early exit (1.4x with cues, ~7x without).
+    """
+
+    def __init__(self, keywords: Iterable[str], use_automaton: bool = HAVE_AHOCORASICK):
+        self.keywords = frozenset(k for k in keywords if k)
+        self._automaton = None
+        if use_automaton and HAVE_AHOCORASICK and self.keywords:
+            self._automaton = ahocorasick.Automaton()
+            for k in self.keywords:
+                self._automaton.add_word(k, k)
+            self._automaton.make_automaton()
+
+    @property
+    def engine(self) -> str:
+        return "aho-corasick" if self._automaton is not None else "on-demand"
+
+    def find(self, lower: str) -> FrozenSet[str]:
+        """Every keyword in the text."""
+        if self._automaton is not None:
+            return frozenset(k for _, k in self._automaton.iter(lower))
+        return frozenset(k for k in self.keywords if k in lower)
+
+    def hits(self, lower: str) -> Union[FrozenSet[str], LazyHits]:
+        """What the heuristics query: the full set from the automaton, or on-demand lookups."""
+        if self._automaton is not None:
+            return self.find(lower)
+        return LazyHits(lower)
+
+
+_MATCHER = KeywordMatcher(
+    _HIGH_URGENCY_KEYWORDS
+    | _MEDIUM_URGENCY_KEYWORDS
+    | _LOW_URGENCY_KEYWORDS
+    | {k for _, group in INTENT_SYNONYM_GROUPS for k in group}
+    | _APPROVAL_KEYWORDS
+    | _CLARIFY_KEYWORDS
+    | _TOPIC_CHANGE_KEYWORDS
+    | {"msa", "liability"}
+    | {anchor for _, _, anchor in _DUE_DATE_PATTERNS}
+)
+
+
+class TextScan(NamedTuple):
+    lower: str
+    hits: Union[FrozenSet[str], LazyHits]
+
+
+@lru_cache(maxsize=32)
+def scan_text(email_text: str) -> TextScan:
+    """Lowercase the email and collect its keyword hits once; every heuristic reuses the result."""
+    lower = email_text.lower()
+    return TextScan(lower, _MATCHER.hits(lower))
 
 
 def extract_due_date(email_text: str, existing: str) -> str:
     if existing:
         return existing
-    lower = email_text.lower()
-    for pattern, normalized in _DUE_DATE_PATTERNS:
-        m = pattern.search(lower)
+    scan = scan_text(email_text)
+    for pattern, normalized, anchor in _DUE_DATE_PATTERNS:
+        if anchor not in scan.hits:
+            continue
+        m = pattern.search(scan.lower)
         if m:
             if normalized:
                 return normalized
@@ -61,13 +173,13 @@ def extract_due_date(email_text: str, existing: str) -> str:
 
 
 def extract_urgency(email_text: str, existing: str) -> str:
-    lower = email_text.lower()
+    hits = scan_text(email_text).hits
     # Escalate if explicit high urgency words present
-    if any(k in lower for k in _HIGH_URGENCY_KEYWORDS):
+    if not hits.isdisjoint(_HIGH_URGENCY_KEYWORDS):
         return "high"
-    if any(k in lower for k in _MEDIUM_URGENCY_KEYWORDS):
+    if not hits.isdisjoint(_MEDIUM_URGENCY_KEYWORDS):
         return "medium"
-    if any(k in lower for k in _LOW_URGENCY_KEYWORDS):
+    if not hits.isdisjoint(_LOW_URGENCY_KEYWORDS):
         return "low"
     # Preserve existing classification if valid and no stronger signal found
     if existing in {"high", "medium", "low"}:
@@ -76,15 +188,15 @@ def extract_urgency(email_text: str, existing: str) -> str:
 
 
 def refine_intent(email_text: str, raw_intent: str) -> str:
-    lower = email_text.lower()
+    hits = scan_text(email_text).hits
     mapped = raw_intent
     # Combine approval + clarification pattern
-    if ("approve" in lower or "approval" in lower) and ("clarify" in lower or "clarification" in lower):
+    if not hits.isdisjoint(_APPROVAL_KEYWORDS) and not hits.isdisjoint(_CLARIFY_KEYWORDS):
         return "requesting approval and clarification"
     # If no mapped intent or very generic, attempt based on keyword groups
     if not mapped or mapped in {"other", ""}:
         for label, keywords in INTENT_SYNONYM_GROUPS:
-            if any(k in lower for k in keywords):
+            if not hits.isdisjoint(keywords):
                 mapped = label
                 break
     return mapped or ""
@@ -96,7 +208,7 @@ def extract_parties(email_text: str, existing_client: str, existing_counterparty
         return existing_client, existing_counterparty
 
     text = email_text
-    lower = text.lower()
+    lower = scan_text(text).lower
     client = existing_client or ""
     counterparty = existing_counterparty or ""
 
@@ -163,73 +275,70 @@ def extract_parties(email_text: str, existing_client: str, existing_counterparty
     return client or "", counterparty or ""
 
 
+def _norm_question(q: str) -> str:
+    return _NON_ALNUM.sub(" ", q.lower()).strip()
+
+
+def _core_question(q: str) -> str:
+    return _CORE_STRIP.sub("", q.lower()).strip()
+
+
 def extract_questions(email_text: str, existing_questions: List[str]) -> List[str]:
-    # Preserve existing questions but remove obvious duplicates
-    norm_map = {}
+    # Preserve existing questions but remove obvious duplicates. Each question is
+    # normalized once; norms[i] belongs to out[i].
+    seen = set()
     out: List[str] = []
-    def _norm(q: str) -> str:
-        return re.sub(r"[^a-z0-9]+", " ", q.lower()).strip()
-    for q in existing_questions:
-        n = _norm(q)
-        if n not in norm_map:
-            norm_map[n] = q
+    norms: List[str] = []
+
+    def _add(q: str) -> None:
+        n = _norm_question(q)
+        if n not in seen:
+            seen.add(n)
             out.append(q)
+            norms.append(n)
+
+    for q in existing_questions:
+        _add(q)
 
     # Sentence-based extraction
-    sentences = re.split(r"(?<=[?!.])\s+", email_text)
-    for s in sentences:
+    for s in _SENTENCE_SPLIT.split(email_text):
         sl = s.lower().strip()
         if not sl:
             continue
-        is_question = sl.endswith("?")
-        if not is_question:
-            # Check hint patterns for interrogative sentences lacking '?'
-            if any(p.search(sl) for p in QUESTION_HINT_PATTERNS):
-                is_question = True
-        if not is_question:
+        # Interrogative sentences may lack '?': check the hint patterns
+        if not (sl.endswith("?") or _QUESTION_HINT.search(sl)):
             continue
         if 5 <= len(sl) <= 220:
             # Normalize to ensure trailing '?' present for consistency
             candidate = s.strip()
             if not candidate.endswith("?"):
                 # Replace trailing '.' with '?' else append
-                candidate = re.sub(r"\.$", "?", candidate) if candidate.endswith(".") else candidate + "?"
-            n = _norm(candidate)
-            if n not in norm_map:
-                norm_map[n] = candidate
-                out.append(candidate)
+                candidate = candidate[:-1] + "?" if candidate.endswith(".") else candidate + "?"
+            _add(candidate)
 
     # Liability clarification enforcement if liability mentioned
-    if "liability" in email_text.lower():
-        has_liability = any("liability" in _norm(q) and ("clarify" in _norm(q) or "can we" in _norm(q) or "could we" in _norm(q)) for q in out)
+    if "liability" in scan_text(email_text).hits:
+        has_liability = any(
+            "liability" in n and ("clarify" in n or "can we" in n or "could we" in n) for n in norms
+        )
         if not has_liability:
             out.append("Can we clarify the liability limits?")
 
     # Collapse near-duplicate payment / termination questions by core phrase normalization
-    core_map = {}
+    cores = set()
     cleaned: List[str] = []
-    def _core(q: str) -> str:
-        ql = q.lower()
-        ql = re.sub(r"^(additionally,\s*)", "", ql)
-        ql = re.sub(r"^(please\s+advise\s+whether\s*)", "", ql)
-        ql = re.sub(r"^(can we\s+)", "", ql)
-        ql = re.sub(r"^(could you\s+)", "", ql)
-        ql = re.sub(r"^(would you\s+)", "", ql)
-        ql = re.sub(r"^(please\s+)", "", ql)
-        ql = re.sub(r"\?+$", "", ql).strip()
-        return ql
     for q in out:
-        c = _core(q)
-        if c not in core_map:
-            core_map[c] = q
+        c = _core_question(q)
+        if c not in cores:
+            cores.add(c)
             cleaned.append(q)
     return cleaned
 
 
 def refine_topic(email_text: str, existing_topic: str) -> str:
-    lower = email_text.lower()
-    if ("msa" in lower) and any(k in lower for k in ["amend", "amendment", "change", "update", "revision"]):
+    hits = scan_text(email_text).hits
+    if "msa" in hits and not hits.isdisjoint(_TOPIC_CHANGE_KEYWORDS):
         return "MSA amendments"
-    if not existing_topic and "msa" in lower:
+    if not existing_topic and "msa" in hits:
         return "MSA"
     return existing_topic or ""
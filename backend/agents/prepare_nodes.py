@@ -0,0 +1,21 @@
+"""Nodes that need only the raw request, so they run alongside analysis.
+
+In process mode the graph fans out to analyze_email and retrieve_clauses at
+once, and draft_reply waits for both. Retrieval depends only on the contract
+snippet, so it does not wait for the LLM.
+"""
+from typing import Any, Dict
+
+try:
+    from backend.services.vectorstore import aretrieve_relevant_clauses
+except ModuleNotFoundError:
+    from services.vectorstore import aretrieve_relevant_clauses
+
+
+async def retrieve_clauses_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Inputs: state with contract_snippet
+    Outputs: state with retrieved_clauses (string) for the draft node
+    """
+    retrieved = await aretrieve_relevant_clauses(state.get("contract_snippet") or "")
+    return {"retrieved_clauses": retrieved}
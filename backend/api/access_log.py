@@ -0,0 +1,161 @@
+"""Structured access logging off the event loop.
+
+AccessLogMiddleware is plain ASGI: it times the request, captures the status
+from http.response.start, and emits one JSON record per request with method,
+path, status, duration, client, per-cache outcomes and the model that
+answered (see services/request_context). Paths can be sampled
+(ACCESS_LOG_SAMPLE="/health=0.01,/metrics=0"); errors (5xx) are always logged.
+
+setup_logging() gives the access logger a QueueHandler, so logging a request
+on the event loop only enqueues the record. A QueueListener thread formats it
+(JSON serialization included) and writes it to stdout or ACCESS_LOG_FILE.
+When the queue is full (ACCESS_LOG_QUEUE_SIZE) records are dropped and
+counted rather than blocking a request. Other loggers keep their handlers;
+they log rarely compared with one record per request.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from typing import Any, Dict, Optional
+
+try:
+    from backend.services import request_context
+except ModuleNotFoundError:
+    from services import request_context
+
+ACCESS_LOGGER = "legal-email-assistant.access"
+
+_SAMPLE = os.getenv("ACCESS_LOG_SAMPLE", "/health=0.01")
+_QUEUE_SIZE = int(os.getenv("ACCESS_LOG_QUEUE_SIZE", "10000"))
+_ACCESS_LOG_FILE = os.getenv("ACCESS_LOG_FILE")
+
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger(ACCESS_LOGGER)
+
+_LISTENER: Optional[logging.handlers.QueueListener] = None
+_QUEUE_HANDLER: Optional["_DroppingQueueHandler"] = None
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """'/health=0.01,/metrics=0' -> {'/health': 0.01, '/metrics': 0.0}."""
+    rates: Dict[str, float] = {}
+    for item in (spec or "").split(","):
+        path, sep, rate = item.strip().partition("=")
+        if not sep or not path:
+            continue
+        try:
+            rates[path] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            logger.warning(f"Ignoring invalid ACCESS_LOG_SAMPLE entry: {item!r}")
+    return rates
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, q: "queue.Queue[logging.LogRecord]"):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONAccessFormatter(logging.Formatter):
+    """Serializes the record's `access` fields; runs on the listener thread."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "access", None) or {"message": record.getMessage()}
+        ts = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z"
+        return json.dumps({"ts": ts, **fields}, separators=(",", ":"), default=str)
+
+
+def setup_logging() -> None:
+    """Send access records through a queue drained by a listener thread (idempotent)."""
+    global _LISTENER, _QUEUE_HANDLER
+    if _LISTENER is not None:
+        return
+    if _ACCESS_LOG_FILE:
+        handler: logging.Handler = logging.FileHandler(_ACCESS_LOG_FILE, encoding="utf-8")
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JSONAccessFormatter())
+
+    q: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=_QUEUE_SIZE)
+    _QUEUE_HANDLER = _DroppingQueueHandler(q)
+    access_logger.addHandler(_QUEUE_HANDLER)
+    access_logger.setLevel(logging.INFO)
+    # JSON lines only: keep access records out of the root handlers' text format
+    access_logger.propagate = False
+    _LISTENER = logging.handlers.QueueListener(q, handler)
+    _LISTENER.start()
+    # Not stopped in the app lifespan: requests may still log after it (e.g. tests)
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _LISTENER
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        _LISTENER = None
+
+
+def logging_stats() -> Dict[str, Any]:
+    handler = _QUEUE_HANDLER
+    return {
+        "queued": handler.queue.qsize() if handler else 0,
+        "dropped": handler.dropped if handler else 0,
+        "listener": _LISTENER is not None,
+    }
+
+
+class AccessLogMiddleware:
+    def __init__(self, app, sample_rates: Optional[Dict[str, float]] = None):
+        self.app = app
+        self.sample_rates = parse_sample_rates(_SAMPLE) if sample_rates is None else sample_rates
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        token = request_context.begin()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        path = scope.get("path", "")
+        try:
+            await self.app(scope, receive, send_with_status)
+        except Exception as e:
+            status = 500
+            logger.exception(f"Unhandled exception on {scope.get('method')} {path}: {e}")
+            raise
+        finally:
+            fields = request_context.end(token)
+            rate = self.sample_rates.get(path, 1.0)
+            if status >= 500 or rate >= 1.0 or random.random() < rate:
+                client = scope.get("client")
+                record = {
+                    "method": scope.get("method"),
+                    "path": path,
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - start) * 1000.0, 2),
+                    "client": client[0] if client else None,
+                    **fields,
+                }
+                if rate < 1.0:
+                    record["sample_rate"] = rate
+                access_logger.info("access", extra={"access": record})
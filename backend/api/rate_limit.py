@@ -0,0 +1,246 @@
+"""Per-client rate limiting as pure ASGI middleware (GCRA).
+
+The generic cell rate algorithm keeps one number per client, its theoretical
+arrival time (TAT). Each request moves the TAT forward by the emission
+interval (60 / REQUESTS_PER_MINUTE seconds). A request is refused when that
+would put the TAT more than RATE_LIMIT_BURST intervals ahead of now. Clients
+may therefore burst up to RATE_LIMIT_BURST requests (default: the per-minute
+limit) and are then held to the steady rate.
+
+A client whose TAT has passed is indistinguishable from a new one, so idle
+state can be dropped at any time:
+
+- memory (default): per-process LRU of at most RATE_LIMIT_MAX_CLIENTS entries;
+  idle clients are evicted as requests come in.
+- sqlite: one table shared by every worker on the host (RATE_LIMIT_DB), so N
+  workers enforce one limit instead of N. Each check is a single atomic
+  UPSERT; idle rows are deleted periodically. The write never runs on the
+  event loop: the middleware hands it to the store's one-thread executor
+  (writes are serialized by a lock anyway). The busy timeout is short
+  (RATE_LIMIT_DB_TIMEOUT, default 0.1s), so contention on the file delays
+  only the rate-limit decision and never the loop. If the database is busy
+  or unavailable, the request is allowed (fail open) and a warning is logged.
+"""
+import os
+import math
+import asyncio
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from dotenv import load_dotenv
+from starlette.responses import JSONResponse
+
+try:
+    from backend.services.executor import InstrumentedExecutor
+except ModuleNotFoundError:
+    from services.executor import InstrumentedExecutor
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+_DB_PATH = os.getenv("RATE_LIMIT_DB") or os.path.join(os.path.dirname(__file__), "..", "data", "ratelimit.db")
+_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+_PRUNE_INTERVAL = float(os.getenv("RATE_LIMIT_PRUNE_INTERVAL", "60"))
+_DB_TIMEOUT = float(os.getenv("RATE_LIMIT_DB_TIMEOUT", "0.1"))
+_EVICT_PER_CHECK = 8  # idle entries dropped per request; keeps eviction O(1) amortized
+
+BACKENDS = ("memory", "sqlite")
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: float  # seconds until the next request would be allowed (0 when allowed)
+    reset_after: float  # seconds until the client's full burst is available again
+
+
+class MemoryStore:
+    """Client TATs for one process, bounded by max_clients (least recently seen evicted first)."""
+
+    executor = None  # updates are a dict operation; they run inline on the event loop
+
+    def __init__(self, max_clients: int = _MAX_CLIENTS):
+        self.max_clients = max(1, max_clients)
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def update(self, key: str, now: float, interval: float, tolerance: float) -> Tuple[bool, float]:
+        """Apply one request; returns (allowed, TAT after the decision)."""
+        with self._lock:
+            tat = max(self._tats.get(key, now), now)
+            new_tat = tat + interval
+            allowed = new_tat - now <= tolerance
+            if allowed:
+                self._tats[key] = new_tat
+            if key in self._tats:
+                self._tats.move_to_end(key)
+            self._evict(now)
+            return allowed, (new_tat if allowed else tat)
+
+    def _evict(self, now: float) -> None:
+        # Oldest entries first: drop those already back to a full burst, then any beyond the cap
+        for _ in range(_EVICT_PER_CHECK):
+            if not self._tats:
+                return
+            key, tat = next(iter(self._tats.items()))
+            if tat > now:
+                break
+            del self._tats[key]
+        while len(self._tats) > self.max_clients:
+            self._tats.popitem(last=False)
+            self.evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "clients": len(self._tats), "max_clients": self.max_clients, "evicted": self.evicted}
+
+
+_SQL_CREATE = "CREATE TABLE IF NOT EXISTS rate_limit (key TEXT PRIMARY KEY, tat REAL NOT NULL)"
+# One statement, so the read-modify-write is atomic across processes. A new key
+# is always allowed; an existing one is only advanced when within tolerance, and
+# RETURNING yields no row when the request is refused.
+_SQL_UPDATE = (
+    "INSERT INTO rate_limit (key, tat) VALUES (:key, :now + :interval) "
+    "ON CONFLICT(key) DO UPDATE SET tat = max(tat, :now) + :interval "
+    "WHERE max(tat, :now) + :interval - :now <= :tolerance "
+    "RETURNING tat"
+)
+_SQL_GET = "SELECT tat FROM rate_limit WHERE key = ?"
+_SQL_PRUNE = "DELETE FROM rate_limit WHERE tat <= ?"
+
+
+class SQLiteStore:
+    """Client TATs in a SQLite table shared by all workers; rows of idle clients are pruned."""
+
+    def __init__(self, path: str = _DB_PATH, prune_interval: float = _PRUNE_INTERVAL, timeout: float = _DB_TIMEOUT):
+        self.path = path
+        self.prune_interval = prune_interval
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        # Autocommit: every statement is its own transaction
+        self._conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SQL_CREATE)
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+        self.errors = 0
+        self.pruned = 0
+        # Off-loop writes (see GCRALimiter.acheck); one thread, since the lock serializes them
+        self.executor = InstrumentedExecutor(max_workers=1, thread_name_prefix="ratelimit")
+
+    def update(self, key: str, now: float, interval: float, tolerance: float) -> Tuple[bool, float]:
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    _SQL_UPDATE, {"key": key, "now": now, "interval": interval, "tolerance": tolerance}
+                ).fetchone()
+                if row is not None:
+                    result = (True, row[0])
+                else:
+                    stored = self._conn.execute(_SQL_GET, (key,)).fetchone()
+                    result = (False, stored[0] if stored else now)
+                if now - self._pruned_at >= self.prune_interval:
+                    self._pruned_at = now
+                    self.pruned += self._conn.execute(_SQL_PRUNE, (now,)).rowcount
+            return result
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"Rate limit store unavailable, allowing request: {e}")
+            return True, now + interval
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            clients = self._conn.execute("SELECT count(*) FROM rate_limit").fetchone()[0]
+        return {
+            "backend": "sqlite", "path": self.path, "clients": clients, "pruned": self.pruned,
+            "errors": self.errors, "executor": self.executor.stats(),
+        }
+
+
+def make_store(backend: str = _BACKEND):
+    if backend not in BACKENDS:
+        raise ValueError(f"RATE_LIMIT_BACKEND must be one of {', '.join(BACKENDS)}")
+    if backend == "sqlite":
+        return SQLiteStore()
+    return MemoryStore()
+
+
+class GCRALimiter:
+    def __init__(self, requests_per_minute: int, burst: Optional[int] = None, store=None,
+                 clock: Callable[[], float] = time.time):
+        self.requests_per_minute = requests_per_minute
+        self.burst = max(1, burst or requests_per_minute)
+        self.interval = 60.0 / requests_per_minute
+        self.tolerance = self.interval * self.burst
+        self.store = store if store is not None else MemoryStore()
+        # Wall-clock time: TATs in a shared store must mean the same thing in every process
+        self._clock = clock
+
+    def check(self, key: str) -> Decision:
+        now = self._clock()
+        allowed, tat = self.store.update(key, now, self.interval, self.tolerance)
+        ahead = max(0.0, tat - now)
+        if allowed:
+            remaining = int((self.tolerance - ahead) / self.interval + 1e-9)
+            return Decision(True, max(0, remaining), 0.0, ahead)
+        retry_after = tat + self.interval - self.tolerance - now
+        return Decision(False, 0, max(0.0, retry_after), ahead)
+
+    async def acheck(self, key: str) -> Decision:
+        """check() without blocking the event loop on stores that do I/O."""
+        executor = getattr(self.store, "executor", None)
+        if executor is None:
+            return self.check(key)
+        return await asyncio.get_running_loop().run_in_executor(executor, self.check, key)
+
+
+class RateLimitMiddleware:
+    """Pure ASGI: no per-request task or body stream wrapping, only a send() hook to add headers."""
+
+    def __init__(self, app, requests_per_minute: int = 60, burst: Optional[int] = None, store=None,
+                 clock: Callable[[], float] = time.time):
+        self.app = app
+        self.requests_per_minute = requests_per_minute
+        self.limiter = (
+            GCRALimiter(requests_per_minute, burst, store if store is not None else make_store(), clock)
+            if requests_per_minute > 0 else None
+        )
+
+    def _headers(self, decision: Decision, now: float) -> List[Tuple[bytes, bytes]]:
+        return [
+            (b"x-ratelimit-limit", str(self.requests_per_minute).encode()),
+            (b"x-ratelimit-remaining", str(decision.remaining).encode()),
+            (b"x-ratelimit-reset", str(int(math.ceil(now + decision.reset_after))).encode()),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.limiter is None:
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client")
+        decision = await self.limiter.acheck(client[0] if client else "anonymous")
+        headers = self._headers(decision, time.time())
+
+        if not decision.allowed:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded. Try again later."},
+                headers={"Retry-After": str(max(1, int(math.ceil(decision.retry_after))))},
+            )
+            response.raw_headers.extend(headers)
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -1,11 +1,19 @@
-from fastapi import APIRouter, HTTPException
+import json
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 
 # Support both running as package (backend.*) and as top-level (uvicorn api.main)
 try:
     from backend.agents.graph import run_pipeline
-    from backend.services.llm import get_llm
+    from backend.agents.batch import run_batch, BATCH_CONCURRENCY, ORDERS
+    from backend.agents.draft_node import stream_draft_reply
+    from backend.services.llm import get_llm, llm_executor_stats
+    from backend.services.llm_scheduler import get_scheduler
+    from backend.services.cache import cache_stats
+    from backend.services.singleflight import singleflight_stats
+    from backend.services.vectorstore import retrieval_cache_stats
     from backend.models.schemas import (
         AnalyzeRequest,
         AnalyzeResponse,
@@ -16,7 +24,13 @@ try:
     )
 except ModuleNotFoundError:
     from agents.graph import run_pipeline
-    from services.llm import get_llm
+    from agents.batch import run_batch, BATCH_CONCURRENCY, ORDERS
+    from agents.draft_node import stream_draft_reply
+    from services.llm import get_llm, llm_executor_stats
+    from services.llm_scheduler import get_scheduler
+    from services.cache import cache_stats
+    from services.singleflight import singleflight_stats
+    from services.vectorstore import retrieval_cache_stats
     from models.schemas import (
         AnalyzeRequest,
         AnalyzeResponse,
@@ -29,6 +43,17 @@ except ModuleNotFoundError:
 router = APIRouter()
 
 
+def _debug_trace(payload, result):
+    return result.get("trace") if payload.debug else None
+
+
+def _model_dict(model):
+    # Pydantic v1 uses .dict(), v2 uses .model_dump()
+    if hasattr(model, "model_dump"):
+        return model.model_dump()
+    return model.dict()
+
+
 @router.post("/analyze", response_model=AnalyzeResponse)
 async def analyze_email(payload: AnalyzeRequest):
     try:
@@ -38,7 +63,7 @@ async def analyze_email(payload: AnalyzeRequest):
             mode="analyze",
             debug=payload.debug or False,
         )
-        return AnalyzeResponse(**result["analysis"])
+        return AnalyzeResponse(**result["analysis"], trace=_debug_trace(payload, result))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -63,11 +88,55 @@ async def draft_reply(payload: DraftRequest):
                 "We will respond with more detail after internal consultation.\n\n"
                 "Best regards,\nLegal Team"
             )
-        return DraftResponse(draft=draft_val, risk_score=result.get("risk_score"))
+        return DraftResponse(draft=draft_val, risk_score=result.get("risk_score"), trace=_debug_trace(payload, result))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/draft/stream")
+async def draft_stream(payload: DraftRequest):
+    """Stream a draft as server-sent events.
+
+    Events: "analysis" (the given analysis, or one computed first), then
+    "token" chunks ({"text"}) as the model writes, then "done" with the full
+    draft and risk_score. "error" is sent if generation fails midway.
+    """
+    async def _events():
+        # Flush headers right away so clients see the first byte before any LLM call
+        yield ": stream open\n\n"
+        try:
+            analysis = _model_dict(payload.analysis) if payload.analysis else None
+            if analysis is None:
+                result = await run_pipeline(
+                    email_text=payload.email_text,
+                    contract_snippet=payload.contract_snippet,
+                    mode="analyze",
+                )
+                analysis = result["analysis"]
+            yield _sse("analysis", analysis)
+            state = {
+                "email_text": payload.email_text,
+                "contract_snippet": payload.contract_snippet,
+                "analysis": analysis,
+                "variant": payload.variant,
+            }
+            async for event in stream_draft_reply(state):
+                kind = event.pop("event")
+                yield _sse(kind, event)
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/process", response_model=ProcessResponse)
 async def process(payload: ProcessRequest):
     try:
@@ -85,20 +154,80 @@ async def process(payload: ProcessRequest):
                 "We will respond with more detail after internal consultation.\n\n"
                 "Best regards,\nLegal Team"
             )
-        return ProcessResponse(analysis=result["analysis"], draft=draft_val, risk_score=result.get("risk_score"))
+        return ProcessResponse(
+            analysis=result["analysis"],
+            draft=draft_val,
+            risk_score=result.get("risk_score"),
+            trace=_debug_trace(payload, result),
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/batch/process")
+async def batch_process(
+    request: Request,
+    concurrency: int = Query(default=BATCH_CONCURRENCY, ge=1),
+    order: str = Query(default="input"),
+):
+    """Process a JSONL body of {"email_text", "id"?, "contract_snippet"?} records.
+
+    Streams one NDJSON result per record (input or completion order), then a
+    final {"summary": ...} line with throughput and per-stage timing.
+    """
+    if order not in ORDERS:
+        raise HTTPException(status_code=422, detail=f"order must be one of {', '.join(ORDERS)}")
+    # Read the body up front: once the response starts streaming, Starlette
+    # consumes receive() to watch for client disconnects.
+    lines = (await request.body()).split(b"\n")
+
+    async def _ndjson():
+        async for result in run_batch(lines, concurrency=concurrency, order=order):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
+
+
 @router.get("/models")
 async def models():
-    """Return the current Gemini model candidates in use (for debugging)."""
+    """Return the Gemini candidates with per-model health, breaker state, scheduler queues and LLM pool saturation."""
+    llm = get_llm()
+    router = getattr(llm, "router", None)
+    if router is None:
+        # Mock LLM: no remote models
+        return {"candidates": [], "current": None, "models": [], "scheduler": {}, "executor": llm_executor_stats()}
+    return {
+        "candidates": router.candidates,
+        # The model the next call would be routed to
+        "current": router.preview(),
+        "models": router.stats(),
+        "discovery": llm.discovery_status(),
+        "scheduler": get_scheduler().stats(),
+        "executor": llm_executor_stats(),
+    }
+
+
+@router.post("/models/refresh")
+async def refresh_models():
+    """Force model discovery now (bypassing the cache TTL) and return the new candidate list.
+
+    502 when discovery fails; the previous (possibly stale) candidates stay in use,
+    see /api/models for their discovery status.
+    """
     llm = get_llm()
-    names = []
+    if not hasattr(llm, "refresh_models"):
+        raise HTTPException(status_code=409, detail="Model discovery needs the Gemini LLM (GEMINI_API_KEY)")
     try:
-        # best-effort introspection
-        names = getattr(llm, "_candidates", []) or []
-        current = getattr(llm, "_candidates", [None])[getattr(llm, "_idx", 0)] if names else None
-    except Exception:
-        current = None
-    return {"candidates": names, "current": current}
+        candidates = await llm.refresh_models(force=True)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Model discovery failed: {e}")
+    return {"candidates": candidates, "discovery": llm.discovery_status()}
+
+
+@router.get("/cache/stats")
+async def cache_statistics():
+    """Return cache tier counters and single-flight stats ('coalesced' = LLM calls saved)."""
+    stats = cache_stats()
+    stats["singleflight"] = singleflight_stats()
+    stats["retrieval"] = retrieval_cache_stats()
+    return stats
@@ -0,0 +1,85 @@
+"""BM25 query latency over a large synthetic clause corpus, plus hybrid fusion cost.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_bm25 [--clauses 100000] [--queries 2000]
+"""
+import argparse
+import random
+import statistics
+import time
+
+try:
+    from backend.services.bm25 import BM25Index, reciprocal_rank_fusion
+except ModuleNotFoundError:
+    from services.bm25 import BM25Index, reciprocal_rank_fusion
+
+TITLES = [
+    "Confidentiality", "Data Security", "Limitation of Liability", "Termination", "Payment Terms",
+    "Indemnification", "Governing Law", "Force Majeure", "Assignment", "Warranties", "Audit Rights",
+]
+WORDS = (
+    "party parties agreement supplier customer services deliverables fees invoice notice days written consent "
+    "breach remedy damages indirect consequential gross negligence misconduct information disclosure law court "
+    "jurisdiction obligations performance milestone acceptance warranty defect repair replacement insurance "
+    "subcontractor personnel records audit data processing security measures incident notification term renewal"
+).split()
+QUERIES = [
+    "limitation of liability", "clause 10.2", "termination for convenience notice", "confidential information",
+    "indemnification third party claims", "payment withholding invoice dispute", "force majeure event",
+    "data security incident notification", "audit records",
+]
+
+
+def _corpus(n: int, rng: random.Random):
+    # Zipf-distributed vocabulary: the legal terms are the frequent head, synthetic
+    # terms the long tail, as in real contract language
+    vocab = WORDS + [f"term{i}" for i in range(20_000)]
+    weights = [1.0 / (rank + 1) ** 1.05 for rank in range(len(vocab))]
+    out = []
+    for i in range(n):
+        title = rng.choice(TITLES)
+        body = " ".join(rng.choices(vocab, weights=weights, k=rng.randint(25, 70)))
+        out.append(f"Clause {i // 10 + 1}.{i % 10 + 1} ({title}): {body}.")
+    return out
+
+
+def _pct(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clauses", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    texts = _corpus(args.clauses, rng)
+    start = time.perf_counter()
+    index = BM25Index(texts)
+    print(f"indexed {len(index):,} clauses ({index.vocabulary_size:,} terms) in {time.perf_counter() - start:.2f}s")
+
+    per_query = {}
+    for i in range(args.queries):
+        q = QUERIES[i % len(QUERIES)]
+        t0 = time.perf_counter()
+        index.search(q, args.k)
+        per_query.setdefault(q, []).append((time.perf_counter() - t0) * 1e6)
+    everything = [x for v in per_query.values() for x in v]
+    print(f"{'query':<38} {'p50 us':>8} {'p99 us':>8}")
+    for q, samples in per_query.items():
+        print(f"{q:<38} {statistics.median(samples):>8.0f} {_pct(samples, 0.99):>8.0f}")
+    print(f"{'all':<38} {statistics.median(everything):>8.0f} {_pct(everything, 0.99):>8.0f}")
+
+    dense = [(i, 1.0 / (i + 1)) for i in range(20)]
+    sparse = index.search("limitation of liability", 20)
+    t0 = time.perf_counter()
+    for _ in range(10_000):
+        reciprocal_rank_fusion([dense, sparse], args.k)
+    print(f"rrf fusion of 2x20 candidates: {(time.perf_counter() - t0) / 10_000 * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Throughput of the persistent cache tier (hits and misses per second).
+
+Compares the pooled WAL store against the previous connect-per-call access
+pattern at several thread concurrencies.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_cache [--keys 2000] [--ops 20000]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from backend.services import cache
+except ModuleNotFoundError:
+    from services import cache
+
+CONCURRENCY = (1, 16, 64)
+
+
+def _legacy_get(path: str, key: str):
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    cur.execute("SELECT v, exp FROM cache WHERE k=?", (key,))
+    row = cur.fetchone()
+    conn.close()
+    return row
+
+
+def _run(fn, keys, ops: int, workers: int) -> float:
+    per_worker = max(1, ops // workers)
+
+    def worker(offset: int):
+        n = len(keys)
+        for i in range(per_worker):
+            fn(keys[(offset + i) % n])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker, range(0, workers * 97, 97)))
+    elapsed = time.perf_counter() - start
+    return per_worker * workers / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=2000)
+    parser.add_argument("--ops", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench_cache.db")
+        store = cache._SQLiteStore(path)
+        value = {"draft": "Thank you for your message. " * 20, "risk_score": 25}
+        hit_keys = [f"bench:hit:{i}" for i in range(args.keys)]
+        miss_keys = [f"bench:miss:{i}" for i in range(args.keys)]
+        exp = time.time() + 3600
+        for k in hit_keys:
+            store.set(k, cache._CODEC.encode(value), exp)
+        store.flush()
+
+        print(f"{'store':<10} {'workers':>7} {'hits/s':>12} {'misses/s':>12}")
+        for workers in CONCURRENCY:
+            for label, fn in (("pooled", store.get), ("legacy", lambda k: _legacy_get(path, k))):
+                ops = args.ops if label == "pooled" else max(workers, args.ops // 10)
+                hits = _run(fn, hit_keys, ops, workers)
+                misses = _run(fn, miss_keys, ops, workers)
+                print(f"{label:<10} {workers:>7} {hits:>12,.0f} {misses:>12,.0f}")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Encode/decode cost and stored size of cache codecs versus repr()/literal_eval.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_codec [--repeat 2000]
+"""
+import argparse
+import ast
+import time
+
+try:
+    from backend.services.codec import Codec, HAVE_MSGPACK, HAVE_ZSTD
+except ModuleNotFoundError:
+    from services.codec import Codec, HAVE_MSGPACK, HAVE_ZSTD
+
+
+def _sample_values():
+    analysis = {
+        "intent": "requesting approval and clarification",
+        "primary_topic": "MSA amendments",
+        "parties": {"client": "Helios Labs", "counterparty": "Quantum Systems Ltd."},
+        "agreement_reference": {"type": "Statement of Work", "date": "12 February 2024"},
+        "questions": [f"Could you clarify the liability position for milestone {i}?" for i in range(12)],
+        "requested_due_date": "end of week",
+        "urgency_level": "medium",
+    }
+    draft = {
+        "draft": "Subject: Re: Your email\n\n" + "Thank you for your message. We are reviewing clause 10.2. " * 40,
+        "risk_score": 45,
+    }
+    return {"analysis": analysis, "draft": draft}
+
+
+def _time(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    codecs = [("json", "none"), ("json", "zlib"), ("pickle", "zlib")]
+    if HAVE_MSGPACK:
+        codecs += [("msgpack", "none"), ("msgpack", "zlib")]
+        if HAVE_ZSTD:
+            codecs.append(("msgpack", "zstd"))
+
+    print(f"{'value':<9} {'codec':<15} {'encode us':>10} {'decode us':>10} {'bytes':>7}")
+    for name, value in _sample_values().items():
+        text = repr(value)
+        enc = _time(lambda: repr(value), args.repeat)
+        dec = _time(lambda: ast.literal_eval(text), args.repeat)
+        print(f"{name:<9} {'repr/literal':<15} {enc:>10.1f} {dec:>10.1f} {len(text.encode('utf-8')):>7}")
+        for ser, comp in codecs:
+            codec = Codec(ser, comp, compress_threshold=512)
+            blob = codec.encode(value)
+            assert codec.decode(blob) == value
+            enc = _time(lambda: codec.encode(value), args.repeat)
+            dec = _time(lambda: codec.decode(blob), args.repeat)
+            print(f"{name:<9} {ser + '+' + comp:<15} {enc:>10.1f} {dec:>10.1f} {len(blob):>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Per-request overhead of building the LangGraph workflow versus reusing it.
+
+Runs draft-mode pipelines against a warm cache (the draft node returns a
+cached result), so the measured time is dominated by graph construction and
+execution overhead rather than the LLM.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_graph [--requests 500]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+try:
+    from backend.agents import graph
+except ModuleNotFoundError:
+    from agents import graph
+
+ANALYSIS = {
+    "intent": "approval_request",
+    "primary_topic": "MSA amendments",
+    "parties": {"client": "Helios Labs", "counterparty": ""},
+    "agreement_reference": {"type": "MSA", "date": ""},
+    "questions": ["Could you clarify the liability limits?"],
+    "requested_due_date": "end of week",
+    "urgency_level": "medium",
+}
+
+
+async def _latencies(n: int):
+    out = []
+    for _ in range(n):
+        start = time.perf_counter()
+        await graph.run_pipeline(
+            email_text="Please approve the MSA changes.",
+            contract_snippet="Clause 10.2",
+            analysis=ANALYSIS,
+            mode="draft",
+        )
+        out.append((time.perf_counter() - start) * 1000)
+    return out
+
+
+def _report(label: str, samples):
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<22} p50={p50:7.3f}ms  p95={p95:7.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    if not graph._HAS_LANGGRAPH:
+        print("langgraph is not installed; nothing to compare")
+        return
+
+    start = time.perf_counter()
+    for _ in range(50):
+        graph._build_graph("process")
+    print(f"build+compile          {(time.perf_counter() - start) / 50 * 1000:7.3f}ms per graph")
+
+    asyncio.run(_latencies(5))  # populate the draft cache
+    cached_getter = graph.get_compiled_graph
+    graph.get_compiled_graph = graph._build_graph
+    try:
+        _report("rebuild per request", asyncio.run(_latencies(args.requests)))
+    finally:
+        graph.get_compiled_graph = cached_getter
+    _report("compiled once", asyncio.run(_latencies(args.requests)))
+
+
+if __name__ == "__main__":
+    main()
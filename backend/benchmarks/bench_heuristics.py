@@ -0,0 +1,115 @@
+"""Keyword heuristics on long threads: per-heuristic substring scans versus one shared scan.
+
+The legacy path mirrors the previous heuristics: every function lowercased the
+email again, ran ``keyword in text`` for each keyword it knew and tried every
+due-date regex. The shared path lowercases once and collects every keyword hit
+up front (``heuristics.scan_text``), on the Aho-Corasick automaton when
+pyahocorasick is installed; without it the scan only lowercases and each
+keyword is checked with ``in`` when a heuristic first asks for it. The scan
+cache is cleared per email so each iteration pays for one full scan.
+
+Threads are generated with and without keyword cues. With cues the legacy
+checks stop at the first occurrence; without them every check reads the whole
+thread, which is the worst case for the old code.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_heuristics [--size-kb 50] [--emails 50]
+"""
+import argparse
+import random
+import time
+
+try:
+    from backend.agents import heuristics as h
+except ModuleNotFoundError:
+    from agents import heuristics as h
+
+_FILLER = (
+    "the parties agree that the services shall continue under the current schedule and "
+    "counsel will review the deliverables with the project team before the next meeting"
+).split()
+_CUES = ["Please approve the revised terms.", "Can you clarify the liability cap?", "We need this by end of week."]
+
+
+def _thread(size: int, seed: int, cues: bool = True) -> str:
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        line = " ".join(rng.choice(_FILLER) for _ in range(14)).capitalize() + "."
+        if cues and rng.random() < 0.05:
+            line = "> " + rng.choice(_CUES)
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+def _legacy(text: str):
+    # Each heuristic lowercased and scanned on its own, as before the shared scan
+    lower = text.lower()
+    urgency = next(
+        (lvl for lvl, kws in (("high", h._HIGH_URGENCY_KEYWORDS), ("medium", h._MEDIUM_URGENCY_KEYWORDS), ("low", h._LOW_URGENCY_KEYWORDS))
+         if any(k in lower for k in kws)),
+        "",
+    )
+    lower = text.lower()
+    intent = ""
+    if ("approve" in lower or "approval" in lower) and ("clarify" in lower or "clarification" in lower):
+        intent = "requesting approval and clarification"
+    else:
+        intent = next((label for label, kws in h.INTENT_SYNONYM_GROUPS if any(k in lower for k in kws)), "")
+    lower = text.lower()
+    topic = "MSA amendments" if "msa" in lower and any(k in lower for k in h._TOPIC_CHANGE_KEYWORDS) else ""
+    lower = text.lower()
+    due = next((p.search(lower) for p, _, _ in h._DUE_DATE_PATTERNS if p.search(lower)), None)
+    liability = "liability" in text.lower()
+    return urgency, intent, topic, bool(due), liability
+
+
+def _compiled(text: str):
+    h.scan_text.cache_clear()
+    return (
+        h.extract_urgency(text, ""),
+        h.refine_intent(text, ""),
+        h.refine_topic(text, ""),
+        bool(h.extract_due_date(text, "")),
+        "liability" in h.scan_text(text).hits,
+    )
+
+
+def _time(fn, emails):
+    start = time.perf_counter()
+    for text in emails:
+        fn(text)
+    return (time.perf_counter() - start) / len(emails) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-kb", type=int, default=50)
+    parser.add_argument("--emails", type=int, default=50)
+    args = parser.parse_args()
+
+    automaton = h._MATCHER
+    on_demand = h.KeywordMatcher(automaton.keywords, use_automaton=False)
+    print(f"{args.emails} threads of {args.size_kb}KB")
+    for cues in (True, False):
+        emails = [_thread(args.size_kb * 1024, seed, cues) for seed in range(args.emails)]
+        for text in emails[:5]:
+            assert _compiled(text) == _legacy(text), "compiled heuristics disagree with the legacy scans"
+        _time(_legacy, emails[:3])  # warm up
+        legacy = _time(_legacy, emails)
+        print(f"  {'with cues' if cues else 'no cues'}")
+        print(f"    per-heuristic scans    {legacy:8.3f}ms per email")
+        for matcher in dict.fromkeys((automaton, on_demand)):
+            h._MATCHER = matcher
+            try:
+                _time(_compiled, emails[:3])
+                compiled = _time(_compiled, emails)
+            finally:
+                h._MATCHER = automaton
+            print(f"    shared scan ({matcher.engine:<12}) {compiled:8.3f}ms per email  ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
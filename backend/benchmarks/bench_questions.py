@@ -0,0 +1,134 @@
+"""extract_questions on growing reply chains: previous implementation versus the fused one.
+
+The legacy copy below is the previous extract_questions: ten hint regexes per
+sentence, the question norm recomputed inside an any() over every output, and
+six substitutions per question for the near-duplicate core. Both versions run
+on the same threads and must return the same questions.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_questions [--sizes 1,10,100] [--repeat 20]
+"""
+import argparse
+import random
+import re
+import time
+from typing import List
+
+try:
+    from backend.agents import heuristics as h
+except ModuleNotFoundError:
+    from agents import heuristics as h
+
+_SENTENCES = [
+    "Thanks for the update on the draft.",
+    "We reviewed the revised schedule with the team.",
+    "Can you confirm the delivery date for milestone {n}?",
+    "Could you send the signed copy of amendment {n}.",
+    "Please advise whether we can withhold payment {n}.",
+    "Additionally, can we extend the notice period for clause {n}?",
+    "The liability cap in section {n} still looks high.",
+    "Would you share the redlines by Friday.",
+    "Noted, we will follow up internally.",
+    "What is the status of invoice {n}?",
+]
+
+
+def _thread(size: int, seed: int) -> str:
+    rng = random.Random(seed)
+    parts: List[str] = []
+    total = 0
+    while total < size:
+        # Small n keeps some exact and near duplicates, as quoted replies do
+        s = rng.choice(_SENTENCES).format(n=rng.randint(1, 40))
+        parts.append(s)
+        total += len(s) + 1
+    return " ".join(parts)[:size]
+
+
+def _legacy(email_text: str, existing_questions: List[str]) -> List[str]:
+    norm_map = {}
+    out: List[str] = []
+
+    def _norm(q: str) -> str:
+        return re.sub(r"[^a-z0-9]+", " ", q.lower()).strip()
+
+    for q in existing_questions:
+        n = _norm(q)
+        if n not in norm_map:
+            norm_map[n] = q
+            out.append(q)
+    for s in re.split(r"(?<=[?!.])\s+", email_text):
+        sl = s.lower().strip()
+        if not sl:
+            continue
+        is_question = sl.endswith("?")
+        if not is_question and any(p.search(sl) for p in h.QUESTION_HINT_PATTERNS):
+            is_question = True
+        if not is_question:
+            continue
+        if 5 <= len(sl) <= 220:
+            candidate = s.strip()
+            if not candidate.endswith("?"):
+                candidate = re.sub(r"\.$", "?", candidate) if candidate.endswith(".") else candidate + "?"
+            n = _norm(candidate)
+            if n not in norm_map:
+                norm_map[n] = candidate
+                out.append(candidate)
+    if "liability" in email_text.lower():
+        has_liability = any(
+            "liability" in _norm(q) and ("clarify" in _norm(q) or "can we" in _norm(q) or "could we" in _norm(q))
+            for q in out
+        )
+        if not has_liability:
+            out.append("Can we clarify the liability limits?")
+    core_map = {}
+    cleaned: List[str] = []
+
+    def _core(q: str) -> str:
+        ql = q.lower()
+        ql = re.sub(r"^(additionally,\s*)", "", ql)
+        ql = re.sub(r"^(please\s+advise\s+whether\s*)", "", ql)
+        ql = re.sub(r"^(can we\s+)", "", ql)
+        ql = re.sub(r"^(could you\s+)", "", ql)
+        ql = re.sub(r"^(would you\s+)", "", ql)
+        ql = re.sub(r"^(please\s+)", "", ql)
+        ql = re.sub(r"\?+$", "", ql).strip()
+        return ql
+
+    for q in out:
+        c = _core(q)
+        if c not in core_map:
+            core_map[c] = q
+            cleaned.append(q)
+    return cleaned
+
+
+def _current(email_text: str, existing_questions: List[str]) -> List[str]:
+    h.scan_text.cache_clear()
+    return h.extract_questions(email_text, existing_questions)
+
+
+def _time(fn, text: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text, ["Can you confirm the delivery date for milestone 1?"])
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,10,100", help="thread sizes in KB")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for kb in (int(x) for x in args.sizes.split(",")):
+        text = _thread(kb * 1024, kb)
+        existing = ["Can you confirm the delivery date for milestone 1?"]
+        assert _current(text, existing) == _legacy(text, existing), "extract_questions output changed"
+        legacy = _time(_legacy, text, args.repeat)
+        current = _time(_current, text, args.repeat)
+        print(f"{kb:>4}KB  legacy {legacy:9.3f}ms  fused {current:9.3f}ms  ({legacy / current:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
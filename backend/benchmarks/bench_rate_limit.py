@@ -0,0 +1,116 @@
+"""Per-request overhead of the rate limiting middleware.
+
+Drives a trivial ASGI app directly (no HTTP server or client) through:
+- no middleware (baseline),
+- the previous BaseHTTPMiddleware fixed-window limiter (copied below),
+- the pure ASGI GCRA limiter with the in-memory store,
+- the same limiter with the shared SQLite store.
+Requests rotate over --clients addresses with a limit high enough that none is
+refused, so only the bookkeeping is measured. It also reports how many clients
+each limiter keeps in memory afterwards.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_rate_limit [--requests 20000] [--clients 5000]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse
+
+try:
+    from backend.api.rate_limit import MemoryStore, RateLimitMiddleware, SQLiteStore
+except ModuleNotFoundError:
+    from api.rate_limit import MemoryStore, RateLimitMiddleware, SQLiteStore
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, requests_per_minute: int = 60):
+        super().__init__(app)
+        self.requests_per_minute = requests_per_minute
+        self.allowance = {}
+        self.window = 60
+
+    async def dispatch(self, request, call_next):
+        client_ip = request.client.host if request.client else "anonymous"
+        now = int(time.time())
+        bucket = self.allowance.get(client_ip)
+        if not bucket:
+            bucket = {"reset": now + self.window, "count": 0}
+            self.allowance[client_ip] = bucket
+        if now > bucket["reset"]:
+            bucket["reset"] = now + self.window
+            bucket["count"] = 0
+        bucket["count"] += 1
+        if bucket["count"] > self.requests_per_minute:
+            return JSONResponse(status_code=429, content={"detail": "Rate limit exceeded. Try again later."})
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(self.requests_per_minute)
+        response.headers["X-RateLimit-Remaining"] = str(max(0, self.requests_per_minute - bucket["count"]))
+        response.headers["X-RateLimit-Reset"] = str(bucket["reset"])
+        return response
+
+
+async def _endpoint(scope, receive, send):
+    await PlainTextResponse("ok")(scope, receive, send)
+
+
+async def _drive(app, requests: int, clients: int):
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    samples = []
+    for i in range(requests):
+        c = i % clients
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/health", "raw_path": b"/health", "query_string": b"",
+            "root_path": "", "headers": [], "client": (f"10.{c >> 16}.{(c >> 8) & 255}.{c & 255}", 1234),
+            "server": ("test", 80),
+        }
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def _report(label: str, samples, baseline: float, clients: str = ""):
+    p50 = statistics.median(samples)
+    print(f"{label:<28} p50={p50:8.1f}us  overhead={p50 - baseline:8.1f}us  {clients}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--clients", type=int, default=5000)
+    args = parser.parse_args()
+    rpm = 10 ** 6
+
+    baseline = statistics.median(asyncio.run(_drive(_endpoint, args.requests, args.clients)))
+    _report("no rate limiting", [baseline], baseline)
+
+    legacy = LegacyRateLimitMiddleware(_endpoint, requests_per_minute=rpm)
+    _report("BaseHTTPMiddleware (old)", asyncio.run(_drive(legacy, args.requests, args.clients)), baseline,
+            f"clients kept={len(legacy.allowance)} (never pruned)")
+
+    store = MemoryStore(max_clients=1000)
+    gcra = RateLimitMiddleware(_endpoint, requests_per_minute=rpm, store=store)
+    _report("ASGI GCRA, memory", asyncio.run(_drive(gcra, args.requests, args.clients)), baseline,
+            f"clients kept={store.stats()['clients']} (cap 1000)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_store = SQLiteStore(os.path.join(tmp, "ratelimit.db"))
+        shared = RateLimitMiddleware(_endpoint, requests_per_minute=rpm, store=sqlite_store)
+        _report("ASGI GCRA, sqlite (shared)", asyncio.run(_drive(shared, args.requests, args.clients)), baseline,
+                f"rows={sqlite_store.stats()['clients']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Cost of segmenting a reply chain and how much smaller the LLM input gets.
+
+Builds threads of N messages, each a new message above the previous ones
+with a signature, a confidentiality disclaimer and an "On ... wrote:"
+header. It reports the time for split_email plus llm_email_text (with the
+split cache cleared on every run) and the estimated tokens of the raw thread
+versus the text now sent to the LLM.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.bench_segments [--messages 1,5,20,50] [--repeat 200]
+"""
+import argparse
+import random
+import time
+
+try:
+    from backend.agents import email_segments as es
+except ModuleNotFoundError:
+    from agents import email_segments as es
+
+_LINES = [
+    "Thanks for the revised schedule to the MSA.",
+    "Can we withhold payment under clause 9.2 until the defects are fixed?",
+    "Please confirm the notice period for termination by end of week.",
+    "We have reviewed the liability cap with our finance team.",
+    "Could you send the signed amendment {n} at your earliest convenience?",
+    "Our position on indemnities in section {n} remains unchanged.",
+]
+_DISCLAIMER = (
+    "CONFIDENTIALITY NOTICE: This email and any attachments are confidential and may be "
+    "legally privileged. If you are not the intended recipient, please notify the sender "
+    "and delete it. Any review, use or distribution is prohibited."
+)
+
+
+def _thread(messages: int, seed: int) -> str:
+    rng = random.Random(seed)
+    text = ""
+    for i in range(messages):
+        sender = ("Priya Shah", "Helios Labs") if i % 2 else ("Alex Reed", "Acme Corp")
+        body = " ".join(rng.choice(_LINES).format(n=rng.randint(1, 40)) for _ in range(rng.randint(3, 8)))
+        new = f"Hi,\n\n{body}\n\nBest regards,\n{sender[0]}\nLegal, {sender[1]}\n\n{_DISCLAIMER}\n"
+        text = new + (f"\nOn Mon, 3 Jun 2024 at 10:{i:02d}, {sender[0]} wrote:\n{text}" if text else "")
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", default="1,5,20,50", help="messages per thread")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    for n in (int(x) for x in args.messages.split(",")):
+        text = _thread(n, n)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            es.split_email.cache_clear()
+            out = es.llm_email_text(text)
+        elapsed = (time.perf_counter() - start) / args.repeat * 1000
+        raw, sent = es.estimate_tokens(text), es.estimate_tokens(out)
+        print(f"{n:>3} msgs  {len(text) / 1024:7.1f}KB  segment {elapsed:7.3f}ms  "
+              f"tokens {raw:>7} -> {sent:>5}  ({100 * (1 - sent / raw):.0f}% fewer)")
+
+
+if __name__ == "__main__":
+    main()
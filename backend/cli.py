@@ -0,0 +1,56 @@
+"""Command-line entry point for bulk email triage.
+
+Reads JSONL records ({"email_text", "id"?, "contract_snippet"?}) from a file or
+stdin, runs the full pipeline over them with bounded concurrency and writes one
+NDJSON result per record. The throughput / per-stage timing summary goes to
+stderr so the output stays one result per input line.
+
+Usage (from the repository root):
+    python -m backend.cli batch emails.jsonl [-o results.jsonl] [--concurrency 8] [--order input|completion]
+    cat emails.jsonl | python -m backend.cli batch -
+"""
+import sys
+import json
+import asyncio
+import argparse
+
+try:
+    from backend.agents.batch import run_batch, BATCH_CONCURRENCY, ORDERS
+except ModuleNotFoundError:
+    from agents.batch import run_batch, BATCH_CONCURRENCY, ORDERS
+
+
+async def _batch(args) -> int:
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    summary = {}
+    try:
+        async for result in run_batch(src, concurrency=args.concurrency, order=args.order):
+            if "summary" in result:
+                summary = result["summary"]
+                continue
+            dst.write(json.dumps(result, ensure_ascii=False) + "\n")
+            dst.flush()
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    return 1 if summary.get("errors") else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    batch = sub.add_parser("batch", help="process a JSONL file of emails")
+    batch.add_argument("input", help="JSONL input file, or - for stdin")
+    batch.add_argument("-o", "--output", default="-", help="NDJSON output file (default: stdout)")
+    batch.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    batch.add_argument("--order", choices=ORDERS, default="input")
+    args = parser.parse_args(argv)
+    return asyncio.run(_batch(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -26,8 +26,11 @@ class AnalyzeRequest(BaseModel):
     contract_snippet: Optional[str] = None
     debug: Optional[bool] = False
 
+_TRACE_DESCRIPTION = "Pipeline trace with per-stage timing spans; null unless debug is true"
+
+
 class AnalyzeResponse(AnalysisJSON):
-    pass
+    trace: Optional[List[Dict[str, Any]]] = Field(default=None, description=_TRACE_DESCRIPTION)
 
 class DraftRequest(BaseModel):
     email_text: str
@@ -39,6 +42,7 @@ class DraftRequest(BaseModel):
 class DraftResponse(BaseModel):
     draft: str
     risk_score: Optional[int] = Field(default=None, ge=0, le=100)
+    trace: Optional[List[Dict[str, Any]]] = Field(default=None, description=_TRACE_DESCRIPTION)
 
 class ProcessRequest(BaseModel):
     email_text: str
@@ -49,6 +53,7 @@ class ProcessResponse(BaseModel):
     analysis: AnalysisJSON
     draft: str
     risk_score: Optional[int] = Field(default=None, ge=0, le=100)
+    trace: Optional[List[Dict[str, Any]]] = Field(default=None, description=_TRACE_DESCRIPTION)
 
 # Internal engine state
 class PipelineState(BaseModel):
@@ -0,0 +1,130 @@
+"""In-process BM25 inverted index over clause chunks.
+
+Dense embeddings rank exact clause numbers ("10.2") and fixed legal terms
+poorly; BM25 does not. Postings store the fully weighted BM25 contribution of
+each (term, document) pair, kept twice: sorted by document id (for exact score
+lookups) and sorted by impact (weight, descending).
+
+Queries first try one threshold-algorithm pass over the impact-ordered lists:
+take the top `depth` postings of each query term as candidates, score them
+exactly, and accept the result if the k-th score already beats the best
+possible score of any document outside the candidate set. Queries made only of
+very common terms rarely settle that way; they are scored exhaustively by
+scatter-adding every posting into one dense accumulator.
+"""
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+# Keep dotted clause numbers ("10.2", "3.4.1") as single tokens
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and any are as at be by for from has have in is it its of on or shall such that the this to "
+    "was were which will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class _Postings(NamedTuple):
+    ids: np.ndarray              # doc ids, ascending
+    weights: np.ndarray          # BM25 weight per entry of ids
+    impact_ids: np.ndarray       # doc ids by descending weight
+    impact_weights: np.ndarray   # weights, descending
+
+
+class BM25Index:
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75, min_depth: int = 64):
+        self.k1 = k1
+        self.b = b
+        self.min_depth = min_depth
+        self.n_docs = len(texts)
+        doc_tokens = [tokenize(t) for t in texts]
+        lengths = np.fromiter((len(toks) for toks in doc_tokens), dtype=np.float32, count=self.n_docs)
+        avgdl = float(lengths.mean()) if self.n_docs else 0.0
+        norm = k1 * (1.0 - b + b * lengths / avgdl) if avgdl else np.full(self.n_docs, k1, dtype=np.float32)
+
+        postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        for doc_id, toks in enumerate(doc_tokens):
+            for tok in toks:
+                tf = postings[tok]
+                tf[doc_id] = tf.get(doc_id, 0) + 1
+
+        self._postings: Dict[str, _Postings] = {}
+        for term, tf_map in postings.items():
+            # Docs were visited in order, so ids are already ascending
+            ids = np.fromiter(tf_map.keys(), dtype=np.intp, count=len(tf_map))
+            tf = np.fromiter(tf_map.values(), dtype=np.float32, count=len(tf_map))
+            df = len(tf_map)
+            idf = np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+            weights = (idf * tf * (k1 + 1.0) / (tf + norm[ids])).astype(np.float32)
+            order = np.argsort(-weights, kind="stable")
+            self._postings[term] = _Postings(ids, weights, ids[order], weights[order])
+
+    def __len__(self) -> int:
+        return self.n_docs
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._postings)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Top-k (doc position, BM25 score) pairs, best first; only docs sharing a term."""
+        terms = [self._postings[t] for t in set(tokenize(query)) if t in self._postings]
+        if not terms or k <= 0:
+            return []
+        if len(terms) == 1:
+            p = terms[0]
+            return [(int(i), float(w)) for i, w in zip(p.impact_ids[:k], p.impact_weights[:k])]
+
+        depth = max(self.min_depth, 4 * k)
+        candidates = []
+        # Upper bound on the score of any doc outside every top-`depth` list
+        threshold = 0.0
+        exhaustive = True
+        for p in terms:
+            if len(p.impact_ids) > depth:
+                candidates.append(p.impact_ids[:depth])
+                threshold += float(p.impact_weights[depth])
+                exhaustive = False
+            else:
+                candidates.append(p.impact_ids)
+        cand = np.sort(np.concatenate(candidates))
+        cand = cand[np.concatenate(([True], cand[1:] != cand[:-1]))]
+        scores = np.zeros(len(cand), dtype=np.float32)
+        for p in terms:
+            pos = np.searchsorted(p.ids, cand)
+            pos[pos == len(p.ids)] = 0
+            scores += np.where(p.ids[pos] == cand, p.weights[pos], 0.0)
+        kk = min(k, len(cand))
+        top = np.argpartition(-scores, kk - 1)[:kk] if kk < len(cand) else np.arange(len(cand))
+        top = top[np.lexsort((cand[top], -scores[top]))]
+        if exhaustive or (kk == k and scores[top[-1]] >= threshold):
+            return [(int(cand[i]), float(scores[i])) for i in top]
+        return self._search_exhaustive(terms, k)
+
+    def _search_exhaustive(self, terms: List[_Postings], k: int) -> List[Tuple[int, float]]:
+        dense = np.zeros(self.n_docs, dtype=np.float32)
+        for p in terms:
+            # ids are unique within a posting list, so fancy-index add is exact
+            dense[p.ids] += p.weights
+        k = min(k, self.n_docs)
+        top = np.argpartition(-dense, k - 1)[:k] if k < self.n_docs else np.arange(self.n_docs)
+        top = top[np.lexsort((top, -dense[top]))]
+        return [(int(i), float(dense[i])) for i in top if dense[i] > 0]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple[int, float]]], k: int, c: int = 60) -> List[Tuple[int, float]]:
+    """Fuse several ranked lists by sum of 1 / (c + rank); returns the top-k (doc, fused score)."""
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, (doc, _) in enumerate(ranking, start=1):
+            fused[doc] += 1.0 / (c + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))[:k]
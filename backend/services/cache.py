@@ -1,72 +1,372 @@
 import os
+import sys
+import json
 import time
+import hashlib
+import unicodedata
+import atexit
+import logging
 import sqlite3
+import threading
+from collections import OrderedDict
 from typing import Any, Optional
 
-# Simple hybrid cache: in-memory + optional SQLite persistence
+from .codec import get_codec
+
+# Simple hybrid cache: bounded in-memory LRU + optional SQLite persistence.
+#
+# The memory tier is an LRU bounded by entry count and approximate bytes, with a
+# TTL per entry. A background sweeper drops expired entries from both tiers so
+# long-running workers do not accumulate dead data.
+#
+# The SQLite tier keeps one connection per thread (WAL journal, so readers never
+# wait on the writer) and reuses the same SQL strings so sqlite3's per-connection
+# statement cache keeps them prepared. Writes are buffered and flushed in batches
+# by a background thread; reads consult the buffer first so a value is visible
+# as soon as cache_set returns. Values are stored through a versioned binary
+# codec (see codec.py) rather than repr()/literal_eval.
+
+logger = logging.getLogger(__name__)
 
-_MEM_CACHE: dict[str, tuple[float, Any]] = {}
 _DB_PATH = os.getenv("CACHE_DB")
+_FLUSH_INTERVAL = float(os.getenv("CACHE_FLUSH_INTERVAL", "0.05"))
+_FLUSH_BATCH = int(os.getenv("CACHE_FLUSH_BATCH", "256"))
+_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+_SWEEP_INTERVAL = float(os.getenv("CACHE_SWEEP_INTERVAL", "60"))
+
+_CODEC = get_codec()
+
+_SQL_CREATE = "CREATE TABLE IF NOT EXISTS cache (k TEXT PRIMARY KEY, v BLOB, exp REAL)"
+_SQL_UPSERT = "REPLACE INTO cache (k, v, exp) VALUES (?, ?, ?)"
+_SQL_SELECT = "SELECT v, exp FROM cache WHERE k=?"
+_SQL_SWEEP = "DELETE FROM cache WHERE exp <= ?"
+
+_MISSING = object()
+
+
+def _approx_size(value: Any) -> int:
+    """Rough deep size in bytes; good enough to bound memory, not exact."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_approx_size(k) + _approx_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_approx_size(v) for v in value)
+    return size
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry TTL, bounded by entry count and bytes."""
+
+    def __init__(self, max_entries: int = _MAX_ENTRIES, max_bytes: int = _MAX_BYTES, default_ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[Any, tuple[float, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            exp, value, size = entry
+            if now >= exp:
+                del self._data[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None, exp: Optional[float] = None):
+        if exp is None:
+            ttl = self.default_ttl if ttl is None else ttl
+            exp = time.time() + ttl if ttl is not None else float("inf")
+        size = _approx_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (exp, value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key: Any) -> None:
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop every expired entry; returns how many were removed."""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = [k for k, (exp, _, _) in self._data.items() if now >= exp]
+            for k in expired:
+                self._bytes -= self._data.pop(k)[2]
+            self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_MEM_CACHE = LRUCache()
+
+
+class _SQLiteStore:
+    """Persistent tier with per-thread connections and write-behind batching."""
+
+    def __init__(self, path: str, flush_interval: float = _FLUSH_INTERVAL, flush_batch: int = _FLUSH_BATCH):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._local = threading.local()
+        self._conns: list[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._pending: dict[str, tuple[Any, float]] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        # Ensure parent directory exists
+        try:
+            parent = os.path.dirname(path)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+        except Exception:
+            pass
+        conn = self._conn()
+        conn.execute(_SQL_CREATE)
+        conn.commit()
+        self._flusher = threading.Thread(target=self._run, name="cache-flusher", daemon=True)
+        self._flusher.start()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def set(self, key: str, value: Any, exp: float):
+        with self._pending_lock:
+            self._pending[key] = (value, exp)
+            backlog = len(self._pending)
+        if backlog >= self.flush_batch:
+            self._wake.set()
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        with self._pending_lock:
+            entry = self._pending.get(key)
+        if entry is not None:
+            return entry
+        row = self._conn().execute(_SQL_SELECT, (key,)).fetchone()
+        return row
+
+    def flush(self):
+        """Write all buffered entries in a single transaction."""
+        with self._flush_lock:
+            with self._pending_lock:
+                if not self._pending:
+                    return
+                batch = self._pending
+                self._pending = {}
+            conn = self._conn()
+            try:
+                with conn:
+                    conn.executemany(_SQL_UPSERT, [(k, v, exp) for k, (v, exp) in batch.items()])
+            except Exception as e:
+                logger.warning(f"Cache flush failed ({len(batch)} entries): {e}")
+                # Put entries back unless a newer value was written meanwhile
+                with self._pending_lock:
+                    for k, entry in batch.items():
+                        self._pending.setdefault(k, entry)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Delete expired rows; returns how many were removed."""
+        now = time.time() if now is None else now
+        with self._pending_lock:
+            for k in [k for k, (_, exp) in self._pending.items() if now >= exp]:
+                del self._pending[k]
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(_SQL_SWEEP, (now,))
+        return cur.rowcount or 0
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._flusher.join(timeout=max(1.0, self.flush_interval * 4))
+        self.flush()
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+_STORE: Optional[_SQLiteStore] = None
 
 
 def _ensure_db():
-    if not _DB_PATH:
+    global _STORE
+    if not _DB_PATH or _STORE is not None:
         return
-    # Ensure parent directory exists
-    try:
-        parent = os.path.dirname(_DB_PATH)
-        if parent:
-            os.makedirs(parent, exist_ok=True)
-    except Exception:
-        pass
-    conn = sqlite3.connect(_DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "CREATE TABLE IF NOT EXISTS cache (k TEXT PRIMARY KEY, v BLOB, exp REAL)"
-    )
-    conn.commit()
-    conn.close()
+    _STORE = _SQLiteStore(_DB_PATH)
+    atexit.register(_STORE.close)
 
 
 _ensure_db()
 
+_STATS_LOCK = threading.Lock()
+_STATS = {"db_hits": 0, "db_misses": 0, "db_swept": 0, "sweeps": 0}
+
+
+def _count(name: str, n: int = 1):
+    with _STATS_LOCK:
+        _STATS[name] += n
+
+
+def cache_sweep() -> int:
+    """Remove expired entries from both tiers; returns the number removed."""
+    now = time.time()
+    removed = _MEM_CACHE.sweep(now)
+    if _STORE is not None:
+        try:
+            db_removed = _STORE.sweep(now)
+            _count("db_swept", db_removed)
+            removed += db_removed
+        except Exception as e:
+            logger.warning(f"Cache sweep failed: {e}")
+    _count("sweeps")
+    return removed
+
+
+def _sweeper_loop(stop: threading.Event):
+    while not stop.wait(_SWEEP_INTERVAL):
+        cache_sweep()
+
+
+_SWEEPER_STOP = threading.Event()
+if _SWEEP_INTERVAL > 0:
+    threading.Thread(target=_sweeper_loop, args=(_SWEEPER_STOP,), name="cache-sweeper", daemon=True).start()
+
+
+def cache_stats() -> dict:
+    """Hit/miss/eviction counters for both cache tiers."""
+    with _STATS_LOCK:
+        persistent = dict(_STATS)
+    persistent["enabled"] = _STORE is not None
+    return {"memory": _MEM_CACHE.stats(), "persistent": persistent}
+
+
+def _normalize_text(text: str) -> str:
+    # Whitespace-only differences (CRLF, trailing spaces) must not split the cache
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+
+def make_cache_key(namespace: str, version: str, *parts: Any) -> str:
+    """Build a process-independent cache key from a digest of the given parts.
+
+    Strings are whitespace-normalized, other values are serialized as canonical
+    JSON, and every part is length-prefixed so adjacent parts cannot collide.
+    Unlike the builtin hash(), the result is identical across workers and restarts.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if part is None:
+            data = b"\x00"
+        elif isinstance(part, str):
+            data = b"s" + _normalize_text(part).encode("utf-8")
+        else:
+            data = b"j" + json.dumps(part, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return f"{namespace}:v{version}:{h.hexdigest()}"
+
+
+def cache_flush():
+    """Force buffered writes to disk (normally done by the background flusher)."""
+    if _STORE is not None:
+        _STORE.flush()
+
 
 def cache_set(key: str, value: Any, ttl_seconds: int = 3600):
     exp = time.time() + ttl_seconds
-    _MEM_CACHE[key] = (exp, value)
-    if _DB_PATH:
-        conn = sqlite3.connect(_DB_PATH)
-        cur = conn.cursor()
-        cur.execute(
-            "REPLACE INTO cache (k, v, exp) VALUES (?, ?, ?)",
-            (key, repr(value), exp),
-        )
-        conn.commit()
-        conn.close()
+    _MEM_CACHE.set(key, value, exp=exp)
+    if _STORE is not None:
+        try:
+            blob = _CODEC.encode(value)
+        except Exception as e:
+            logger.warning(f"Value for '{key}' is not serializable; caching in memory only: {e}")
+            return
+        _STORE.set(key, blob, exp)
 
 
 def cache_get(key: str) -> Optional[Any]:
-    now = time.time()
-    entry = _MEM_CACHE.get(key)
-    if entry:
-        exp, val = entry
-        if now < exp:
-            return val
-        else:
-            _MEM_CACHE.pop(key, None)
-    if _DB_PATH:
-        conn = sqlite3.connect(_DB_PATH)
-        cur = conn.cursor()
-        cur.execute("SELECT v, exp FROM cache WHERE k=?", (key,))
-        row = cur.fetchone()
-        conn.close()
+    val = _MEM_CACHE.get(key, _MISSING)
+    if val is not _MISSING:
+        return val
+    if _STORE is not None:
+        row = _STORE.get(key)
         if row:
-            v_str, exp = row
-            if now < exp:
+            blob, exp = row
+            if time.time() < exp:
                 try:
-                    # unsafe eval avoided; use literal eval if possible
-                    import ast
-                    return ast.literal_eval(v_str)
+                    val = _CODEC.decode(blob)
                 except Exception:
+                    _count("db_misses")
                     return None
+                _count("db_hits")
+                # Promote to the memory tier for subsequent reads
+                _MEM_CACHE.set(key, val, exp=exp)
+                return val
+        _count("db_misses")
     return None
@@ -0,0 +1,137 @@
+"""Binary value codecs for the persistent cache tier.
+
+Every encoded value starts with a 3-byte header so the on-disk format can be
+migrated without a flag day:
+
+    byte 0: format version
+    byte 1: serializer id (msgpack, json, pickle)
+    byte 2: compression id (none, zlib, zstd)
+
+decode() dispatches on the header, so rows written with a different codec (or
+by an older release) stay readable. The exception is pickle: unpickling runs
+arbitrary code, so pickle rows are refused unless this codec is configured
+for pickle (anyone able to write the cache file could otherwise run code on
+read). Rows from before the codec layer were
+stored as repr() text and are decoded with ast.literal_eval.
+"""
+import os
+import ast
+import json
+import zlib
+import pickle
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import msgpack  # type: ignore
+    HAVE_MSGPACK = True
+except Exception:
+    HAVE_MSGPACK = False
+
+try:
+    import zstandard  # type: ignore
+    HAVE_ZSTD = True
+except Exception:
+    HAVE_ZSTD = False
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+SER_MSGPACK = 1
+SER_JSON = 2
+SER_PICKLE = 3
+
+COMP_NONE = 0
+COMP_ZLIB = 1
+COMP_ZSTD = 2
+
+_SERIALIZER_IDS = {"msgpack": SER_MSGPACK, "json": SER_JSON, "pickle": SER_PICKLE}
+_COMPRESSION_IDS = {"none": COMP_NONE, "zlib": COMP_ZLIB, "zstd": COMP_ZSTD}
+
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    return json.loads(data.decode("utf-8"))
+
+
+def _pickle_dumps(value: Any) -> bytes:
+    return pickle.dumps(value, protocol=5)
+
+
+_SERIALIZERS: Dict[int, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {
+    SER_JSON: (_json_dumps, _json_loads),
+    # Opt-in via CACHE_CODEC=pickle; Codec.decode refuses pickle rows otherwise
+    SER_PICKLE: (_pickle_dumps, pickle.loads),
+}
+if HAVE_MSGPACK:
+    _SERIALIZERS[SER_MSGPACK] = (
+        lambda v: msgpack.packb(v, use_bin_type=True),
+        lambda b: msgpack.unpackb(b, raw=False),
+    )
+
+_COMPRESSORS: Dict[int, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    COMP_ZLIB: (lambda b: zlib.compress(b, 6), zlib.decompress),
+}
+if HAVE_ZSTD:
+    _ZSTD_C = zstandard.ZstdCompressor(level=3)
+    _ZSTD_D = zstandard.ZstdDecompressor()
+    _COMPRESSORS[COMP_ZSTD] = (_ZSTD_C.compress, _ZSTD_D.decompress)
+
+
+class Codec:
+    """Serializer + optional compression above a size threshold."""
+
+    def __init__(self, serializer: str = "msgpack", compression: str = "zstd", compress_threshold: int = 1024):
+        ser_id = _SERIALIZER_IDS.get(serializer)
+        if ser_id is None:
+            raise ValueError(f"Unknown cache serializer: {serializer}")
+        if ser_id not in _SERIALIZERS:
+            logger.warning(f"Cache serializer '{serializer}' unavailable; using json")
+            ser_id = SER_JSON
+        comp_id = _COMPRESSION_IDS.get(compression)
+        if comp_id is None:
+            raise ValueError(f"Unknown cache compression: {compression}")
+        if comp_id != COMP_NONE and comp_id not in _COMPRESSORS:
+            logger.warning(f"Cache compression '{compression}' unavailable; using zlib")
+            comp_id = COMP_ZLIB
+        self.serializer_id = ser_id
+        self.compression_id = comp_id
+        self.compress_threshold = compress_threshold
+
+    def encode(self, value: Any) -> bytes:
+        dumps, _ = _SERIALIZERS[self.serializer_id]
+        payload = dumps(value)
+        comp_id = COMP_NONE
+        if self.compression_id != COMP_NONE and len(payload) >= self.compress_threshold:
+            compressed = _COMPRESSORS[self.compression_id][0](payload)
+            if len(compressed) < len(payload):
+                payload, comp_id = compressed, self.compression_id
+        return bytes((FORMAT_VERSION, self.serializer_id, comp_id)) + payload
+
+    def decode(self, data: Any) -> Any:
+        if isinstance(data, str):
+            # Legacy repr() rows written before the codec layer existed
+            return ast.literal_eval(data)
+        data = bytes(data)
+        version, ser_id, comp_id = data[0], data[1], data[2]
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported cache format version: {version}")
+        if ser_id == SER_PICKLE and self.serializer_id != SER_PICKLE:
+            raise ValueError("Refusing to unpickle a cache row: pickle is not the configured serializer")
+        payload = data[3:]
+        if comp_id != COMP_NONE:
+            payload = _COMPRESSORS[comp_id][1](payload)
+        return _SERIALIZERS[ser_id][1](payload)
+
+
+def get_codec(serializer: Optional[str] = None, compression: Optional[str] = None, compress_threshold: Optional[int] = None) -> Codec:
+    """Codec configured from CACHE_CODEC / CACHE_COMPRESSION / CACHE_COMPRESS_MIN_BYTES."""
+    serializer = serializer or os.getenv("CACHE_CODEC") or ("msgpack" if HAVE_MSGPACK else "json")
+    compression = compression or os.getenv("CACHE_COMPRESSION") or ("zstd" if HAVE_ZSTD else "zlib")
+    if compress_threshold is None:
+        compress_threshold = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
+    return Codec(serializer, compression, compress_threshold)
@@ -0,0 +1,172 @@
+"""Embedding providers for clause retrieval.
+
+A provider turns texts into float32 row vectors, L2-normalized so that an inner
+product is cosine similarity. Two implementations ship:
+
+- GoogleEmbeddingProvider: Gemini embeddings through langchain-google-genai
+  (remote; needs GEMINI_API_KEY).
+- HashedNgramEmbedder: fully local hashed character n-gram TF-IDF built on
+  NumPy. A whole batch is hashed and counted in a few vectorized passes, so it
+  needs no network and no per-query round trip.
+
+EMBEDDING_PROVIDER selects one explicitly ("google" or "local"); by default
+Google is used when available and the local embedder otherwise.
+"""
+from __future__ import annotations
+
+import os
+import re
+import asyncio
+import logging
+from typing import Optional, Sequence
+
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except Exception:
+    HAVE_NUMPY = False
+
+try:
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    HAVE_GOOGLE_EMBEDDINGS = True
+except Exception:
+    HAVE_GOOGLE_EMBEDDINGS = False
+
+logger = logging.getLogger(__name__)
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def _l2_normalize(matrix: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class EmbeddingProvider:
+    """Interface for embedding backends used by the vector store."""
+
+    name = "base"
+    # Remote providers cost a network call per batch, so their vectors are persisted
+    remote = False
+
+    def fit(self, texts: Sequence[str]) -> None:
+        """Learn corpus statistics (e.g. IDF) before embedding documents. Optional."""
+
+    def embed_documents(self, texts: Sequence[str]) -> "np.ndarray":
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> "np.ndarray":
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> "np.ndarray":
+        """Async embed_query; remote providers must not block the event loop."""
+        if self.remote:
+            return await asyncio.to_thread(self.embed_query, text)
+        return self.embed_query(text)
+
+
+class HashedNgramEmbedder(EmbeddingProvider):
+    """Local TF-IDF over hashed character n-grams (no vocabulary, no network)."""
+
+    remote = False
+
+    def __init__(self, dim: int = 2048, ngram_range: tuple[int, int] = (3, 5), batch_size: int = 256):
+        if not HAVE_NUMPY:
+            raise RuntimeError("numpy is required for the local embedder")
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.batch_size = batch_size
+        self.name = f"hashed-ngram-{dim}-{ngram_range[0]}{ngram_range[1]}"
+        self._idf: Optional[np.ndarray] = None
+
+    def _counts(self, texts: Sequence[str]) -> "np.ndarray":
+        """Raw n-gram counts for a batch, shape (len(texts), dim)."""
+        n_docs = len(texts)
+        encoded = [(" " + _NON_ALNUM.sub(" ", t.lower()).strip() + " ").encode("utf-8") for t in texts]
+        lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=n_docs)
+        ends = np.cumsum(lengths)
+        buf = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        doc_of = np.repeat(np.arange(n_docs, dtype=np.int64), lengths)
+        positions = np.arange(len(buf), dtype=np.int64)
+        counts = np.zeros(n_docs * self.dim, dtype=np.float64)
+        prime = np.uint64(1099511628211)
+        lo, hi = self.ngram_range
+        for n in range(lo, hi + 1):
+            m = len(buf) - n + 1
+            if m <= 0:
+                continue
+            # Polynomial rolling hash of every n-gram in the batch at once (uint64 wraps)
+            h = np.full(m, np.uint64(n), dtype=np.uint64)
+            for j in range(n):
+                h = h * prime + buf[j:j + m]
+            h ^= h >> np.uint64(29)
+            # Drop n-grams that straddle two documents
+            valid = positions[:m] + n <= ends[doc_of[:m]]
+            flat = doc_of[:m][valid] * self.dim + (h[valid] % np.uint64(self.dim)).astype(np.int64)
+            counts += np.bincount(flat, minlength=n_docs * self.dim)
+        return counts.reshape(n_docs, self.dim)
+
+    def fit(self, texts: Sequence[str]) -> None:
+        df = np.zeros(self.dim, dtype=np.float64)
+        for start in range(0, len(texts), self.batch_size):
+            df += (self._counts(texts[start:start + self.batch_size]) > 0).sum(axis=0)
+        # Smoothed IDF as in scikit-learn
+        self._idf = (np.log((1.0 + len(texts)) / (1.0 + df)) + 1.0).astype(np.float32)
+
+    def embed_documents(self, texts: Sequence[str]) -> "np.ndarray":
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            tf = np.log1p(self._counts(texts[start:start + self.batch_size])).astype(np.float32)
+            if self._idf is not None:
+                tf *= self._idf
+            out[start:start + len(tf)] = _l2_normalize(tf)
+        return out
+
+
+class GoogleEmbeddingProvider(EmbeddingProvider):
+    """Gemini embeddings via langchain-google-genai."""
+
+    remote = True
+
+    def __init__(self, model: Optional[str] = None, api_key: Optional[str] = None):
+        if not (HAVE_NUMPY and HAVE_GOOGLE_EMBEDDINGS):
+            raise RuntimeError("numpy and langchain-google-genai are required for Google embeddings")
+        model = model or os.getenv("GEMINI_EMBEDDING_MODEL") or "text-embedding-004"
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        # Try latest embedding model first, fallback to legacy
+        try:
+            self._client = GoogleGenerativeAIEmbeddings(model=model, api_key=api_key)
+        except Exception:
+            model = "models/embedding-001"
+            self._client = GoogleGenerativeAIEmbeddings(model=model, api_key=api_key)
+        self.name = f"google:{model}"
+
+    def embed_documents(self, texts: Sequence[str]) -> "np.ndarray":
+        return _l2_normalize(np.asarray(self._client.embed_documents(list(texts)), dtype=np.float32))
+
+    def embed_query(self, text: str) -> "np.ndarray":
+        return _l2_normalize(np.asarray([self._client.embed_query(text)], dtype=np.float32))[0]
+
+    async def aembed_query(self, text: str) -> "np.ndarray":
+        if not hasattr(self._client, "aembed_query"):
+            return await super().aembed_query(text)
+        return _l2_normalize(np.asarray([await self._client.aembed_query(text)], dtype=np.float32))[0]
+
+
+def get_embedding_provider() -> Optional[EmbeddingProvider]:
+    """Provider selected by EMBEDDING_PROVIDER (google|local), or None without numpy."""
+    if not HAVE_NUMPY:
+        return None
+    choice = (os.getenv("EMBEDDING_PROVIDER") or "auto").strip().lower()
+    if choice in ("google", "auto") and HAVE_GOOGLE_EMBEDDINGS and os.getenv("GEMINI_API_KEY"):
+        try:
+            return GoogleEmbeddingProvider()
+        except Exception as e:
+            logger.warning(f"Google embeddings unavailable ({e}); using local embedder")
+    elif choice == "google":
+        logger.warning("EMBEDDING_PROVIDER=google but SDK or GEMINI_API_KEY missing; using local embedder")
+    dim = int(os.getenv("LOCAL_EMBEDDING_DIM", "2048"))
+    return HashedNgramEmbedder(dim=dim)
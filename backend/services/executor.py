@@ -0,0 +1,76 @@
+"""Thread pool with saturation metrics.
+
+Blocking SDK calls get their own sized pool instead of the event loop's
+default executor (shared by every asyncio.to_thread user), so slow LLM calls
+cannot starve other blocking work. The pool counts queued and active tasks and
+how long tasks waited for a worker, which shows when it is too small.
+"""
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class InstrumentedExecutor(ThreadPoolExecutor):
+    def __init__(self, max_workers: int, thread_name_prefix: str = ""):
+        super().__init__(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self.max_workers = max_workers
+        self._stats_lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.peak_queued = 0
+        self.peak_active = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        enqueued = time.perf_counter()
+        with self._stats_lock:
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        def _task():
+            waited = time.perf_counter() - enqueued
+            with self._stats_lock:
+                self.queued -= 1
+                self.active += 1
+                self.peak_active = max(self.peak_active, self.active)
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._stats_lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        try:
+            future = super().submit(_task)
+        except BaseException:
+            with self._stats_lock:
+                self.queued -= 1
+            raise
+
+        def _dequeue_cancelled(f: Future) -> None:
+            # A future cancelled while still queued is skipped by the pool, so _task never runs
+            if f.cancelled():
+                with self._stats_lock:
+                    self.queued -= 1
+
+        future.add_done_callback(_dequeue_cancelled)
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            started = self.completed + self.active
+            return {
+                "max_workers": self.max_workers,
+                "active": self.active,
+                "queued": self.queued,
+                "completed": self.completed,
+                "peak_active": self.peak_active,
+                "peak_queued": self.peak_queued,
+                "avg_queue_wait_ms": round(self._wait_total / started * 1000.0, 3) if started else 0.0,
+                "max_queue_wait_ms": round(self._wait_max * 1000.0, 3),
+            }
@@ -0,0 +1,110 @@
+"""Contract corpus ingestion: split contract files into clause-level chunks.
+
+Contracts are plain-text files in a directory tree. Each file is split on clause
+headings such as "Clause 9.1 (Confidentiality):" so retrieval can return single
+clauses instead of whole documents. Every chunk carries its contract id (path
+relative to the corpus root, without extension), clause number and title.
+"""
+from __future__ import annotations
+
+import os
+import re
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+CONTRACT_EXTENSIONS = (".txt", ".md")
+
+# "Clause 9.1 (Confidentiality): ...", "CLAUSE 12 - Termination. ...", "Clause 3.4.1. ..."
+CLAUSE_HEADING = re.compile(
+    r"^[ \t]*clause[ \t]+(?P<number>\d+(?:\.\d+)*)\.?[ \t]*"
+    r"(?:\((?P<paren>[^)\n]*)\)|[-–—][ \t]*(?P<plain>[^:\n.]{1,80}?)(?=[:.\n]|$))?",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+# Clauses longer than this are split further at paragraph boundaries
+_MAX_CHUNK_CHARS = int(os.getenv("CLAUSE_MAX_CHARS", "2000"))
+
+
+@dataclass(frozen=True)
+class ClauseChunk:
+    text: str
+    contract_id: str
+    clause_number: str = ""
+    title: str = ""
+    part: int = 0
+
+    @property
+    def metadata(self) -> Dict[str, str]:
+        meta = {"contract_id": self.contract_id, "clause_number": self.clause_number, "title": self.title}
+        if self.part:
+            meta["part"] = str(self.part)
+        return meta
+
+
+def _split_long(text: str, max_chars: int) -> List[str]:
+    if len(text) <= max_chars:
+        return [text]
+    parts: List[str] = []
+    current = ""
+    for para in re.split(r"\n\s*\n", text):
+        if current and len(current) + len(para) + 2 > max_chars:
+            parts.append(current)
+            current = para
+        else:
+            current = f"{current}\n\n{para}" if current else para
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_clauses(text: str, contract_id: str, max_chars: int = _MAX_CHUNK_CHARS) -> List[ClauseChunk]:
+    """Split one contract into clause chunks. Text without headings becomes a single chunk."""
+    text = text.strip()
+    if not text:
+        return []
+    headings = list(CLAUSE_HEADING.finditer(text))
+    sections: List[tuple[str, str, str]] = []
+    if not headings:
+        sections.append(("", "", text))
+    else:
+        preamble = text[: headings[0].start()].strip()
+        if preamble:
+            sections.append(("", "preamble", preamble))
+        for i, m in enumerate(headings):
+            end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+            title = (m.group("paren") or m.group("plain") or "").strip()
+            sections.append((m.group("number"), title, text[m.start():end].strip()))
+
+    chunks: List[ClauseChunk] = []
+    for number, title, body in sections:
+        pieces = _split_long(body, max_chars)
+        for part, piece in enumerate(pieces, start=1 if len(pieces) > 1 else 0):
+            chunks.append(ClauseChunk(text=piece, contract_id=contract_id, clause_number=number, title=title, part=part))
+    return chunks
+
+
+def iter_contract_files(root: str) -> Iterator[str]:
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(CONTRACT_EXTENSIONS) and not name.startswith("."):
+                yield os.path.join(dirpath, name)
+
+
+def load_corpus(root: str) -> List[ClauseChunk]:
+    """Load and chunk every contract file under root."""
+    chunks: List[ClauseChunk] = []
+    if not os.path.isdir(root):
+        logger.warning(f"Contract directory not found: {root}")
+        return chunks
+    for path in iter_contract_files(root):
+        contract_id = os.path.splitext(os.path.relpath(path, root))[0].replace(os.sep, "/")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                chunks.extend(split_clauses(f.read(), contract_id))
+        except Exception as e:
+            logger.warning(f"Failed to ingest contract {path}: {e}")
+    return chunks
@@ -1,7 +1,10 @@
 import os
 import json
+import time
+import asyncio
 import logging
-from typing import Any, Dict, Optional, List
+import threading
+from typing import Any, AsyncIterator, Dict, Optional, List, Tuple
 from dotenv import load_dotenv
 
 try:
@@ -10,14 +13,73 @@ try:
 except Exception:
     HAVE_GENAI = False
 
+try:
+    from backend.services.llm_scheduler import DeadlineExceeded, get_scheduler, is_transient
+    from backend.services.model_router import ModelRouter
+    from backend.services.executor import InstrumentedExecutor
+    from backend.services.metrics import span
+    from backend.services import request_context
+except ModuleNotFoundError:
+    from services.llm_scheduler import DeadlineExceeded, get_scheduler, is_transient
+    from services.model_router import ModelRouter
+    from services.executor import InstrumentedExecutor
+    from services.metrics import span
+    from services import request_context
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
-ANALYZE_PROMPT_VERSION = "1.0.2"
-DRAFT_PROMPT_VERSION = "1.0.2"
+# Errors after which the next candidate model is tried (throttling only once backoff is exhausted)
+_FAILOVER_MARKERS = ["404", "not found", "unsupported", "rate", "quota", "429", "exceeded"]
+
+
+def _is_model_error(exc: BaseException) -> bool:
+    """Failures that say something about the model's health (vs. the request itself)."""
+    msg = str(exc).lower()
+    return any(x in msg for x in _FAILOVER_MARKERS) or is_transient(exc)
+
+ANALYZE_PROMPT_VERSION = "1.0.3"
+DRAFT_PROMPT_VERSION = "1.0.3"
 
 _GEMINI_KEY = os.getenv("GEMINI_API_KEY")
 
+# Blocking SDK calls run on their own pool, sized for I/O-bound work, so slow LLM
+# responses never starve asyncio.to_thread users of the default executor
+_LLM_MAX_WORKERS = int(os.getenv("LLM_MAX_WORKERS", "16"))
+_LLM_EXECUTOR: Optional[InstrumentedExecutor] = None
+_LLM_EXECUTOR_LOCK = threading.Lock()
+
+_CONFIGURED = False
+_CONFIGURE_LOCK = threading.Lock()
+
+
+def _llm_executor() -> InstrumentedExecutor:
+    global _LLM_EXECUTOR
+    with _LLM_EXECUTOR_LOCK:
+        if _LLM_EXECUTOR is None:
+            _LLM_EXECUTOR = InstrumentedExecutor(max_workers=_LLM_MAX_WORKERS, thread_name_prefix="llm")
+        return _LLM_EXECUTOR
+
+
+def llm_executor_stats() -> Dict[str, Any]:
+    """Saturation of the LLM thread pool (queue depth, active workers, queue wait)."""
+    return _llm_executor().stats()
+
+
+async def _run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_llm_executor(), fn, *args)
+
+
+def _configure_genai() -> None:
+    """genai.configure once per process; it resets SDK clients, so never per model or call."""
+    global _CONFIGURED
+    if _CONFIGURED:
+        return
+    with _CONFIGURE_LOCK:
+        if not _CONFIGURED:
+            genai.configure(api_key=_GEMINI_KEY)
+            _CONFIGURED = True
+
 
 class _MockLLM:
     """Fallback deterministic LLM for local testing without API key."""
@@ -67,6 +129,14 @@ class _MockLLM:
             f"Best regards,\nLegal Team"
         )
 
+    async def generate_draft_stream(self, **kwargs) -> AsyncIterator[str]:
+        """Yield the mock draft a few words at a time, like a streaming model."""
+        words = (await self.generate_draft(**kwargs)).split(" ")
+        for i in range(0, len(words), 4):
+            chunk = " ".join(words[i:i + 4])
+            yield chunk if i + 4 >= len(words) else chunk + " "
+            await asyncio.sleep(0)
+
 
 USER_CHAT_CANDIDATES = os.getenv("GEMINI_CHAT_CANDIDATES")  # comma separated friendly names
 
@@ -101,7 +171,7 @@ def _discover_models() -> List[str]:
     if not HAVE_GENAI or not _GEMINI_KEY:
         return []
     try:
-        genai.configure(api_key=_GEMINI_KEY)
+        _configure_genai()
         models = list(genai.list_models())
         # Filter for generateContent capability
         chat_models = []
@@ -140,23 +210,110 @@ def _discover_models() -> List[str]:
         chat_models = sorted(set(chat_models), key=score)
         return chat_models
     except Exception as e:
+        # Raised to the caller: a refresh must be able to tell failure from "nothing new"
         logger.warning(f"Model discovery failed: {e}")
-        return []
+        raise
+
+
+# Discovered model list, shared by workers and restarts (list_models is a slow network call)
+_MODEL_CACHE_PATH = os.getenv("MODEL_CACHE_PATH") or os.path.join(os.path.dirname(__file__), "..", "data", "models.json")
+_DISCOVERY_TTL = float(os.getenv("MODEL_DISCOVERY_TTL", str(24 * 3600)))
+
+
+def _read_model_cache() -> Optional[Tuple[List[str], float]]:
+    """(models, fetched_at) from the discovery cache file, or None."""
+    try:
+        with open(_MODEL_CACHE_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        models = [m for m in data.get("models") or [] if isinstance(m, str) and m]
+        if models:
+            return models, float(data.get("fetched_at") or 0.0)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable model cache {_MODEL_CACHE_PATH}: {e}")
+    return None
+
+
+def _write_model_cache(models: List[str]) -> None:
+    try:
+        os.makedirs(os.path.dirname(_MODEL_CACHE_PATH) or ".", exist_ok=True)
+        tmp = _MODEL_CACHE_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": time.time(), "models": models}, f)
+        os.replace(tmp, _MODEL_CACHE_PATH)
+    except Exception as e:
+        logger.warning(f"Failed to write model cache {_MODEL_CACHE_PATH}: {e}")
 
 
 class _GeminiLLM:
     def __init__(self):
-        # Try dynamic discovery; fall back to defaults
-        discovered = _discover_models()
-        self._candidates = discovered or [m for m in DEFAULT_CHAT_MODEL_CANDIDATES if m]
-        self._idx = 0
-        self._model = self._build_model(self._candidates[self._idx])
+        # Never discover inline: start from the cached list (or the defaults) and let
+        # refresh_models() replace it in the background
+        cached = _read_model_cache()
+        if cached:
+            candidates, self._discovered_at = cached
+            self._discovery_source = "cache"
+        else:
+            candidates, self._discovered_at = [m for m in DEFAULT_CHAT_MODEL_CANDIDATES if m], 0.0
+            self._discovery_source = "defaults"
+        self._router = ModelRouter(candidates)
+        self._discovery_task: Optional[asyncio.Task] = None
+        self._discovery_error: Optional[str] = None
+        # Built GenerativeModel objects per name; they are stateless and safe to share
+        self._models: Dict[str, Any] = {}
+        self._models_lock = threading.Lock()
+
+    @property
+    def router(self) -> ModelRouter:
+        return self._router
+
+    def discovery_fresh(self) -> bool:
+        return self._discovery_source != "defaults" and time.time() - self._discovered_at < _DISCOVERY_TTL
+
+    def discovery_status(self) -> Dict[str, Any]:
+        running = self._discovery_task is not None and not self._discovery_task.done()
+        return {
+            "source": self._discovery_source,
+            "age_s": round(time.time() - self._discovered_at, 1) if self._discovered_at else None,
+            "ttl_s": _DISCOVERY_TTL,
+            "stale": not self.discovery_fresh(),
+            "running": running,
+            "last_error": self._discovery_error,
+        }
+
+    async def refresh_models(self, force: bool = False) -> List[str]:
+        """Re-run model discovery unless the cached list is fresh; concurrent calls share one run."""
+        if not force and self.discovery_fresh():
+            return self._router.candidates
+        task = self._discovery_task
+        loop = asyncio.get_running_loop()
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = self._discovery_task = loop.create_task(self._discover())
+        return await asyncio.shield(task)
+
+    async def _discover(self) -> List[str]:
+        """Replace the candidates with a fresh list; on failure the old list stays and the error is raised."""
+        try:
+            models = await _run_blocking(_discover_models)
+            if not models:
+                raise RuntimeError("no chat models returned")
+        except Exception as e:
+            self._discovery_error = str(e)[:200]
+            raise
+        self._router.set_candidates(models)
+        self._discovered_at = time.time()
+        self._discovery_source = "discovered"
+        self._discovery_error = None
+        await _run_blocking(_write_model_cache, models)
+        logger.info(f"Discovered {len(models)} Gemini chat models")
+        return self._router.candidates
 
     def _build_model(self, name: str):
         if not HAVE_GENAI:
             raise RuntimeError("google-generativeai SDK not installed")
         logger.info(f"Using Gemini chat model: {name}")
-        genai.configure(api_key=_GEMINI_KEY)
+        _configure_genai()
         # Handle SDK variants: some expect 'model', others 'model_name', and some accept positional
         try:
             return genai.GenerativeModel(model=name, generation_config={"temperature": 0.2})
@@ -166,30 +323,51 @@ class _GeminiLLM:
             except TypeError:
                 return genai.GenerativeModel(name)
 
-    def _rotate(self):
-        self._idx = (self._idx + 1) % len(self._candidates)
-        self._model = self._build_model(self._candidates[self._idx])
+    def _model_for(self, name: str):
+        model = self._models.get(name)
+        if model is None:
+            with self._models_lock:
+                model = self._models.get(name)
+                if model is None:
+                    model = self._models[name] = self._build_model(name)
+        return model
 
     async def _call_chat(self, messages: List[str]):
+        # The router picks a model per call (no shared "current" model); the scheduler
+        # applies that model's concurrency cap, RPM bucket and 429 backoff
+        scheduler = get_scheduler()
+        deadline = scheduler.deadline()
+        tried: List[str] = []
         last_exc = None
-        for _ in range(len(self._candidates)):
+        while True:
+            name = self._router.choose(exclude=tried)
+            if name is None:
+                break
+            tried.append(name)
+            verdict = False
             try:
-                # SDK is sync; wrap in thread if needed. We'll call it in a thread via asyncio.to_thread.
-                import asyncio
-                def _gen():
-                    return self._model.generate_content(messages)
-                resp = await asyncio.to_thread(_gen)
+                model = self._model_for(name)
+                t0 = time.perf_counter()
+                # Includes scheduler queueing and same-model retries: the latency a caller sees from this model
+                with span("llm.call", model=name) as tags:
+                    resp = await scheduler.run(name, lambda: _run_blocking(model.generate_content, messages), deadline)
+                    tags["outcome"] = "ok"
+                self._router.record_success(name, time.perf_counter() - t0)
+                verdict = True
                 return resp
+            except DeadlineExceeded:
+                raise
             except Exception as e:
                 last_exc = e
-                msg = str(e).lower()
-                # Rotate on 404 model not found or 429 rate limit or unsupported method errors
-                if any(x in msg for x in ["404", "not found", "unsupported", "rate", "quota", "429", "exceeded"]):
-                    logger.warning(f"Model error '{e}'. Rotating to next candidate.")
-                    self._rotate()
-                else:
+                if not _is_model_error(e):
                     break
-        attempts = ", ".join(self._candidates)
+                self._router.record_failure(name, e)
+                verdict = True
+                logger.warning(f"Model {name} failed ('{e}'); trying next candidate.")
+            finally:
+                if not verdict:
+                    self._router.release(name)
+        attempts = ", ".join(tried)
         raise RuntimeError(f"Gemini call failed after trying models: [{attempts}] | last_error={last_exc}")
 
     async def structured_json(self, *, prompt: str, email_text: str) -> Dict[str, Any]:
@@ -200,27 +378,27 @@ class _GeminiLLM:
         resp = await self._call_chat(messages)
         text = getattr(resp, "text", None) or str(resp)
         # Coerce to JSON
-        try:
-            if text.strip().startswith("```"):
-                text = "\n".join([line for line in text.splitlines() if not line.strip().startswith("```")])
-            data = json.loads(text)
-        except Exception:
-            import re
-            m = re.search(r"\{[\s\S]*\}", text)
-            if not m:
-                raise
-            data = json.loads(m.group(0))
+        with span("llm.coerce_json"):
+            try:
+                if text.strip().startswith("```"):
+                    text = "\n".join([line for line in text.splitlines() if not line.strip().startswith("```")])
+                data = json.loads(text)
+            except Exception:
+                import re
+                m = re.search(r"\{[\s\S]*\}", text)
+                if not m:
+                    raise
+                data = json.loads(m.group(0))
         return data
 
-    async def generate_draft(
-        self,
-        *,
+    @staticmethod
+    def _draft_messages(
         system_prompt: str,
         email_text: str,
         analysis: Optional[Dict[str, Any]],
         contract_snippet: Optional[str],
         retrieved_clauses: Optional[str],
-    ) -> str:
+    ) -> List[str]:
         guidance = (
             system_prompt
             + "\nIncorporate any relevant references to clauses 9.1, 9.2, 10.2 as applicable."
@@ -233,10 +411,120 @@ class _GeminiLLM:
             + ("Retrieved Clauses:\n" + retrieved_clauses + "\n\n" if retrieved_clauses else "")
             + "Draft a reply email string only."
         )
-        messages = [guidance, human]
+        return [guidance, human]
+
+    async def generate_draft(
+        self,
+        *,
+        system_prompt: str,
+        email_text: str,
+        analysis: Optional[Dict[str, Any]],
+        contract_snippet: Optional[str],
+        retrieved_clauses: Optional[str],
+    ) -> str:
+        messages = self._draft_messages(system_prompt, email_text, analysis, contract_snippet, retrieved_clauses)
         resp = await self._call_chat(messages)
         return getattr(resp, "text", None) or str(resp)
 
+    async def generate_draft_stream(
+        self,
+        *,
+        system_prompt: str,
+        email_text: str,
+        analysis: Optional[Dict[str, Any]],
+        contract_snippet: Optional[str],
+        retrieved_clauses: Optional[str],
+    ) -> AsyncIterator[str]:
+        """Yield draft text chunks as the SDK's streaming API produces them.
+
+        The SDK iterator is blocking, so a worker thread drains it into a queue.
+        Another model is tried only until the first chunk arrives; after that an
+        error is raised to the caller, which already holds a partial draft.
+        """
+        messages = self._draft_messages(system_prompt, email_text, analysis, contract_snippet, retrieved_clauses)
+        scheduler = get_scheduler()
+        deadline = scheduler.deadline()
+        tried: List[str] = []
+        last_exc = None
+        while True:
+            name = self._router.choose(exclude=tried)
+            if name is None:
+                break
+            tried.append(name)
+            attempt = 0
+            verdict = False
+            try:
+                model = self._model_for(name)
+                while True:
+                    started = False
+                    t0 = time.perf_counter()
+                    try:
+                        # The slot is held for the whole stream, so streams count against the model's cap
+                        async with scheduler.slot(name, deadline):
+                            async for text in _stream_chunks(model, messages):
+                                if not started:
+                                    # Time to first chunk is what the router optimizes for streams
+                                    started = True
+                                    self._router.record_success(name, time.perf_counter() - t0)
+                                    request_context.annotate(model=name)
+                                    verdict = True
+                                yield text
+                        scheduler.record_success(name)
+                        return
+                    except DeadlineExceeded:
+                        raise
+                    except Exception as e:
+                        if started:
+                            raise
+                        last_exc = e
+                        attempt += 1
+                        if not scheduler.should_retry(name, e, attempt, deadline):
+                            break
+                if not _is_model_error(last_exc):
+                    raise last_exc
+                self._router.record_failure(name, last_exc)
+                verdict = True
+                logger.warning(f"Model {name} failed ('{last_exc}'); trying next candidate.")
+            finally:
+                if not verdict:
+                    self._router.release(name)
+        attempts = ", ".join(tried)
+        raise RuntimeError(f"Gemini call failed after trying models: [{attempts}] | last_error={last_exc}")
+
+
+async def _stream_chunks(model, messages: List[str]) -> AsyncIterator[str]:
+    """Drain the blocking SDK stream iterator on a worker thread into the event loop."""
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def _pump():
+        try:
+            for chunk in model.generate_content(messages, stream=True):
+                if stop.is_set():
+                    return
+                text = getattr(chunk, "text", None)
+                if text:
+                    loop.call_soon_threadsafe(queue.put_nowait, ("chunk", text))
+            loop.call_soon_threadsafe(queue.put_nowait, ("end", None))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+
+    # Holds an LLM worker for the whole stream
+    loop.run_in_executor(_llm_executor(), _pump)
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "chunk":
+                yield value
+            elif kind == "end":
+                return
+            else:
+                raise value
+    finally:
+        # Client went away or the stream failed: let the worker thread finish quietly
+        stop.set()
+
 
 _llm_instance = None
 
@@ -252,3 +540,18 @@ def get_llm():
         logger.warning("GEMINI_API_KEY not set; using Mock LLM for offline testing")
         _llm_instance = _MockLLM()
     return _llm_instance
+
+
+def start_model_discovery() -> Optional[asyncio.Task]:
+    """Kick off background model discovery (app startup); no-op for the mock or a fresh cache."""
+    llm = get_llm()
+    if not isinstance(llm, _GeminiLLM) or llm.discovery_fresh():
+        return None
+
+    async def _run():
+        try:
+            await llm.refresh_models()
+        except Exception as e:
+            logger.warning(f"Background model discovery failed: {e}")
+
+    return asyncio.get_running_loop().create_task(_run())
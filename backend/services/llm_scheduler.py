@@ -0,0 +1,300 @@
+"""Client-side admission control for Gemini calls.
+
+Every model gets its own limiter:
+
+- a concurrency cap (LLM_MAX_CONCURRENCY in-flight calls per model),
+- a token bucket refilled at LLM_RPM requests per minute (burst LLM_BURST),
+- a cooldown set after a rate-limit error, from the server's retry-after hint
+  when it gives one, else jittered exponential backoff.
+
+Callers wait in FIFO order for all three (a freed concurrency slot goes
+straight to the longest waiter), but only until their deadline
+(LLM_QUEUE_TIMEOUT seconds by default). A burst therefore queues and drains at
+the allowed rate instead of hammering the API and rotating through every
+candidate model, and requests that cannot be served in time fail fast with
+DeadlineExceeded.
+"""
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+_RPM = float(os.getenv("LLM_RPM", "60"))
+_BURST = int(os.getenv("LLM_BURST", "5"))
+_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+
+_RATE_LIMIT_MARKERS = ("rate limit", "ratelimit", "quota", "resource_exhausted", "resource exhausted")
+_TRANSIENT_MARKERS = ("unavailable", "deadline", "timed out", "timeout", "internal error")
+# Status codes as whole numbers only: "max 5000 tokens" or a request id must not look like a 500
+_RATE_LIMIT_STATUS = re.compile(r"\b429\b")
+_TRANSIENT_STATUS = re.compile(r"\b50[0-4]\b")
+# "Please retry in 13.5s", "retry_delay { seconds: 13 }", "Retry-After: 7"
+_RETRY_AFTER = re.compile(
+    r"retry in ([\d.]+)\s*s|retry_delay\s*\{\s*seconds:\s*(\d+)|retry-after:?\s*([\d.]+)",
+    re.IGNORECASE,
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request could not be admitted or retried before its deadline."""
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by SDK errors (``code`` on google-genai/api_core, ``status_code`` elsewhere)."""
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    return None
+
+
+def is_rate_limit(exc: BaseException) -> bool:
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429
+    msg = str(exc).lower()
+    return bool(_RATE_LIMIT_STATUS.search(msg)) or any(x in msg for x in _RATE_LIMIT_MARKERS)
+
+
+def is_transient(exc: BaseException) -> bool:
+    status = _status_code(exc)
+    if status is not None:
+        return 500 <= status <= 504
+    msg = str(exc).lower()
+    return bool(_TRANSIENT_STATUS.search(msg)) or any(x in msg for x in _TRANSIENT_MARKERS)
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Server-suggested delay in seconds, from an attribute or the error text."""
+    for attr in ("retry_after", "retry_delay"):
+        value = getattr(exc, attr, None)
+        if value is not None:
+            try:
+                return float(getattr(value, "total_seconds", lambda: value)())
+            except (TypeError, ValueError):
+                pass
+    m = _RETRY_AFTER.search(str(exc))
+    if m:
+        return float(next(g for g in m.groups() if g))
+    return None
+
+
+class TokenBucket:
+    """Reservation-based token bucket: callers book a token and sleep until it exists.
+
+    Tokens may go negative; each reservation gets the next free slot, so waiters
+    are served in arrival order without a lock (all access is on the event loop).
+    """
+
+    def __init__(self, rate_per_s: float, capacity: int):
+        self.rate = rate_per_s
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Book one token; returns how long to wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1.0
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self) -> None:
+        self.tokens = min(self.capacity, self.tokens + 1.0)
+
+
+class _ModelLimiter:
+    def __init__(self, name: str, max_concurrency: int, rpm: float, burst: int):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.bucket = TokenBucket(rpm / 60.0, burst)
+        self.in_flight = 0
+        # Waiter futures; a plain deque (not asyncio.Semaphore) so the limiter is not
+        # bound to the first event loop that touches it
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.blocked_until = 0.0
+        self.consecutive_throttles = 0
+        self.calls = 0
+        self.throttled = 0
+        self.retries = 0
+        self.deadline_exceeded = 0
+
+    async def _acquire_slot(self, deadline: float) -> None:
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            # A released slot is handed to the head waiter, so waking means we own it
+            await asyncio.wait_for(fut, timeout=max(0.0, deadline - time.monotonic()))
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                self._release_slot()  # handed a slot as we left; pass it on
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                raise DeadlineExceeded(f"{self.name}: no free slot before deadline") from None
+            raise
+
+    def _release_slot(self) -> None:
+        # Hand the slot straight to the oldest waiter (it stays counted in in_flight),
+        # so a caller arriving meanwhile cannot take it first
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.get_loop().call_soon_threadsafe(self._hand_over, fut)
+                return
+        self.in_flight -= 1
+
+    def _hand_over(self, fut: asyncio.Future) -> None:
+        if fut.done():
+            # The waiter gave up before the hand-off landed: the slot goes to the next one
+            self._release_slot()
+        else:
+            fut.set_result(None)
+
+    def backoff(self, exc: BaseException) -> float:
+        """Record a throttle/transient error and return the cooldown applied to the model."""
+        self.consecutive_throttles += 1
+        hint = retry_after(exc)
+        if hint is not None:
+            # Honor the server's hint, plus a little jitter so waiters do not stampede
+            delay = hint + random.uniform(0, 0.1 * hint + 0.05)
+        else:
+            cap = min(_BACKOFF_MAX, _BACKOFF_BASE * (2 ** (self.consecutive_throttles - 1)))
+            delay = cap / 2 + random.uniform(0, cap / 2)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": sum(1 for f in self._waiters if not f.done()),
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "deadline_exceeded": self.deadline_exceeded,
+            "cooldown_s": round(max(0.0, self.blocked_until - time.monotonic()), 3),
+        }
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = _MAX_CONCURRENCY,
+        rpm: float = _RPM,
+        burst: int = _BURST,
+        max_retries: int = _MAX_RETRIES,
+        queue_timeout: float = _QUEUE_TIMEOUT,
+    ):
+        self.max_concurrency = max_concurrency
+        self.rpm = rpm
+        self.burst = burst
+        self.max_retries = max_retries
+        self.queue_timeout = queue_timeout
+        self._limiters: Dict[str, _ModelLimiter] = {}
+
+    def limiter(self, model: str) -> _ModelLimiter:
+        lim = self._limiters.get(model)
+        if lim is None:
+            lim = self._limiters[model] = _ModelLimiter(model, self.max_concurrency, self.rpm, self.burst)
+        return lim
+
+    def deadline(self, timeout: Optional[float] = None) -> float:
+        return time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+
+    @asynccontextmanager
+    async def slot(self, model: str, deadline: float) -> AsyncIterator[None]:
+        """Wait out the model's cooldown, then its rate bucket, then a concurrency slot."""
+        lim = self.limiter(model)
+        try:
+            wait = lim.blocked_until - time.monotonic()
+            if wait > 0:
+                if time.monotonic() + wait > deadline:
+                    raise DeadlineExceeded(f"{model}: cooling down for {wait:.1f}s past deadline")
+                await asyncio.sleep(wait)
+            wait = lim.bucket.reserve()
+            if time.monotonic() + wait > deadline:
+                lim.bucket.refund()
+                raise DeadlineExceeded(f"{model}: rate limit would delay the call past its deadline")
+            try:
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await lim._acquire_slot(deadline)
+            except BaseException:
+                # Never called: give the booked token back so giving up costs no rate budget
+                lim.bucket.refund()
+                raise
+        except DeadlineExceeded:
+            lim.deadline_exceeded += 1
+            raise
+        lim.calls += 1
+        try:
+            yield
+        finally:
+            lim._release_slot()
+
+    def should_retry(self, model: str, exc: BaseException, attempt: int, deadline: float) -> bool:
+        """Apply backoff for throttling/transient errors; True if the caller should retry the same model."""
+        if not (is_rate_limit(exc) or is_transient(exc)):
+            return False
+        lim = self.limiter(model)
+        if is_rate_limit(exc):
+            lim.throttled += 1
+        delay = lim.backoff(exc)
+        if attempt >= self.max_retries or time.monotonic() + delay > deadline:
+            return False
+        lim.retries += 1
+        logger.warning(f"Gemini model {model} throttled/unavailable ({exc}); retrying in {delay:.1f}s")
+        return True
+
+    def record_success(self, model: str) -> None:
+        self.limiter(model).consecutive_throttles = 0
+
+    async def run(self, model: str, fn: Callable[[], Awaitable[Any]], deadline: Optional[float] = None) -> Any:
+        """Run fn under the model's limits, retrying throttled/transient failures until the deadline."""
+        deadline = self.deadline() if deadline is None else deadline
+        attempt = 0
+        while True:
+            async with self.slot(model, deadline):
+                try:
+                    result = await fn()
+                except Exception as e:
+                    error = e
+                else:
+                    self.record_success(model)
+                    return result
+            attempt += 1
+            if not self.should_retry(model, error, attempt, deadline):
+                raise error
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: lim.stats() for name, lim in self._limiters.items()}
+
+
+_SCHEDULER: Optional[LLMScheduler] = None
+
+
+def get_scheduler() -> LLMScheduler:
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        _SCHEDULER = LLMScheduler()
+    return _SCHEDULER
@@ -0,0 +1,146 @@
+"""In-process latency metrics, exposed in Prometheus text format.
+
+span(stage, **labels) times a block and records it in one histogram,
+``legal_assistant_stage_duration_seconds``, labelled with the stage plus
+whatever the caller adds (model, cache outcome, retrieval mode, ...). The
+labels dict is yielded, so outcomes known only inside the block (a cache hit,
+an error) can be attached before it closes.
+
+When a debug request collects spans (collect_spans()), every span finished in
+that request's context is also appended to its trace. Spans with a cache
+outcome or a successful model also annotate the request's access log record.
+/metrics renders the registry directly; there is no client library or
+collector to run.
+"""
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from backend.services import request_context
+except ModuleNotFoundError:
+    from services import request_context
+
+# Seconds; covers cache lookups (sub-millisecond) through slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_SPANS: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("metrics_spans", default=None)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: LabelKey, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label set; safe to observe from any thread."""
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label key -> [per-bucket counts..., overflow count, sum]
+        self._series: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = tuple(sorted((labels or {}).items()))
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[slot] += 1
+            series[-1] += value
+
+    def snapshot(self) -> Dict[LabelKey, Dict[str, Any]]:
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        out = {}
+        for key, values in series.items():
+            counts = values[:-1]
+            out[key] = {"count": int(sum(counts)), "sum": values[-1], "counts": counts}
+        return out
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, data in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, data["counts"]):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(key, le)} {int(cumulative)}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(key, le)} {data['count']}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(round(data['sum'], 6))}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {data['count']}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+STAGE_SECONDS = Histogram(
+    "legal_assistant_stage_duration_seconds",
+    "Wall-clock time per pipeline stage (labels: stage, plus model/cache/mode/outcome where relevant)",
+)
+
+_REGISTRY: List[Histogram] = [STAGE_SECONDS]
+
+
+@contextmanager
+def span(stage: str, **labels: Any) -> Iterator[Dict[str, str]]:
+    """Time the block as `stage`; yields its labels dict so the block can add outcome labels."""
+    tags = {k: str(v) for k, v in labels.items()}
+    start = time.perf_counter()
+    try:
+        yield tags
+    except BaseException:
+        tags.setdefault("outcome", "error")
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        tags = {k: str(v) for k, v in tags.items()}
+        STAGE_SECONDS.observe(elapsed, {"stage": stage, **tags})
+        trace = _SPANS.get()
+        if trace is not None:
+            trace.append({"span": stage, "ms": round(elapsed * 1000.0, 3), **tags})
+        if "cache" in tags:
+            request_context.note_cache(stage.split(".", 1)[0], tags["cache"])
+        if "model" in tags and tags.get("outcome") == "ok":
+            request_context.annotate(model=tags["model"])
+
+
+@contextmanager
+def collect_spans() -> Iterator[List[Dict[str, Any]]]:
+    """Collect the spans finished in this context (and tasks started from it) into a list."""
+    spans: List[Dict[str, Any]] = []
+    token = _SPANS.set(spans)
+    try:
+        yield spans
+    finally:
+        _SPANS.reset(token)
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
@@ -0,0 +1,213 @@
+"""Health-aware routing across the Gemini candidate models.
+
+Each model has a circuit breaker and moving averages of its latency and error
+rate. A call asks the router for a model instead of using a shared "current"
+model, so one failing request no longer switches the model for everyone.
+
+- closed: the model is routable. It opens after ROUTER_FAILURE_THRESHOLD
+  consecutive failures, or when its error rate stays above
+  ROUTER_ERROR_THRESHOLD. Errors that mean the model cannot work at all
+  (404, unsupported method) open it immediately with a longer cooldown.
+- open: the model is skipped until its cooldown (ROUTER_COOLDOWN seconds,
+  doubled after each failed probe) has elapsed.
+- half_open: the next call after the cooldown is the probe; success closes
+  the breaker and clears the error rate, failure re-opens it.
+
+When no model is routable, the open model due soonest is probed early
+instead of failing the call. That call is its one probe: concurrent calls
+go to the next open model, or get no model once all are half-open.
+
+Among routable models the router picks the lowest latency-weighted score:
+latency EWMA x (1 + error penalty) x (1 + preference penalty), where models
+without samples use a neutral prior. The preferred model therefore wins
+again once it is healthy.
+"""
+import os
+import time
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+_ERROR_THRESHOLD = float(os.getenv("ROUTER_ERROR_THRESHOLD", "0.5"))
+_COOLDOWN = float(os.getenv("ROUTER_COOLDOWN", "30"))
+_MAX_COOLDOWN = float(os.getenv("ROUTER_MAX_COOLDOWN", "600"))
+_PRIOR_LATENCY = float(os.getenv("ROUTER_PRIOR_LATENCY", "2.0"))
+_ALPHA = 0.2  # EWMA smoothing
+_MIN_SAMPLES = 5  # before the error rate alone can open a breaker
+_PREFERENCE_WEIGHT = 0.25
+_ERROR_WEIGHT = 4.0
+
+_FATAL_MARKERS = ("404", "not found", "unsupported", "not supported", "permission", "403")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_fatal(exc: BaseException) -> bool:
+    """Errors that will not go away by retrying the same model soon."""
+    msg = str(exc).lower()
+    return any(x in msg for x in _FATAL_MARKERS)
+
+
+class _ModelHealth:
+    def __init__(self, name: str, rank: int):
+        self.name = name
+        self.rank = rank
+        self.state = CLOSED
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.cooldown = _COOLDOWN
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.calls = 0
+        self.failures = 0
+        self.last_error = ""
+
+    def score(self, prior_latency: float) -> float:
+        latency = self.latency if self.latency is not None else prior_latency
+        return latency * (1.0 + _ERROR_WEIGHT * self.error_rate) * (1.0 + _PREFERENCE_WEIGHT * self.rank)
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "latency_ms": round(self.latency * 1000.0, 1) if self.latency is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "calls": self.calls,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_s": round(max(0.0, self.open_until - now), 1) if self.state == OPEN else 0.0,
+            "last_error": self.last_error,
+        }
+
+
+class ModelRouter:
+    def __init__(self, candidates: Iterable[str], clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._models: Dict[str, _ModelHealth] = {}
+        self.set_candidates(candidates)
+
+    @property
+    def candidates(self) -> List[str]:
+        return list(self._models)
+
+    def set_candidates(self, candidates: Iterable[str]) -> None:
+        """Replace the candidate list (preference order), keeping health of known models."""
+        models: Dict[str, _ModelHealth] = {}
+        for rank, name in enumerate(dict.fromkeys(candidates)):
+            health = self._models.get(name) or _ModelHealth(name, rank)
+            health.rank = rank
+            models[name] = health
+        if not models:
+            raise ValueError("ModelRouter needs at least one candidate model")
+        self._models = models
+
+    def _prior_latency(self) -> float:
+        measured = sorted(m.latency for m in self._models.values() if m.latency is not None)
+        return measured[len(measured) // 2] if measured else _PRIOR_LATENCY
+
+    def _routable(self, health: _ModelHealth, now: float) -> bool:
+        if health.state == CLOSED:
+            return True
+        if health.state == OPEN and now >= health.open_until:
+            return True  # due for a probe
+        return False  # open and cooling down, or half-open with its probe in flight
+
+    def choose(self, exclude: Iterable[str] = ()) -> Optional[str]:
+        """Pick the model for one call; None when every candidate is excluded."""
+        now = self._clock()
+        excluded = set(exclude)
+        pool = [m for m in self._models.values() if m.name not in excluded]
+        if not pool:
+            return None
+        due = [m for m in pool if m.state == OPEN and now >= m.open_until]
+        if due:
+            # A model past its cooldown gets this call as its probe; scores would never pick it
+            best = min(due, key=lambda m: m.rank)
+        else:
+            routable = [m for m in pool if self._routable(m, now)]
+            if not routable:
+                # Every breaker is open: rather than fail outright, probe the open model that recovers
+                # soonest early. Half-open models keep their single probe; with none open, give up
+                waiting = [m for m in pool if m.state == OPEN]
+                if not waiting:
+                    return None
+                routable = [min(waiting, key=lambda m: m.open_until)]
+            prior = self._prior_latency()
+            best = min(routable, key=lambda m: (m.score(prior), m.rank))
+        if best.state == OPEN:
+            best.state = HALF_OPEN
+            best.probe_in_flight = True
+            logger.info(f"Probing Gemini model {best.name} after cooldown")
+        best.calls += 1
+        return best.name
+
+    def preview(self) -> Optional[str]:
+        """The model the next call would get, without side effects."""
+        now = self._clock()
+        routable = [m for m in self._models.values() if self._routable(m, now)]
+        if not routable:
+            return None
+        prior = self._prior_latency()
+        return min(routable, key=lambda m: (m.score(prior), m.rank)).name
+
+    def record_success(self, name: str, latency: float) -> None:
+        health = self._models.get(name)
+        if health is None:
+            return
+        health.latency = latency if health.latency is None else (1 - _ALPHA) * health.latency + _ALPHA * latency
+        health.error_rate *= 1 - _ALPHA
+        health.samples += 1
+        health.consecutive_failures = 0
+        if health.state != CLOSED:
+            logger.info(f"Gemini model {name} recovered; closing breaker")
+            # Start over so the recovered model competes on its merits again
+            health.error_rate = 0.0
+        health.state = CLOSED
+        health.probe_in_flight = False
+        health.cooldown = _COOLDOWN
+
+    def record_failure(self, name: str, exc: BaseException) -> None:
+        health = self._models.get(name)
+        if health is None:
+            return
+        now = self._clock()
+        health.failures += 1
+        health.samples += 1
+        health.consecutive_failures += 1
+        health.error_rate = (1 - _ALPHA) * health.error_rate + _ALPHA
+        health.last_error = str(exc)[:200]
+        fatal = is_fatal(exc)
+        if health.state == HALF_OPEN:
+            # Failed probe: back off harder before the next one
+            health.cooldown = min(_MAX_COOLDOWN, health.cooldown * 2)
+            self._open(health, now, health.cooldown)
+        elif fatal:
+            self._open(health, now, min(_MAX_COOLDOWN, _COOLDOWN * 10))
+        elif health.consecutive_failures >= _FAILURE_THRESHOLD or (
+            health.samples >= _MIN_SAMPLES and health.error_rate >= _ERROR_THRESHOLD
+        ):
+            self._open(health, now, health.cooldown)
+
+    def release(self, name: str) -> None:
+        """The call ended without a verdict on the model (e.g. cancelled or timed out locally)."""
+        health = self._models.get(name)
+        if health is not None and health.state == HALF_OPEN:
+            health.state = OPEN
+            health.probe_in_flight = False
+
+    def _open(self, health: _ModelHealth, now: float, cooldown: float) -> None:
+        if health.state != OPEN:
+            logger.warning(f"Opening breaker for Gemini model {health.name} for {cooldown:.0f}s: {health.last_error}")
+        health.state = OPEN
+        health.probe_in_flight = False
+        health.open_until = now + cooldown
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = self._clock()
+        return [m.snapshot(now) for m in self._models.values()]
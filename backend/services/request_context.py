@@ -0,0 +1,35 @@
+"""Per-request annotations for the access log.
+
+The access log middleware opens a fields dict for each request in a
+contextvar; code handling the request adds to it (which caches hit, which
+model answered) without being passed the request. Tasks started while
+handling the request (LangGraph nodes, gather) copy the context and share the
+same dict. Outside a request the calls are no-ops.
+"""
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Optional
+
+_FIELDS: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_fields", default=None)
+
+
+def begin() -> "Token[Optional[Dict[str, Any]]]":
+    return _FIELDS.set({})
+
+
+def end(token: "Token[Optional[Dict[str, Any]]]") -> Dict[str, Any]:
+    fields = _FIELDS.get() or {}
+    _FIELDS.reset(token)
+    return fields
+
+
+def annotate(**fields: Any) -> None:
+    current = _FIELDS.get()
+    if current is not None:
+        current.update(fields)
+
+
+def note_cache(name: str, outcome: str) -> None:
+    """Record a cache outcome ("hit"/"miss") for one cache; a later lookup of the same cache wins."""
+    current = _FIELDS.get()
+    if current is not None:
+        current.setdefault("cache", {})[name] = outcome
@@ -0,0 +1,81 @@
+"""Coalesce identical in-flight async calls (the "single-flight" pattern).
+
+When several requests miss the cache for the same key at once, only the first
+(the leader) runs the expensive call; the others await its result. Counters
+record how many calls were made and how many were saved.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+        self.failures = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        while True:
+            fut = self._inflight.get(key)
+            # Futures are bound to their loop; callers on another loop lead their own flight
+            if fut is None or fut.done() or fut.get_loop() is not loop:
+                break
+            self.followers += 1
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise  # this follower itself was cancelled
+                # The leader was cancelled; retry, possibly becoming the new leader
+                self.followers -= 1
+
+        fut = loop.create_future()
+        self._inflight[key] = fut
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            self.failures += 1
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved so an unawaited failure is not logged twice
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.leaders,
+            "coalesced": self.followers,
+            "failures": self.failures,
+            "in_flight": len(self._inflight),
+        }
+
+
+_GROUPS: Dict[str, SingleFlight] = {}
+_GROUPS_LOCK = threading.Lock()
+
+
+def get_singleflight(name: str) -> SingleFlight:
+    with _GROUPS_LOCK:
+        group = _GROUPS.get(name)
+        if group is None:
+            group = _GROUPS[name] = SingleFlight(name)
+        return group
+
+
+def singleflight_stats() -> Dict[str, Dict[str, int]]:
+    """Per-group counters; 'coalesced' is the number of LLM calls saved."""
+    with _GROUPS_LOCK:
+        groups = list(_GROUPS.values())
+    return {g.name: g.stats() for g in groups}
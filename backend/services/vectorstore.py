@@ -1,98 +1,462 @@
 import os
+import json
+import time
+import asyncio
+import hashlib
 import logging
-from typing import List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 
 try:
     import faiss  # type: ignore
-    from langchain_google_genai import GoogleGenerativeAIEmbeddings
-    from langchain.docstore.document import Document
-    from langchain_community.vectorstores import FAISS
     HAVE_FAISS = True
 except Exception:
     HAVE_FAISS = False
 
+try:
+    from backend.services.ingest import ClauseChunk, iter_contract_files, load_corpus
+    from backend.services.embeddings import EmbeddingProvider, get_embedding_provider, HAVE_NUMPY
+    from backend.services.cache import LRUCache
+    from backend.services.metrics import span
+except ModuleNotFoundError:
+    from services.ingest import ClauseChunk, iter_contract_files, load_corpus
+    from services.embeddings import EmbeddingProvider, get_embedding_provider, HAVE_NUMPY
+    from services.cache import LRUCache
+    from services.metrics import span
+
+if HAVE_NUMPY:
+    import numpy as np
+    try:
+        from backend.services.bm25 import BM25Index, reciprocal_rank_fusion
+    except ModuleNotFoundError:
+        from services.bm25 import BM25Index, reciprocal_rank_fusion
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
 _VECTOR_DIR = os.getenv("VECTOR_DB_DIR") or os.path.join(os.path.dirname(__file__), "..", "data", "vectorstore")
-_CONTRACT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "contract"))
-_DEFAULT_SNIPPET = os.path.join(_CONTRACT_DIR, "default_snippet.txt")
+_DEFAULT_CONTRACT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "contract"))
+_DEFAULT_SNIPPET = os.path.join(_DEFAULT_CONTRACT_DIR, "default_snippet.txt")
+# Directory of contract files (any depth) ingested clause by clause
+_CONTRACT_DIR = os.path.abspath(os.getenv("CONTRACT_DIR") or _DEFAULT_CONTRACT_DIR)
+
+_INDEX_FILE = "index.faiss"
+_VECTORS_FILE = "vectors.npy"
+_MANIFEST_FILE = "manifest.json"
+_MANIFEST_VERSION = 2
+# dense (embeddings), sparse (BM25) or hybrid (reciprocal rank fusion of both)
+_RETRIEVAL_MODE = (os.getenv("RETRIEVAL_MODE") or "hybrid").lower()
+_RETRIEVAL_MODES = {"dense", "sparse", "hybrid"}
 
 _INDEX = None
 
+# Query-side caches. Keys include the index version (a digest of provider and
+# document ids), so entries can never outlive the index they were computed on;
+# both caches are also cleared whenever a different index is swapped in.
+_QUERY_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+_EMBED_CACHE = LRUCache(max_entries=_QUERY_CACHE_SIZE, max_bytes=32 * 1024 * 1024)
+_RESULT_CACHE = LRUCache(max_entries=_QUERY_CACHE_SIZE, max_bytes=8 * 1024 * 1024)
+# How often (seconds) the index in use checks for added, edited or removed
+# contract files and, when persisted, for a manifest rewritten by another worker
+_MANIFEST_CHECK_INTERVAL = float(os.getenv("VECTOR_MANIFEST_CHECK_INTERVAL", "5"))
+_MANIFEST_CHECKED_AT = 0.0
+# _contract_stamp() of the files _INDEX was built from
+_CONTRACT_STAMP: Optional[str] = None
+_INDEX_LOCK = threading.Lock()
 
-def _load_contract_snippets() -> List[str]:
-    snippets: List[str] = []
-    try:
-        if os.path.exists(_DEFAULT_SNIPPET):
+# Bounded pool for index builds and CPU-bound search off the event loop
+_MAX_WORKERS = int(os.getenv("RETRIEVAL_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+_SNIPPET: Optional[str] = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=_MAX_WORKERS, thread_name_prefix="retrieval")
+        return _EXECUTOR
+
+
+def _default_snippet() -> str:
+    """Contents of default_snippet.txt, read once and kept in memory."""
+    global _SNIPPET
+    if _SNIPPET is None:
+        try:
             with open(_DEFAULT_SNIPPET, "r", encoding="utf-8") as f:
-                text = f.read().strip()
-                if text:
-                    snippets.append(text)
+                _SNIPPET = f.read().strip()
+        except Exception as e:
+            logger.warning(f"Default contract snippet unavailable: {e}")
+            _SNIPPET = ""
+    return _SNIPPET
+
+
+def _load_contract_chunks() -> List[ClauseChunk]:
+    chunks = load_corpus(_CONTRACT_DIR)
+    if chunks:
+        logger.info(f"Ingested {len(chunks)} clause chunks from {_CONTRACT_DIR}")
+    return chunks
+
+
+def _chunk_id(chunk: ClauseChunk) -> str:
+    # Identified by content, so edited clauses get new ids
+    return _content_hash(f"{chunk.contract_id}\x00{chunk.clause_number}\x00{chunk.text}")
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _VectorIndex:
+    """Clause vectors plus their documents, searched by inner product (cosine).
+
+    Uses a FAISS flat index when faiss is installed, otherwise a NumPy matrix
+    product. Either backing store may be memory-mapped from VECTOR_DB_DIR.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, docs: List[Dict[str, Any]], vectors=None, faiss_index=None):
+        self.provider = provider
+        self.docs = docs
+        if faiss_index is None and HAVE_FAISS and vectors is not None and len(docs):
+            faiss_index = faiss.IndexFlatIP(vectors.shape[1])
+            faiss_index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+        self._faiss = faiss_index
+        self._vectors = vectors
+        self._bm25 = None
+        self.version = _content_hash("\x00".join([provider.name] + [d["id"] for d in docs]))
+        # (mtime_ns, size) of the manifest this index matches; None when not persisted
+        self.manifest_stamp: Optional[Tuple[int, int]] = None
+
+    @property
+    def bm25(self) -> "BM25Index":
+        if self._bm25 is None:
+            self._bm25 = BM25Index([d["text"] for d in self.docs])
+        return self._bm25
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def vectors(self) -> "np.ndarray":
+        if self._vectors is None:
+            self._vectors = self._faiss.reconstruct_n(0, self._faiss.ntotal)
+        return self._vectors
+
+    def _cache_embedding(self, query: str, q) -> "np.ndarray":
+        q = np.asarray(q, dtype=np.float32)
+        q.setflags(write=False)
+        _EMBED_CACHE.set((self.version, query), q)
+        return q
+
+    def _embed_query(self, query: str) -> "np.ndarray":
+        q = _EMBED_CACHE.get((self.version, query))
+        if q is None:
+            with span("retrieval.embed", provider=self.provider.name):
+                q = self._cache_embedding(query, self.provider.embed_query(query))
+        return q
+
+    async def _aembed_query(self, query: str) -> "np.ndarray":
+        q = _EMBED_CACHE.get((self.version, query))
+        if q is None:
+            with span("retrieval.embed", provider=self.provider.name):
+                q = self._cache_embedding(query, await self.provider.aembed_query(query))
+        return q
+
+    def search(self, query: str, k: int, q=None) -> List[Tuple[int, float]]:
+        """Top-k (doc position, cosine score) pairs, best first; q is an optional precomputed query vector."""
+        k = min(k, len(self.docs))
+        if k <= 0:
+            return []
+        if q is None:
+            q = self._embed_query(query)
+        if self._faiss is not None:
+            scores, ids = self._faiss.search(q[None, :], k)
+            return [(int(i), float(sc)) for i, sc in zip(ids[0], scores[0]) if i >= 0]
+        scores = self._vectors @ q
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def similarity_search(self, query: str, k: int = 3, mode: str = "dense") -> List[Dict[str, Any]]:
+        key = (self.version, mode, k, query)
+        with span("retrieval.search", mode=mode) as tags:
+            positions = _RESULT_CACHE.get(key)
+            tags["cache"] = "hit" if positions is not None else "miss"
+            if positions is None:
+                positions = self._rank(query, k, mode)
+                _RESULT_CACHE.set(key, positions)
+        return [self.docs[i] for i in positions]
+
+    async def asimilarity_search(self, query: str, k: int = 3, mode: str = "dense") -> List[Dict[str, Any]]:
+        """similarity_search that embeds asynchronously and searches on the retrieval executor."""
+        key = (self.version, mode, k, query)
+        with span("retrieval.search", mode=mode) as tags:
+            positions = _RESULT_CACHE.get(key)
+            tags["cache"] = "hit" if positions is not None else "miss"
+            if positions is None:
+                q = await self._aembed_query(query) if mode != "sparse" else None
+                loop = asyncio.get_running_loop()
+                positions = await loop.run_in_executor(_executor(), self._rank, query, k, mode, q)
+                _RESULT_CACHE.set(key, positions)
+        return [self.docs[i] for i in positions]
+
+    def _rank(self, query: str, k: int, mode: str, q=None) -> Tuple[int, ...]:
+        if mode == "sparse":
+            ranked = self.bm25.search(query, k)
+        elif mode == "hybrid":
+            # Fuse deeper candidate lists so a doc ranked well by only one side can still surface
+            depth = max(4 * k, 20)
+            ranked = reciprocal_rank_fusion([self.search(query, depth, q), self.bm25.search(query, depth)], k)
+        else:
+            ranked = self.search(query, k, q)
+        return tuple(i for i, _ in ranked)
+
+
+def _contract_stamp() -> str:
+    """Digest of every contract file's path, mtime and size; changes when one is added, edited or removed."""
+    parts = []
+    for path in iter_contract_files(_CONTRACT_DIR):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        parts.append(f"{path}\x00{st.st_mtime_ns}\x00{st.st_size}")
+    return _content_hash("\n".join(parts))
+
+
+def _manifest_stamp() -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(os.path.join(_VECTOR_DIR, _MANIFEST_FILE))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _read_manifest() -> Optional[Dict[str, Any]]:
+    path = os.path.join(_VECTOR_DIR, _MANIFEST_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
     except Exception as e:
-        logger.warning(f"Failed to load default contract snippet: {e}")
-    return snippets
+        logger.warning(f"Ignoring unreadable vector manifest: {e}")
+        return None
+    if manifest.get("version") != _MANIFEST_VERSION:
+        return None
+    if not os.path.exists(os.path.join(_VECTOR_DIR, manifest.get("vectors_file") or "")):
+        return None
+    return manifest
+
+
+def _save_index(index: _VectorIndex) -> None:
+    """Persist vectors and a manifest of the documents they belong to, in row order."""
+    os.makedirs(_VECTOR_DIR, exist_ok=True)
+    vectors_file = _INDEX_FILE if index._faiss is not None else _VECTORS_FILE
+    vectors_path = os.path.join(_VECTOR_DIR, vectors_file)
+    manifest_path = os.path.join(_VECTOR_DIR, _MANIFEST_FILE)
+    manifest = {
+        "version": _MANIFEST_VERSION,
+        "provider": index.provider.name,
+        "vectors_file": vectors_file,
+        "docs": index.docs,
+    }
+    # Write both files atomically; the manifest goes last so it never describes a stale index
+    if index._faiss is not None:
+        faiss.write_index(index._faiss, vectors_path + ".tmp")
+    else:
+        with open(vectors_path + ".tmp", "wb") as f:
+            np.save(f, np.asarray(index.vectors(), dtype=np.float32))
+    os.replace(vectors_path + ".tmp", vectors_path)
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    index.manifest_stamp = _manifest_stamp()
+
+
+def _load_index(manifest: Dict[str, Any], provider: EmbeddingProvider) -> _VectorIndex:
+    # Read-only and memory-mapped: pages are shared between workers and loaded lazily
+    path = os.path.join(_VECTOR_DIR, manifest["vectors_file"])
+    stamp = _manifest_stamp()
+    if manifest["vectors_file"] == _INDEX_FILE:
+        if not HAVE_FAISS:
+            raise ValueError("index was written with faiss, which is not installed")
+        index = _VectorIndex(provider, manifest["docs"], faiss_index=faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY))
+        count = index._faiss.ntotal
+    else:
+        index = _VectorIndex(provider, manifest["docs"], vectors=np.load(path, mmap_mode="r"))
+        count = index._vectors.shape[0]
+    if count != len(manifest["docs"]):
+        raise ValueError(f"index has {count} vectors but manifest lists {len(manifest['docs'])} documents")
+    index.manifest_stamp = stamp
+    return index
+
+
+def _build_index(provider: EmbeddingProvider, chunks: List[ClauseChunk]) -> _VectorIndex:
+    texts = [c.text for c in chunks]
+    provider.fit(texts)
+    docs = [{"id": _chunk_id(c), "text": c.text, "metadata": c.metadata} for c in chunks]
+    return _VectorIndex(provider, docs, vectors=provider.embed_documents(texts))
+
+
+def _open_index():
+    """Build, load or incrementally update the index; False when retrieval is unavailable."""
+    provider = get_embedding_provider() if HAVE_NUMPY else None
+    if provider is None:
+        logger.warning("NumPy not available; using simple fallback retrieval")
+        return False
+    chunks = _load_contract_chunks()
+    if not chunks:
+        return False
+    if not provider.remote:
+        # Local embeddings are cheap and IDF depends on the whole corpus: rebuild in memory
+        return _build_index(provider, chunks)
+
+    wanted = {_chunk_id(c): c for c in chunks}
+    manifest = _read_manifest()
+    if manifest and manifest.get("provider") == provider.name:
+        have = {d["id"] for d in manifest["docs"]}
+        try:
+            stored = _load_index(manifest, provider)
+            if have == set(wanted):
+                logger.info(f"Loaded vector index from {_VECTOR_DIR} ({len(have)} docs, no re-embedding)")
+                return stored
+            # Keep vectors of unchanged clauses; embed only new or edited ones
+            keep = [pos for pos, d in enumerate(stored.docs) if d["id"] in wanted]
+            added = [i for i in wanted if i not in have]
+            new_vectors = provider.embed_documents([wanted[i].text for i in added])
+            vectors = np.vstack([np.asarray(stored.vectors())[keep], new_vectors])
+            docs = [stored.docs[pos] for pos in keep]
+            docs += [{"id": i, "text": wanted[i].text, "metadata": wanted[i].metadata} for i in added]
+            index = _VectorIndex(provider, docs, vectors=vectors)
+            _save_index(index)
+            logger.info(f"Updated vector index: embedded {len(added)} new docs, removed {len(have) - len(keep)}")
+            return index
+        except Exception as e:
+            logger.warning(f"Persisted vector index unusable, rebuilding: {e}")
+
+    index = _build_index(provider, chunks)
+    try:
+        _save_index(index)
+    except Exception as e:
+        logger.warning(f"Failed to persist vector index to {_VECTOR_DIR}: {e}")
+    return index
+
+
+def _index_current() -> bool:
+    """True when the index in use matches the contract files and, if persisted, the manifest on disk."""
+    if _INDEX is None or _contract_stamp() != _CONTRACT_STAMP:
+        return False
+    return not _INDEX or _INDEX.manifest_stamp in (None, _manifest_stamp())
+
+
+def _sources_changed() -> bool:
+    """True when contract files changed or another process rewrote the manifest, checked at most once per interval."""
+    global _MANIFEST_CHECKED_AT
+    now = time.monotonic()
+    if now - _MANIFEST_CHECKED_AT < _MANIFEST_CHECK_INTERVAL:
+        return False
+    _MANIFEST_CHECKED_AT = now
+    return not _index_current()
+
+
+def _index_ready() -> bool:
+    """True when _ensure_index would return immediately (no build, no source check due)."""
+    return _INDEX is not None and time.monotonic() - _MANIFEST_CHECKED_AT < _MANIFEST_CHECK_INTERVAL
 
 
 def _ensure_index():
-    global _INDEX
-    if _INDEX is not None:
-        return
-    if not HAVE_FAISS:
-        logger.warning("FAISS or embeddings not available; using simple fallback retrieval")
-        _INDEX = False
-        return
-    snippets = _load_contract_snippets()
-    if not snippets:
-        _INDEX = False
+    global _INDEX, _CONTRACT_STAMP, _MANIFEST_CHECKED_AT
+    if _INDEX is not None and not _sources_changed():
         return
-    texts = snippets
-    docs = [Document(page_content=t) for t in texts]
-    # Try latest embedding model first, fallback to legacy
-    emb_model = os.getenv("GEMINI_EMBEDDING_MODEL") or "text-embedding-004"
-    try:
-        embeddings = GoogleGenerativeAIEmbeddings(model=emb_model, api_key=os.getenv("GEMINI_API_KEY"))
-    except Exception:
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", api_key=os.getenv("GEMINI_API_KEY"))
-    _INDEX = FAISS.from_documents(docs, embeddings)
-    try:
-        os.makedirs(_VECTOR_DIR, exist_ok=True)
-    except Exception:
-        pass
+    with _INDEX_LOCK:
+        previous = _INDEX
+        # Another thread may have built or reloaded the index while we waited
+        if _index_current():
+            return
+        # Stamped before reading, so an edit made during the build triggers another one
+        stamp = _contract_stamp()
+        index = _open_index()
+        if not (previous and index and previous.version == index.version):
+            _EMBED_CACHE.clear()
+            _RESULT_CACHE.clear()
+        _INDEX, _CONTRACT_STAMP = index, stamp
+        _MANIFEST_CHECKED_AT = time.monotonic()
 
 
-def retrieve_relevant_clauses(query: str, k: int = 3) -> str:
-    _ensure_index()
+def retrieval_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters of the query-embedding and result caches."""
+    return {
+        "index_version": _INDEX.version if _INDEX else None,
+        "embeddings": _EMBED_CACHE.stats(),
+        "results": _RESULT_CACHE.stats(),
+    }
+
+
+def _validate_mode(mode: Optional[str]) -> str:
+    mode = (mode or _RETRIEVAL_MODE).lower()
+    if mode not in _RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    return mode
+
+
+def _naive_fallback(query: str) -> str:
+    # naive fallback: return default snippet if any keyword from query overlaps
+    base = _default_snippet()
+    # crude filter
+    q_words = set([w.lower() for w in query.split() if len(w) > 3])
+    if any(w in base.lower() for w in q_words):
+        return base
+    return base[:1000]
+
+
+def retrieve_relevant_clauses(query: str, k: int = 3, mode: Optional[str] = None) -> str:
+    """Top-k clauses for the query joined by blank lines.
+
+    mode is "dense", "sparse" (BM25) or "hybrid" (default: RETRIEVAL_MODE, else hybrid).
+    """
+    mode = _validate_mode(mode)
     if not query:
         # default fallback
-        try:
-            with open(_DEFAULT_SNIPPET, "r", encoding="utf-8") as f:
-                return f.read().strip()
-        except Exception:
-            return ""
-    if _INDEX is False or _INDEX is None:
-        # naive fallback: return default snippet if any keyword from query overlaps
-        base = ""
-        try:
-            with open(_DEFAULT_SNIPPET, "r", encoding="utf-8") as f:
-                base = f.read().strip()
-        except Exception:
-            return ""
-        # crude filter
-        q_words = set([w.lower() for w in query.split() if len(w) > 3])
-        if any(w in base.lower() for w in q_words):
-            return base
-        return base[:1000]
+        return _default_snippet()
+    if not _index_ready():
+        with span("retrieval.index_load"):
+            _ensure_index()
+    if not _INDEX:
+        return _naive_fallback(query)
 
     try:
-        results = _INDEX.similarity_search(query, k=k)
-        return "\n\n".join([d.page_content for d in results])
+        results = _INDEX.similarity_search(query, k=k, mode=mode)
+        return "\n\n".join([d["text"] for d in results])
     except Exception as e:
         logger.warning(f"Vector search failed: {e}")
-        try:
-            with open(_DEFAULT_SNIPPET, "r", encoding="utf-8") as f:
-                return f.read().strip()
-        except Exception:
-            return ""
+        return _default_snippet()
+
+
+async def aretrieve_relevant_clauses(query: str, k: int = 3, mode: Optional[str] = None) -> str:
+    """Async retrieve_relevant_clauses for use inside the event loop.
+
+    Index builds and reloads and the search itself run on a bounded executor
+    (RETRIEVAL_MAX_WORKERS); query embedding uses the provider's async API.
+    Cached results are returned without leaving the loop.
+    """
+    mode = _validate_mode(mode)
+    if not query:
+        return _default_snippet()
+    if not _index_ready():
+        with span("retrieval.index_load"):
+            await asyncio.get_running_loop().run_in_executor(_executor(), _ensure_index)
+    index = _INDEX
+    if not index:
+        return _naive_fallback(query)
+
+    try:
+        results = await index.asimilarity_search(query, k=k, mode=mode)
+        return "\n\n".join([d["text"] for d in results])
+    except Exception as e:
+        logger.warning(f"Vector search failed: {e}")
+        return _default_snippet()
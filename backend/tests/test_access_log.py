@@ -0,0 +1,107 @@
+import asyncio
+import json
+import logging
+import queue
+
+from backend.api.access_log import (
+    ACCESS_LOGGER,
+    AccessLogMiddleware,
+    JSONAccessFormatter,
+    _DroppingQueueHandler,
+    parse_sample_rates,
+)
+from backend.services.metrics import span
+
+
+class _Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _serve(middleware, path):
+    scope = {"type": "http", "method": "GET", "path": path, "client": ("10.0.0.1", 1234), "headers": []}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return sent
+
+
+def _capture():
+    handler = _Capture()
+    logging.getLogger(ACCESS_LOGGER).addHandler(handler)
+    logging.getLogger(ACCESS_LOGGER).setLevel(logging.INFO)
+    return handler
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("/health=0.01, /metrics=0,bad,/x=2,/y=nope") == {
+        "/health": 0.01, "/metrics": 0.0, "/x": 1.0,
+    }
+    assert parse_sample_rates("") == {}
+
+
+def test_record_carries_cache_outcomes_and_model():
+    async def app(scope, receive, send):
+        with span("analyze.cache_lookup") as tags:
+            tags["cache"] = "miss"
+        with span("llm.call", model="gemini-x", outcome="ok"):
+            pass
+        with span("draft.cache_lookup", cache="hit"):
+            pass
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    handler = _capture()
+    try:
+        _serve(AccessLogMiddleware(app, sample_rates={}), "/api/process")
+    finally:
+        logging.getLogger(ACCESS_LOGGER).removeHandler(handler)
+
+    (record,) = handler.records
+    fields = record.access
+    assert fields["method"] == "GET" and fields["path"] == "/api/process"
+    assert fields["status"] == 200 and fields["client"] == "10.0.0.1"
+    assert fields["cache"] == {"analyze": "miss", "draft": "hit"}
+    assert fields["model"] == "gemini-x"
+    assert fields["duration_ms"] >= 0
+    line = json.loads(JSONAccessFormatter().format(record))
+    assert line["path"] == "/api/process" and line["ts"].endswith("Z")
+
+
+def test_sampled_path_is_skipped_but_errors_are_always_logged():
+    async def ok(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def broken(scope, receive, send):
+        await send({"type": "http.response.start", "status": 503, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    handler = _capture()
+    try:
+        for _ in range(20):
+            _serve(AccessLogMiddleware(ok, sample_rates={"/health": 0.0}), "/health")
+        _serve(AccessLogMiddleware(broken, sample_rates={"/health": 0.0}), "/health")
+    finally:
+        logging.getLogger(ACCESS_LOGGER).removeHandler(handler)
+
+    assert [r.access["status"] for r in handler.records] == [503]
+    assert handler.records[0].access["sample_rate"] == 0.0
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = _DroppingQueueHandler(queue.Queue(maxsize=2))
+    for i in range(5):
+        handler.handle(logging.LogRecord(ACCESS_LOGGER, logging.INFO, __file__, 0, "access", None, None))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
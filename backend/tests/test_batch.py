@@ -0,0 +1,100 @@
+import json
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from backend.api.main import app
+from backend.agents import batch
+
+
+def _fake_pipeline(delays):
+    calls = []
+
+    async def run_pipeline(*, email_text, contract_snippet=None, mode="process"):
+        calls.append(email_text)
+        await asyncio.sleep(delays.get(email_text, 0.0))
+        return {
+            "analysis": {"intent": email_text},
+            "draft": f"Re: {email_text}",
+            "risk_score": 0,
+            "timings": {"analyze_email": 1.0, "draft_reply": 2.0},
+        }
+
+    return run_pipeline, calls
+
+
+def _collect(records, **kwargs):
+    async def main():
+        return [r async for r in batch.run_batch(records, **kwargs)]
+
+    return asyncio.run(main())
+
+
+def test_batch_dedupes_and_keeps_input_order(monkeypatch):
+    fake, calls = _fake_pipeline({"slow": 0.05})
+    monkeypatch.setattr(batch, "run_pipeline", fake)
+    records = [
+        {"id": 1, "email_text": "slow"},
+        json.dumps({"id": 2, "email_text": "fast"}),
+        {"id": 3, "email_text": "slow"},
+        "not json",
+        "",
+    ]
+    out = _collect(records, concurrency=4)
+    results, summary = out[:-1], out[-1]["summary"]
+
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert [r.get("id") for r in results] == [1, 2, 3, None]
+    assert sorted(calls) == ["fast", "slow"]
+    assert results[2]["duplicate"] and results[2]["draft"] == "Re: slow"
+    assert "error" in results[3]
+    assert summary["items"] == 4 and summary["unique"] == 2
+    assert summary["duplicates"] == 1 and summary["errors"] == 1
+    assert summary["stages_ms"]["draft_reply"]["p50"] == 2.0
+
+
+def test_batch_completion_order_and_bounded_concurrency(monkeypatch):
+    running = peak = 0
+
+    async def fake(*, email_text, contract_snippet=None, mode="process"):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05 if email_text == "e0" else 0.001)
+        running -= 1
+        return {"analysis": {}, "draft": email_text, "risk_score": 0, "timings": {}}
+
+    monkeypatch.setattr(batch, "run_pipeline", fake)
+    out = _collect([{"email_text": f"e{i}"} for i in range(20)], concurrency=3, order="completion")
+    results = out[:-1]
+    assert peak <= 3
+    assert len(results) == 20
+    assert results[-1]["index"] == 0  # the slow first email finishes last
+
+
+def test_batch_endpoint_streams_ndjson(monkeypatch):
+    fake, _ = _fake_pipeline({})
+    monkeypatch.setattr(batch, "run_pipeline", fake)
+    body = "\n".join(json.dumps({"id": i, "email_text": f"email {i % 2}"}) for i in range(4))
+    client = TestClient(app)
+    r = client.post("/api/batch/process?concurrency=2", content=body)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert [line["id"] for line in lines[:-1]] == [0, 1, 2, 3]
+    assert lines[-1]["summary"]["unique"] == 2
+
+    assert client.post("/api/batch/process?order=random", content=body).status_code == 422
+
+
+def test_batch_dedupe_memory_is_bounded_by_window(monkeypatch):
+    fake, calls = _fake_pipeline({})
+    monkeypatch.setattr(batch, "run_pipeline", fake)
+    records = [{"email_text": f"e{i}"} for i in range(200)] + [{"email_text": "e199"}, {"email_text": "e0"}]
+    out = _collect(records, concurrency=2, window=4)
+    results, summary = out[:-1], out[-1]["summary"]
+    assert len(results) == 202
+    # A recent repeat is shared; one from far back runs again
+    assert results[200]["duplicate"] and "duplicate" not in results[201]
+    assert calls.count("e0") == 2 and calls.count("e199") == 1
+    assert summary["unique"] == 201 and summary["duplicates"] == 1
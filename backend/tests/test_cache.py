@@ -0,0 +1,96 @@
+import sqlite3
+import time
+
+from fastapi.testclient import TestClient
+
+from backend.api.main import app
+from backend.services import cache
+
+
+def test_sqlite_store_write_behind_and_reload(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.db")
+    store = cache._SQLiteStore(path, flush_interval=60)
+    monkeypatch.setattr(cache, "_STORE", store)
+    monkeypatch.setattr(cache, "_MEM_CACHE", cache.LRUCache())
+
+    value = {"draft": "Hello", "risk_score": 20}
+    cache.cache_set("draft:test", value)
+    # Visible before the background flush ran
+    cache._MEM_CACHE.clear()
+    assert cache.cache_get("draft:test") == value
+
+    cache.cache_flush()
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] == 1
+    conn.close()
+    store.close()
+
+    # A fresh store (e.g. after a restart) reads the persisted entry
+    reopened = cache._SQLiteStore(path)
+    monkeypatch.setattr(cache, "_STORE", reopened)
+    assert cache.cache_get("draft:test") == value
+    assert cache.cache_get("draft:missing") is None
+    reopened.close()
+
+
+def test_lru_bounds_and_ttl():
+    lru = cache.LRUCache(max_entries=2, max_bytes=10_000)
+    lru.set("a", "x")
+    lru.set("b", "y")
+    assert lru.get("a") == "x"  # "a" becomes most recent
+    lru.set("c", "z")
+    assert lru.get("b") is None
+    assert lru.stats()["evictions"] == 1
+
+    big = cache.LRUCache(max_entries=100, max_bytes=400)
+    for i in range(10):
+        big.set(i, "v" * 100)
+    assert big.stats()["bytes"] <= 400
+    assert len(big) < 10
+
+    ttl = cache.LRUCache(default_ttl=60)
+    ttl.set("gone", 1, exp=time.time() - 1)
+    ttl.set("kept", 2)
+    assert ttl.sweep() == 1
+    assert ttl.get("kept") == 2
+
+
+def test_sweep_removes_expired_rows(tmp_path, monkeypatch):
+    store = cache._SQLiteStore(str(tmp_path / "cache.db"), flush_interval=60)
+    monkeypatch.setattr(cache, "_STORE", store)
+    monkeypatch.setattr(cache, "_MEM_CACHE", cache.LRUCache())
+    cache.cache_set("old", {"a": 1}, ttl_seconds=-1)
+    cache.cache_set("new", {"a": 2})
+    cache.cache_flush()
+    assert cache.cache_sweep() == 2  # one from each tier
+    assert cache.cache_get("new") == {"a": 2}
+    store.close()
+
+
+def test_cache_stats_endpoint():
+    r = TestClient(app).get("/api/cache/stats")
+    assert r.status_code == 200
+    body = r.json()
+    assert {"hits", "misses", "evictions"} <= set(body["memory"])
+    assert "enabled" in body["persistent"]
+
+
+def test_cache_keys_are_stable_across_processes():
+    import os
+    import subprocess
+    import sys
+
+    code = (
+        "from backend.services.cache import make_cache_key;"
+        "print(make_cache_key('draft', '1', 'Hello', {'b': 1, 'a': [1, 2]}, None, 'B'))"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    keys = set()
+    for seed in ("1", "2"):
+        env = dict(os.environ, PYTHONHASHSEED=seed, CACHE_SWEEP_INTERVAL="0")
+        out = subprocess.run([sys.executable, "-c", code], cwd=root, env=env, capture_output=True, text=True, check=True)
+        keys.add(out.stdout.strip())
+    assert len(keys) == 1
+    assert keys == {cache.make_cache_key("draft", "1", "Hello \r\n", {"a": [1, 2], "b": 1}, None, "B")}
+    assert cache.make_cache_key("draft", "1", "ab", "c") != cache.make_cache_key("draft", "1", "a", "bc")
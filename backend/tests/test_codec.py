@@ -0,0 +1,48 @@
+import pytest
+
+from backend.services import codec
+
+
+@pytest.mark.parametrize("serializer", ["msgpack", "json", "pickle"])
+@pytest.mark.parametrize("compression", ["none", "zlib", "zstd"])
+def test_codec_roundtrip(serializer, compression):
+    c = codec.Codec(serializer, compression, compress_threshold=64)
+    value = {"draft": "Thank you. " * 50, "risk_score": 20, "questions": ["a?", "b?"]}
+    blob = c.encode(value)
+    assert blob[0] == codec.FORMAT_VERSION
+    assert c.decode(blob) == value
+
+
+def test_codec_compresses_only_above_threshold():
+    c = codec.Codec("json", "zlib", compress_threshold=1024)
+    assert c.encode({"a": 1})[2] == codec.COMP_NONE
+    assert c.encode({"a": "x" * 4096})[2] == codec.COMP_ZLIB
+
+
+def test_codec_reads_legacy_repr_rows_and_rejects_unknown_versions():
+    c = codec.Codec("json", "none")
+    assert c.decode(repr({"draft": "Hi", "risk_score": 5})) == {"draft": "Hi", "risk_score": 5}
+    with pytest.raises(ValueError):
+        c.decode(bytes((99, codec.SER_JSON, codec.COMP_NONE)) + b"{}")
+
+
+def test_pickle_rows_are_refused_unless_pickle_is_configured(tmp_path, monkeypatch):
+    from backend.services import cache
+
+    class Boom:
+        def __reduce__(self):
+            return (pytest.fail, ("pickle payload executed",))
+
+    blob = bytes((codec.FORMAT_VERSION, codec.SER_PICKLE, codec.COMP_NONE)) + codec.pickle.dumps(Boom())
+    with pytest.raises(ValueError):
+        codec.Codec("json", "none").decode(blob)
+    assert codec.Codec("pickle", "none").decode(codec.Codec("pickle", "none").encode({"a": 1})) == {"a": 1}
+
+    # In the cache a planted pickle row is a miss, not code execution
+    class Store:
+        def get(self, key):
+            return blob, float("inf")
+
+    monkeypatch.setattr(cache, "_STORE", Store())
+    monkeypatch.setattr(cache, "_CODEC", codec.Codec("json", "none"))
+    assert cache.cache_get("planted-pickle-row") is None
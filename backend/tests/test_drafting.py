@@ -1,3 +1,10 @@
+import json
+import time
+import uuid
+import asyncio
+
+import pytest
+
 from fastapi.testclient import TestClient
 from backend.api.main import app
 
@@ -36,3 +43,77 @@ def test_process_pipeline():
     assert r.status_code == 200
     body = r.json()
     assert "analysis" in body and "draft" in body
+
+
+def test_compiled_graph_is_reused():
+    from backend.agents import graph
+
+    if not graph._HAS_LANGGRAPH:
+        return
+    with TestClient(app):  # runs the lifespan warm-up
+        assert {"process", "draft"} <= set(graph._COMPILED_GRAPHS)
+    assert graph.get_compiled_graph("draft") is graph.get_compiled_graph("draft")
+
+
+@pytest.mark.parametrize("use_langgraph", [True, False])
+def test_process_overlaps_retrieval_with_analysis(monkeypatch, use_langgraph):
+    from backend.agents import analyze_node, graph, prepare_nodes
+
+    if use_langgraph and not graph._HAS_LANGGRAPH:
+        pytest.skip("langgraph not installed")
+
+    class SlowLLM:
+        async def structured_json(self, **kwargs):
+            await asyncio.sleep(0.2)
+            return {"intent": "approval"}
+
+    async def slow_retrieval(query, k=3, mode=None):
+        await asyncio.sleep(0.2)
+        return "Clause 10.2 (retrieved)"
+
+    monkeypatch.setattr(analyze_node, "get_llm", lambda: SlowLLM())
+    monkeypatch.setattr(prepare_nodes, "aretrieve_relevant_clauses", slow_retrieval)
+    monkeypatch.setattr(graph, "_HAS_LANGGRAPH", use_langgraph)
+
+    start = time.perf_counter()
+    out = asyncio.run(graph.run_pipeline(email_text=f"Please approve this. {uuid.uuid4()}", contract_snippet="liability"))
+    elapsed = time.perf_counter() - start
+    assert out["analysis"]["intent"] == "approval_request" and out["draft"]
+    # max(analysis, retrieval) + draft, not their sum
+    assert elapsed < 0.35
+    assert {"analyze_email", "retrieve_clauses", "draft_reply"} <= set(out["timings"])
+    assert out["timings"]["retrieve_clauses"] >= 150
+
+
+def _parse_sse(text):
+    events = []
+    for block in text.split("\n\n"):
+        lines = [l for l in block.splitlines() if l and not l.startswith(":")]
+        if lines:
+            fields = dict(l.split(": ", 1) for l in lines)
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_draft_stream_sends_analysis_then_tokens():
+    payload = {
+        "email_text": f"Streaming test {uuid.uuid4()}: please confirm the liability cap under the MSA.",
+        "contract_snippet": "Limitation of Liability per 10.2",
+    }
+    with client.stream("POST", "/api/draft/stream", json=payload) as r:
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/event-stream")
+        events = _parse_sse(r.read().decode())
+
+    kinds = [k for k, _ in events]
+    assert kinds[0] == "analysis" and kinds[-1] == "done"
+    assert "intent" in events[0][1]
+    tokens = [d["text"] for k, d in events if k == "token"]
+    assert len(tokens) > 1  # the mock LLM streams in chunks
+    done = events[-1][1]
+    assert "".join(tokens) == done["draft"] and done["draft"].strip()
+
+    # A completed stream is cached like a regular draft: replayed as one token
+    with client.stream("POST", "/api/draft/stream", json={**payload, "analysis": events[0][1]}) as r:
+        replay = _parse_sse(r.read().decode())
+    assert [d["text"] for k, d in replay if k == "token"] == [done["draft"]]
@@ -0,0 +1,153 @@
+import asyncio
+import uuid
+
+import pytest
+
+from backend.agents import email_segments as es
+
+THREAD = """Hi Sam,
+
+Can we withhold payment under clause 9.2 until the defects are fixed?
+Please advise by Friday.
+
+Best regards,
+Priya Shah
+Legal, Helios Labs
+
+CONFIDENTIALITY NOTICE: This email and any attachments are confidential.
+
+On Mon, 3 Jun 2024 at 10:02, Alex Reed <alex@acme.com> wrote:
+> Could you confirm the termination notice period?
+>
+> Thanks,
+> Alex Reed
+> Procurement, Acme Corp
+"""
+
+
+def test_split_separates_message_signature_disclaimer_and_history():
+    seg = es.split_email(THREAD)
+    assert seg.body.endswith("Please advise by Friday.")
+    assert seg.signature == "Best regards,\nPriya Shah\nLegal, Helios Labs"
+    assert seg.disclaimer.startswith("CONFIDENTIALITY NOTICE")
+    assert seg.quoted.startswith("On Mon, 3 Jun 2024") and "Acme Corp" in seg.quoted
+    assert seg.message == seg.body + "\n\n" + seg.signature
+
+
+@pytest.mark.parametrize("history", [
+    "-----Original Message-----\nFrom: Alex\nSent: Monday\nOld text",
+    "From: Alex Reed <alex@acme.com>\nSent: Monday, June 3, 2024\nTo: Priya\nOld text",
+    "________________________________\nFrom: Alex\nOld text",
+    "> Old text\n> more old text",
+])
+def test_quote_markers(history):
+    seg = es.split_email(f"Please confirm the cap?\n\nThanks,\nPriya\n\n{history}\n")
+    assert seg.message == "Please confirm the cap?\n\nThanks,\nPriya"
+    assert "Old text" in seg.quoted
+
+
+def test_plain_email_is_untouched():
+    email = "Please approve the MSA amendment.\n> inline quote\nMy answer below the quote.\n"
+    seg = es.split_email(email)
+    assert seg.message is email
+    assert seg.quoted == seg.disclaimer == seg.signature == ""
+    # A bare forward has nothing above its header: keep it all
+    forward = "-----Original Message-----\nFrom: Alex\nSent: Monday\nPlease approve."
+    assert es.split_email(forward).message is forward
+    assert es.llm_email_text(email, token_budget=1000) is email
+    assert es.llm_email_text(THREAD, token_budget=0) is THREAD
+
+
+@pytest.mark.parametrize("policy", es.TRUNCATION_POLICIES)
+def test_budget_truncates_body_and_keeps_signature(policy):
+    body = " ".join(f"word{i}" for i in range(500))
+    email = f"{body}\n\nRegards,\nPriya Shah\nLegal, Helios Labs\n\nOn Monday, Alex wrote:\n> old"
+    out = es.llm_email_text(email, token_budget=100, policy=policy, quoted_tokens=50)
+    assert es.estimate_tokens(out) <= 110
+    assert "characters omitted" in out
+    assert out.endswith("Legal, Helios Labs")  # no room left for history
+    if policy != "tail":
+        assert out.startswith("word0 ")
+    if policy != "head":
+        assert "word499" in out
+
+
+def test_quoted_history_fills_remaining_budget():
+    out = es.llm_email_text(THREAD, token_budget=1000, quoted_tokens=1000)
+    assert "CONFIDENTIALITY" not in out
+    assert out.endswith("> Procurement, Acme Corp")
+    assert "Acme" not in es.llm_email_text(THREAD, token_budget=1000, quoted_tokens=0)
+    with pytest.raises(ValueError):
+        es.llm_email_text(THREAD, policy="middle")
+
+
+def test_analysis_reads_newest_message_and_sends_trimmed_text(monkeypatch):
+    from backend.agents import analyze_node
+
+    seen = []
+
+    class FakeLLM:
+        async def structured_json(self, *, prompt, email_text):
+            seen.append(email_text)
+            return {"intent": "payment"}
+
+    monkeypatch.setattr(analyze_node, "get_llm", lambda: FakeLLM())
+    monkeypatch.setattr(analyze_node, "llm_email_text", lambda text: es.llm_email_text(text, quoted_tokens=0))
+    email = THREAD.replace("Hi Sam,", f"Hi Sam ({uuid.uuid4()}),")
+    out = asyncio.run(analyze_node.analyze_email_node({"email_text": email}))
+    analysis = out["analysis"]
+    assert seen == [es.split_email(email).message]
+    # The quoted signature (Acme Corp) and quoted question do not leak into the analysis
+    assert analysis["parties"]["client"] == "Helios Labs"
+    assert not any("termination" in q.lower() for q in analysis["questions"])
+    assert analysis["requested_due_date"] == "end of week"
+
+
+def test_confidential_in_body_text_is_not_a_disclaimer():
+    email = (
+        "Hi team,\n\nThis message is confidential and privileged: we intend to terminate the SOW "
+        "under Clause 9.1 for non-performance. Could you confirm the notice period?\n\nThanks,\nPriya"
+    )
+    seg = es.split_email(email)
+    assert seg.message is email and seg.disclaimer == ""
+    assert "Clause 9.1" in es.llm_email_text(email, token_budget=1000)
+    # Without a sign-off, an unsigned question paragraph stays too
+    unsigned = email.rsplit("\n\n", 1)[0]
+    assert es.split_email(unsigned).message is unsigned
+    # The same sentence below the signature is boilerplate
+    signed = "Please approve the SOW.\n\nRegards,\nPriya\n\nThis email is confidential and may be privileged."
+    assert es.split_email(signed).disclaimer.startswith("This email is confidential")
+    # A notice heading in the last paragraph is dropped even without a sign-off
+    noticed = "Please approve the SOW.\n\nCONFIDENTIALITY NOTICE: intended for the addressee only."
+    assert es.split_email(noticed).message == "Please approve the SOW."
+
+
+def test_body_lines_starting_with_from_are_not_reply_headers():
+    email = (
+        "Please review the revised liability cap.\n\n"
+        "From: the supplier perspective, the cap is too low.\n"
+        "To: be clear, we need this by Friday. Could you confirm?"
+    )
+    seg = es.split_email(email)
+    assert seg.message is email and seg.quoted == ""
+    outlook = "Please review.\n\nFrom: Alex Reed\nSent: Monday, June 3, 2024 10:02 AM\nTo: Priya\nOld text"
+    assert es.split_email(outlook).quoted.startswith("From: Alex Reed")
+
+
+def test_mid_body_sign_off_does_not_swallow_the_request():
+    filler = " ".join(f"background{i}" for i in range(300))
+    email = (
+        f"{filler}\n\nThanks,\nCan we terminate the SOW under clause 9.1 this month?\n\n"
+        "Best regards,\nPriya Shah\nLegal, Helios Labs"
+    )
+    seg = es.split_email(email)
+    assert seg.signature == "Best regards,\nPriya Shah\nLegal, Helios Labs"
+    assert seg.body.endswith("this month?")
+    # Over budget: the body is clipped, and the question near its end survives head_tail
+    out = es.llm_email_text(email, token_budget=150, policy="head_tail", quoted_tokens=0)
+    assert "characters omitted" in out
+    assert "Can we terminate the SOW under clause 9.1 this month?" in out
+    assert es.estimate_tokens(out) <= 160
+    # A "Thanks," whose tail asks a question is never a signature
+    short = "Please see the draft.\n\nThanks,\nCould you confirm by Friday?"
+    assert es.split_email(short).signature == ""
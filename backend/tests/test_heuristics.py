@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from backend.agents import heuristics as h
+
+
+@pytest.mark.parametrize("use_automaton", [True, False])
+def test_keyword_matcher_matches_substring_semantics(use_automaton):
+    matcher = h.KeywordMatcher(h._MATCHER.keywords, use_automaton=use_automaton)
+    keywords = sorted(matcher.keywords)
+    rng = random.Random(7)
+    noise = "abcdefilmnoprstuvwy -"
+    for _ in range(500):
+        text = "".join(
+            rng.choice(keywords) if rng.random() < 0.3 else "".join(rng.choice(noise) for _ in range(rng.randint(0, 4)))
+            for _ in range(8)
+        )
+        assert matcher.find(text) == {k for k in keywords if k in text}
+    # Overlapping and nested keywords are all reported
+    assert {"not urgent", "urgent", "counteroffer", "counter"} <= matcher.find("not urgent: counteroffer")
+    assert h.KeywordMatcher([]).find("anything") == frozenset()
+
+
+def test_heuristics_share_one_scan():
+    email = "URGENT: please approve the MSA amendment and clarify the liability cap by Friday."
+    h.scan_text.cache_clear()
+    assert h.extract_urgency(email, "low") == "high"
+    assert h.refine_intent(email, "") == "requesting approval and clarification"
+    assert h.refine_topic(email, "") == "MSA amendments"
+    assert h.extract_due_date(email, "") == "end of week"
+    info = h.scan_text.cache_info()
+    assert info.misses == 1 and info.hits == 3
+
+
+def test_due_date_and_intent_keep_previous_results():
+    assert h.extract_due_date("Please reply within 10 days.", "") == "within 10 days"
+    assert h.extract_due_date("No deadline here.", "") == ""
+    assert h.extract_due_date("anything", "tomorrow") == "tomorrow"
+    assert h.refine_intent("Pending items attached.", "") == "termination_notice"  # "ending" is a substring match
+    assert h.extract_urgency("No rush on this.", "") == "low"
+    assert h.refine_topic("Notes on the msa.", "") == "MSA"
+
+
+def test_extract_questions_dedups_in_one_pass():
+    email = (
+        "Can you confirm the delivery date? Thanks. Please advise whether we can withhold the payment. "
+        "Additionally, can we withhold the payment? Additionally, withhold the payment? "
+        "Could you send the signed copy. "
+        "Can you confirm the delivery date? The liability cap looks high."
+    )
+    qs = h.extract_questions(email, ["can you confirm the delivery date?"])
+    assert qs == [
+        "can you confirm the delivery date?",
+        "Please advise whether we can withhold the payment?",
+        "Additionally, can we withhold the payment?",
+        "Could you send the signed copy?",
+        "Can we clarify the liability limits?",
+    ]
+
+
+def test_question_core_strips_lead_ins_in_order():
+    assert h._core_question("Additionally, please advise whether we can pay??") == "we can pay"
+    assert h._core_question("Can we please extend?") == "extend"
+    assert h._core_question("Please could you pay?") == "could you pay"
+
+
+def test_fallback_hits_are_looked_up_on_demand(monkeypatch):
+    email = "URGENT: please approve the MSA amendment and clarify the liability cap by Friday."
+    automaton = h._MATCHER
+    lazy = h.KeywordMatcher(automaton.keywords, use_automaton=False).hits(email.lower())
+    assert isinstance(lazy, h.LazyHits)
+    assert "urgent" in lazy and "whenever" not in lazy
+    assert not lazy.isdisjoint(["nothing", "approve"]) and lazy.isdisjoint(["whenever"])
+    # A group stops at its first hit, as the per-heuristic checks did
+    assert not lazy.isdisjoint(["msa", "never-asked"]) and "never-asked" not in lazy._seen
+
+    expected = (
+        h.extract_urgency(email, ""), h.refine_intent(email, ""),
+        h.refine_topic(email, ""), h.extract_due_date(email, ""),
+    )
+    monkeypatch.setattr(h, "_MATCHER", h.KeywordMatcher(automaton.keywords, use_automaton=False))
+    h.scan_text.cache_clear()
+    try:
+        assert (
+            h.extract_urgency(email, ""), h.refine_intent(email, ""),
+            h.refine_topic(email, ""), h.extract_due_date(email, ""),
+        ) == expected
+    finally:
+        h.scan_text.cache_clear()
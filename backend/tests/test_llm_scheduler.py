@@ -0,0 +1,234 @@
+import asyncio
+import time
+
+from backend.services import llm
+from backend.services.llm_scheduler import DeadlineExceeded, LLMScheduler, is_rate_limit, is_transient, retry_after
+
+
+def test_retry_after_parsing():
+    assert retry_after(Exception("429 Quota exceeded. Please retry in 13.5s.")) == 13.5
+    assert retry_after(Exception("ResourceExhausted: retry_delay { seconds: 7 }")) == 7.0
+    assert retry_after(Exception("404 model not found")) is None
+
+
+def test_status_codes_match_whole_numbers_only():
+    assert is_transient(Exception("503 Service Unavailable"))
+    assert is_transient(Exception("HTTP 502: bad gateway"))
+    assert is_rate_limit(Exception("429 Too Many Requests"))
+    # Digits inside token counts or ids are not status codes
+    bad_request = Exception("400 INVALID_ARGUMENT: max 5000 tokens, got 1500 (request 4290504)")
+    assert not is_transient(bad_request) and not is_rate_limit(bad_request)
+
+    class APIError(Exception):
+        def __init__(self, code, message):
+            super().__init__(message)
+            self.code = code
+
+    # The SDK's status code wins over the text
+    assert is_transient(APIError(503, "model overloaded"))
+    assert not is_transient(APIError(400, "502 is not a valid candidate count"))
+    assert is_rate_limit(APIError(429, "slow down"))
+
+
+def test_concurrency_cap_and_rate_bucket():
+    sched = LLMScheduler(max_concurrency=2, rpm=600, burst=2, queue_timeout=5)
+    running = peak = 0
+
+    async def call():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return "ok"
+
+    async def main():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(sched.run("m", call) for _ in range(6)))
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(main())
+    assert results == ["ok"] * 6
+    assert peak <= 2
+    # Burst of 2, then 10 req/s: the 6th call cannot start before ~0.4s
+    assert elapsed >= 0.35
+    assert sched.stats()["m"]["calls"] == 6
+
+
+def test_rate_limit_backs_off_on_same_model_and_honors_retry_after():
+    sched = LLMScheduler(max_concurrency=4, rpm=0, burst=1, max_retries=3, queue_timeout=5)
+    attempts = []
+
+    async def flaky():
+        attempts.append(time.perf_counter())
+        if len(attempts) == 1:
+            raise RuntimeError("429 Resource exhausted. Please retry in 0.2s")
+        return "ok"
+
+    assert asyncio.run(sched.run("m", flaky)) == "ok"
+    assert attempts[1] - attempts[0] >= 0.2
+    stats = sched.stats()["m"]
+    assert stats["throttled"] == 1 and stats["retries"] == 1
+
+
+def test_deadline_fails_fast_when_queue_cannot_drain():
+    sched = LLMScheduler(max_concurrency=1, rpm=6, burst=1, queue_timeout=0.2)
+
+    async def call():
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*(sched.run("m", call) for _ in range(3)), return_exceptions=True)
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    assert time.perf_counter() - start < 1.0
+    assert results[0] == "ok"
+    assert all(isinstance(r, DeadlineExceeded) for r in results[1:])
+    assert sched.stats()["m"]["deadline_exceeded"] == 2
+
+
+def test_gemini_call_chat_retries_throttled_model_before_rotating(monkeypatch):
+    calls = []
+
+    class FakeModel:
+        def __init__(self, name):
+            self.name = name
+
+        def generate_content(self, messages):
+            calls.append(self.name)
+            if len(calls) == 1:
+                raise RuntimeError("429 Please retry in 0.05s")
+            return type("Resp", (), {"text": "{}"})()
+
+    monkeypatch.setattr(llm, "get_scheduler", lambda: LLMScheduler(rpm=0, queue_timeout=5))
+    monkeypatch.setattr(llm._GeminiLLM, "_build_model", lambda self, name: FakeModel(name))
+    monkeypatch.setattr(llm, "_read_model_cache", lambda: (["gemini-a", "gemini-b"], 0.0))
+    client = llm._GeminiLLM()
+    assert asyncio.run(client.structured_json(prompt="p", email_text="e")) == {}
+    assert calls == ["gemini-a", "gemini-a"]
+    assert client.router.preview() == "gemini-a"
+
+
+
+def test_sdk_calls_use_dedicated_pool_and_cached_models(monkeypatch):
+    import threading
+    from backend.services.executor import InstrumentedExecutor
+
+    built, threads = [], []
+
+    class FakeModel:
+        def generate_content(self, messages):
+            threads.append(threading.current_thread().name)
+            return type("Resp", (), {"text": "{}"})()
+
+    def build(self, name):
+        built.append(name)
+        return FakeModel()
+
+    pool = InstrumentedExecutor(max_workers=2, thread_name_prefix="llm")
+    monkeypatch.setattr(llm, "_LLM_EXECUTOR", pool)
+    monkeypatch.setattr(llm, "get_scheduler", lambda: LLMScheduler(rpm=0, queue_timeout=5))
+    monkeypatch.setattr(llm._GeminiLLM, "_build_model", build)
+    monkeypatch.setattr(llm, "_read_model_cache", lambda: (["gemini-a"], 0.0))
+    client = llm._GeminiLLM()
+
+    async def main():
+        await asyncio.gather(*(client.structured_json(prompt="p", email_text=str(i)) for i in range(5)))
+
+    asyncio.run(main())
+    assert built == ["gemini-a"]
+    assert all(name.startswith("llm") for name in threads)
+    stats = llm.llm_executor_stats()
+    assert stats["completed"] == 5 and stats["active"] == 0 and stats["queued"] == 0
+    assert stats["peak_active"] <= 2
+    pool.shutdown()
+
+
+def test_instrumented_executor_reports_queue_depth():
+    import threading
+    from backend.services.executor import InstrumentedExecutor
+
+    pool = InstrumentedExecutor(max_workers=1)
+    release = threading.Event()
+    futures = [pool.submit(release.wait) for _ in range(3)]
+    time.sleep(0.05)
+    stats = pool.stats()
+    assert stats["active"] == 1 and stats["queued"] == 2
+    release.set()
+    for f in futures:
+        f.result()
+    stats = pool.stats()
+    assert stats["completed"] == 3 and stats["peak_queued"] >= 2 and stats["max_queue_wait_ms"] > 0
+    pool.shutdown()
+
+
+def test_cancelled_queued_task_leaves_the_queue():
+    import threading
+    from backend.services.executor import InstrumentedExecutor
+
+    pool = InstrumentedExecutor(max_workers=1)
+    release = threading.Event()
+    running = pool.submit(release.wait)
+    waiting = [pool.submit(release.wait) for _ in range(2)]
+    try:
+        time.sleep(0.05)
+        assert pool.stats()["queued"] == 2
+        assert waiting[0].cancel() and not running.cancel()
+        assert pool.stats()["queued"] == 1
+    finally:
+        release.set()
+    running.result()
+    waiting[1].result()
+    stats = pool.stats()
+    assert stats["queued"] == 0 and stats["active"] == 0 and stats["completed"] == 2
+    pool.shutdown()
+
+
+def test_released_slot_goes_to_head_waiter_not_a_new_arrival():
+    from backend.services.llm_scheduler import _ModelLimiter
+
+    async def main():
+        lim = _ModelLimiter("m", max_concurrency=1, rpm=0, burst=1)
+        deadline = time.monotonic() + 5
+        await lim._acquire_slot(deadline)
+        order = []
+
+        async def call(name):
+            await lim._acquire_slot(deadline)
+            order.append(name)
+            await asyncio.sleep(0.01)
+            lim._release_slot()
+
+        waiter = asyncio.ensure_future(call("waiter"))
+        await asyncio.sleep(0)
+        lim._release_slot()
+        # Arrives after the release but before the waiter has run
+        arrival = asyncio.ensure_future(call("arrival"))
+        await asyncio.gather(waiter, arrival)
+        return order, lim.in_flight
+
+    order, in_flight = asyncio.run(main())
+    assert order == ["waiter", "arrival"]
+    assert in_flight == 0
+
+
+def test_slot_timeout_refunds_the_rate_token():
+    sched = LLMScheduler(max_concurrency=1, rpm=60, burst=5, queue_timeout=0.1)
+
+    async def hold():
+        await asyncio.sleep(0.3)
+        return "ok"
+
+    async def main():
+        first = asyncio.ensure_future(sched.run("m", hold, deadline=sched.deadline(5)))
+        await asyncio.sleep(0.01)
+        late = await asyncio.gather(*(sched.run("m", hold) for _ in range(2)), return_exceptions=True)
+        tokens = sched.limiter("m").bucket.tokens
+        await first
+        return late, tokens
+
+    late, tokens = asyncio.run(main())
+    assert all(isinstance(r, DeadlineExceeded) for r in late)
+    # Only the call that ran spent a token; the two that timed out waiting for a slot got theirs back
+    assert tokens >= 3.9
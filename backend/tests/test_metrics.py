@@ -0,0 +1,58 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.api.main import app
+from backend.services.metrics import Histogram, collect_spans, span
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram("test_seconds", "test", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        h.observe(value, {"stage": 'a"b'})
+    lines = h.render()
+    assert 'test_seconds_bucket{stage="a\\"b",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="a\\"b",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{stage="a\\"b",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="a\\"b"} 3' in lines
+    assert 'test_seconds_sum{stage="a\\"b"} 5.55' in lines
+
+
+def test_span_labels_outcome_and_trace_collection():
+    with collect_spans() as spans:
+        with span("unit.ok", model="m") as tags:
+            tags["cache"] = "hit"
+        with pytest.raises(ValueError):
+            with span("unit.fail"):
+                raise ValueError("boom")
+    assert [(s["span"], s.get("cache"), s.get("outcome")) for s in spans] == [
+        ("unit.ok", "hit", None),
+        ("unit.fail", None, "error"),
+    ]
+    # Outside a collecting context spans only feed the histogram
+    with span("unit.untraced"):
+        pass
+    assert len(spans) == 2
+
+
+def test_metrics_endpoint_and_debug_trace():
+    email = f"Please approve the MSA amendment. {uuid.uuid4()}"
+    r = client.post("/api/process", json={"email_text": email, "contract_snippet": "liability", "debug": True})
+    assert r.status_code == 200
+    spans = {s["span"]: s for s in r.json()["trace"] if "span" in s}
+    assert spans["analyze.cache_lookup"]["cache"] == "miss"
+    assert {"analyze.llm", "analyze.normalize", "draft.cache_lookup", "draft.llm"} <= set(spans)
+
+    r = client.post("/api/process", json={"email_text": email, "contract_snippet": "liability"})
+    # Response shape is unchanged without debug: every field present, trace null
+    assert r.json()["trace"] is None
+
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    assert "# TYPE legal_assistant_stage_duration_seconds histogram" in body
+    assert 'legal_assistant_stage_duration_seconds_count{cache="hit",stage="analyze.cache_lookup"}' in body
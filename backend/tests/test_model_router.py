@@ -0,0 +1,172 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from backend.api.main import app
+from backend.services import llm
+from backend.services.llm_scheduler import LLMScheduler
+from backend.services.model_router import CLOSED, HALF_OPEN, OPEN, ModelRouter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_breaker_opens_probes_and_swings_back_to_preferred():
+    clock = FakeClock()
+    router = ModelRouter(["a", "b"], clock=clock)
+    assert router.choose() == "a"
+    for _ in range(3):
+        router.record_failure("a", RuntimeError("503 unavailable"))
+    state = {m["name"]: m for m in router.stats()}
+    assert state["a"]["state"] == OPEN
+    assert router.choose() == "b"
+    router.record_success("b", 0.5)
+
+    # After the cooldown one probe goes to "a"; concurrent calls keep using "b"
+    clock.now += 31
+    assert router.choose() == "a"
+    assert {m["name"]: m for m in router.stats()}["a"]["state"] == HALF_OPEN
+    assert router.choose() == "b"
+    router.record_success("a", 0.4)
+    assert {m["name"]: m for m in router.stats()}["a"]["state"] == CLOSED
+    assert router.choose() == "a"
+
+
+def test_fatal_error_opens_immediately_and_failed_probe_backs_off():
+    clock = FakeClock()
+    router = ModelRouter(["a", "b"], clock=clock)
+    router.choose()
+    router.record_failure("a", RuntimeError("404 model not found"))
+    assert router.choose() == "b"
+    clock.now += 301
+    assert router.choose() == "a"
+    router.record_failure("a", RuntimeError("404 model not found"))
+    a = {m["name"]: m for m in router.stats()}["a"]
+    assert a["state"] == OPEN and a["retry_in_s"] == 60.0
+
+
+def test_latency_weighted_choice_and_all_open_fallback():
+    clock = FakeClock()
+    router = ModelRouter(["a", "b"], clock=clock)
+    router.record_success("a", 5.0)
+    router.record_success("b", 0.5)
+    assert router.choose() == "b"
+    assert router.choose(exclude=["b"]) == "a"
+    assert router.choose(exclude=["a", "b"]) is None
+
+    for name in ("a", "b"):
+        for _ in range(3):
+            router.record_failure(name, RuntimeError("500 internal error"))
+    # Every breaker open: still route somewhere instead of failing outright
+    assert router.choose() in {"a", "b"}
+
+
+def test_all_open_fallback_respects_single_half_open_probe():
+    clock = FakeClock()
+    router = ModelRouter(["a", "b"], clock=clock)
+    for name in ("a", "b"):
+        for _ in range(3):
+            router.record_failure(name, RuntimeError("500 internal error"))
+        clock.now += 1
+    # The fallback call is the early probe of the model due soonest ("a" opened first)
+    assert router.choose() == "a"
+    assert {m["name"]: m for m in router.stats()}["a"]["state"] == HALF_OPEN
+    # Concurrent calls never reach a half-open model whose probe is in flight
+    assert router.choose() == "b"
+    assert router.choose() is None
+    router.record_success("a", 0.3)
+    assert router.choose() == "a"
+
+
+def test_gemini_fails_over_per_call_without_global_rotation(monkeypatch):
+    class FakeModel:
+        def __init__(self, name):
+            self.name = name
+
+        def generate_content(self, messages):
+            if self.name == "gemini-a":
+                raise RuntimeError("404 model not found")
+            return type("Resp", (), {"text": '{"intent": "' + self.name + '"}'})()
+
+    monkeypatch.setattr(llm, "get_scheduler", lambda: LLMScheduler(rpm=0, queue_timeout=5))
+    monkeypatch.setattr(llm._GeminiLLM, "_build_model", lambda self, name: FakeModel(name))
+    monkeypatch.setattr(llm, "_read_model_cache", lambda: (["gemini-a", "gemini-b"], 0.0))
+    client = llm._GeminiLLM()
+    assert asyncio.run(client.structured_json(prompt="p", email_text="e")) == {"intent": "gemini-b"}
+    states = {m["name"]: m["state"] for m in client.router.stats()}
+    assert states == {"gemini-a": OPEN, "gemini-b": CLOSED}
+    assert client.router.preview() == "gemini-b"
+
+
+def test_models_endpoint_shape():
+    r = TestClient(app).get("/api/models")
+    assert r.status_code == 200
+    assert {"candidates", "current", "models", "scheduler"} <= set(r.json())
+
+
+def test_model_discovery_is_background_cached_and_coalesced(tmp_path, monkeypatch):
+    import time
+
+    calls = []
+
+    def discover():
+        calls.append(1)
+        time.sleep(0.05)
+        return ["gemini-x", "gemini-y"]
+
+    monkeypatch.setattr(llm, "_MODEL_CACHE_PATH", str(tmp_path / "models.json"))
+    monkeypatch.setattr(llm, "_discover_models", discover)
+    client = llm._GeminiLLM()
+    # Construction never blocks on discovery: the defaults are usable right away
+    assert calls == []
+    assert client.discovery_status()["source"] == "defaults"
+    assert client.router.candidates == [m for m in llm.DEFAULT_CHAT_MODEL_CANDIDATES if m]
+
+    async def refresh_twice():
+        return await asyncio.gather(client.refresh_models(), client.refresh_models())
+
+    first, second = asyncio.run(refresh_twice())
+    assert first == second == ["gemini-x", "gemini-y"]
+    assert len(calls) == 1
+
+    # A new worker starts from the fresh on-disk cache and skips discovery
+    other = llm._GeminiLLM()
+    assert other.discovery_status()["source"] == "cache"
+    assert asyncio.run(other.refresh_models()) == ["gemini-x", "gemini-y"]
+    assert len(calls) == 1
+    asyncio.run(other.refresh_models(force=True))
+    assert len(calls) == 2
+
+
+def test_refresh_endpoint_requires_gemini():
+    assert TestClient(app).post("/api/models/refresh").status_code == 409
+
+
+def test_refresh_failure_reaches_the_route_and_reports_staleness(tmp_path, monkeypatch):
+    from backend.api import routes
+
+    def discover():
+        raise RuntimeError("503 unavailable")
+
+    monkeypatch.setattr(llm, "_MODEL_CACHE_PATH", str(tmp_path / "models.json"))
+    monkeypatch.setattr(llm, "_discover_models", discover)
+    client = llm._GeminiLLM()
+    monkeypatch.setattr(routes, "get_llm", lambda: client)
+
+    r = TestClient(app).post("/api/models/refresh")
+    assert r.status_code == 502 and "503 unavailable" in r.json()["detail"]
+    status = client.discovery_status()
+    assert status["stale"] and status["source"] == "defaults"
+    assert status["last_error"] == "503 unavailable"
+    # The previous candidates stay in use
+    assert client.router.candidates == [m for m in llm.DEFAULT_CHAT_MODEL_CANDIDATES if m]
+
+    monkeypatch.setattr(llm, "_discover_models", lambda: ["gemini-x"])
+    r = TestClient(app).post("/api/models/refresh")
+    assert r.status_code == 200 and r.json()["candidates"] == ["gemini-x"]
+    assert r.json()["discovery"]["stale"] is False and r.json()["discovery"]["last_error"] is None
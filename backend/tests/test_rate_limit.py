@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+from backend.api.rate_limit import GCRALimiter, MemoryStore, RateLimitMiddleware, SQLiteStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_gcra_allows_burst_then_steady_rate():
+    clock = FakeClock()
+    limiter = GCRALimiter(60, burst=3, clock=clock)
+    decisions = [limiter.check("a") for _ in range(4)]
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert [d.remaining for d in decisions[:3]] == [2, 1, 0]
+    assert 0.9 < decisions[3].retry_after <= 1.0
+    # Other clients are unaffected; one interval later "a" gets one more request
+    assert limiter.check("b").allowed
+    clock.now += 1.0
+    assert limiter.check("a").allowed and not limiter.check("a").allowed
+
+
+def test_memory_store_is_bounded_and_drops_idle_clients():
+    clock = FakeClock()
+    store = MemoryStore(max_clients=100)
+    limiter = GCRALimiter(60, burst=5, store=store, clock=clock)
+    for i in range(1000):
+        limiter.check(f"10.0.{i // 256}.{i % 256}")
+    assert store.stats()["clients"] == 100 and store.evicted == 900
+    # Once every client is back to a full burst, new traffic sweeps them out
+    clock.now += 10
+    for i in range(20):
+        limiter.check(f"192.168.0.{i}")
+    assert store.stats()["clients"] == 20 and store.evicted == 900
+
+
+def test_sqlite_store_enforces_one_limit_across_workers(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "rl.db")
+    # Two limiters on one database stand in for two worker processes
+    workers = [GCRALimiter(60, burst=4, store=SQLiteStore(path), clock=clock) for _ in range(2)]
+    allowed = [workers[i % 2].check("1.2.3.4").allowed for i in range(8)]
+    assert allowed.count(True) == 4
+    clock.now += 120
+    assert workers[0].check("1.2.3.4").allowed
+    store = workers[1].store
+    store._pruned_at = 0.0
+    clock.now += 120
+    workers[1].check("5.6.7.8")
+    assert store.stats()["clients"] == 1
+
+
+def test_middleware_sets_headers_and_returns_429():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = RateLimitMiddleware(app, requests_per_minute=60, burst=1, store=MemoryStore(), clock=FakeClock())
+
+    async def call():
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            messages.append(message)
+
+        await middleware({"type": "http", "method": "GET", "path": "/", "headers": [], "client": ("9.9.9.9", 1)}, receive, send)
+        return messages[0]
+
+    first, second = asyncio.run(call()), asyncio.run(call())
+    assert first["status"] == 200
+    assert (b"x-ratelimit-remaining", b"0") in first["headers"]
+    assert second["status"] == 429
+    headers = dict(second["headers"])
+    assert headers[b"retry-after"] == b"1" and headers[b"x-ratelimit-limit"] == b"60"
+
+
+def test_sqlite_checks_run_off_the_event_loop(tmp_path):
+    import threading
+
+    store = SQLiteStore(str(tmp_path / "rl.db"))
+    threads = []
+    update = store.update
+
+    def recording_update(*args):
+        threads.append(threading.current_thread().name)
+        return update(*args)
+
+    store.update = recording_update
+    limiter = GCRALimiter(60, burst=2, store=store, clock=FakeClock())
+
+    async def main():
+        return [await limiter.acheck("1.2.3.4") for _ in range(3)]
+
+    decisions = asyncio.run(main())
+    assert [d.allowed for d in decisions] == [True, True, False]
+    assert threads and all(name.startswith("ratelimit") for name in threads)
+    assert store.stats()["executor"]["completed"] == 3
+
+
+def test_sqlite_store_fails_open_when_database_is_locked(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "rl.db")
+    store = SQLiteStore(path, timeout=0.05)
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN EXCLUSIVE")
+    try:
+        start = time.perf_counter()
+        assert store.update("k", 1000.0, 1.0, 2.0)[0]
+        assert time.perf_counter() - start < 0.5
+        assert store.errors == 1
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
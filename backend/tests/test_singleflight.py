@@ -0,0 +1,50 @@
+import asyncio
+import uuid
+
+from backend.agents import analyze_node
+from backend.services.singleflight import SingleFlight
+
+
+class _SlowLLM:
+    def __init__(self):
+        self.calls = 0
+
+    async def structured_json(self, *, prompt, email_text):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return {"intent": "information_request", "questions": [], "urgency_level": "low"}
+
+
+def test_concurrent_identical_analyses_share_one_llm_call(monkeypatch):
+    llm = _SlowLLM()
+    monkeypatch.setattr(analyze_node, "get_llm", lambda: llm)
+    text = f"Could you share the timeline? ref {uuid.uuid4()}"
+    before = analyze_node._FLIGHT.followers
+
+    async def run():
+        return await asyncio.gather(*[analyze_node.analyze_email_node({"email_text": text}) for _ in range(5)])
+
+    results = asyncio.run(run())
+    assert llm.calls == 1
+    assert all(r == results[0] for r in results)
+    assert analyze_node._FLIGHT.followers - before == 4
+
+
+def test_singleflight_propagates_errors_and_forgets_key():
+    flight = SingleFlight("test")
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("llm down")
+
+    async def run():
+        return await asyncio.gather(flight.do("k", boom), flight.do("k", boom), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.stats() == {"calls": 1, "coalesced": 1, "failures": 1, "in_flight": 0}
+
+    async def ok():
+        return 42
+
+    assert asyncio.run(flight.do("k", ok)) == 42
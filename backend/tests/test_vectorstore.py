@@ -1,3 +1,7 @@
+import os
+
+import pytest
+
 from backend.services.vectorstore import retrieve_relevant_clauses
 
 def test_retrieve_default():
@@ -10,3 +14,239 @@ def test_retrieve_with_query():
     text = retrieve_relevant_clauses("confidentiality and limitation")
     assert isinstance(text, str)
     assert len(text) > 0
+
+
+@pytest.mark.parametrize("use_faiss", [False, True])
+def test_persistent_index_reembeds_only_changed_clauses(tmp_path, monkeypatch, use_faiss):
+    np = pytest.importorskip("numpy")
+    if use_faiss:
+        pytest.importorskip("faiss")
+    from backend.services import vectorstore as vs
+    from backend.services.embeddings import EmbeddingProvider, HashedNgramEmbedder
+    from backend.services.ingest import split_clauses
+
+    class CountingRemoteProvider(EmbeddingProvider):
+        name = "fake-remote"
+        remote = True
+        calls = 0
+
+        def __init__(self):
+            self._local = HashedNgramEmbedder(dim=64)
+
+        def embed_documents(self, texts):
+            CountingRemoteProvider.calls += len(texts)
+            return self._local.embed_documents(texts)
+
+        def embed_query(self, text):
+            return self._local.embed_query(text)
+
+    contract = "Clause 9.1 (Confidentiality): keep secrets.\nClause 9.2 (Data Security): protect data.\nClause 10.2 (Limitation of Liability): capped."
+    monkeypatch.setattr(vs, "HAVE_FAISS", use_faiss and vs.HAVE_FAISS)
+    monkeypatch.setattr(vs, "_VECTOR_DIR", str(tmp_path))
+    monkeypatch.setattr(vs, "_INDEX", None)
+    monkeypatch.setattr(vs, "get_embedding_provider", CountingRemoteProvider)
+    monkeypatch.setattr(vs, "_load_contract_chunks", lambda: split_clauses(contract, "msa"))
+
+    vs._ensure_index()
+    assert CountingRemoteProvider.calls == 3
+    assert (tmp_path / "manifest.json").exists()
+
+    # Cold start with an unchanged corpus: zero embedding calls
+    CountingRemoteProvider.calls = 0
+    monkeypatch.setattr(vs, "_INDEX", None)
+    vs._ensure_index()
+    assert CountingRemoteProvider.calls == 0
+    assert len(vs._INDEX) == 3
+    assert "Clause 9.2" in vs.retrieve_relevant_clauses("data security", k=1)
+
+    # One edited clause: only it is re-embedded
+    contract = contract.replace("capped.", "capped at fees paid.")
+    monkeypatch.setattr(vs, "_INDEX", None)
+    vs._ensure_index()
+    assert CountingRemoteProvider.calls == 1
+    docs = vs._read_manifest()["docs"]
+    assert sorted(d["metadata"]["clause_number"] for d in docs) == ["10.2", "9.1", "9.2"]
+    assert any("capped at fees paid" in d["text"] for d in docs)
+
+
+def test_query_caches_hit_and_follow_manifest_changes(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    from backend.services import vectorstore as vs
+    from backend.services.embeddings import EmbeddingProvider, HashedNgramEmbedder
+    from backend.services.ingest import split_clauses
+
+    class RemoteProvider(EmbeddingProvider):
+        name = "fake-remote"
+        remote = True
+        query_calls = 0
+
+        def __init__(self):
+            self._local = HashedNgramEmbedder(dim=64)
+
+        def embed_documents(self, texts):
+            return self._local.embed_documents(texts)
+
+        def embed_query(self, text):
+            RemoteProvider.query_calls += 1
+            return self._local.embed_query(text)
+
+    contract = "Clause 9.1 (Confidentiality): keep secrets.\nClause 9.2 (Data Security): protect data."
+    monkeypatch.setattr(vs, "_VECTOR_DIR", str(tmp_path))
+    monkeypatch.setattr(vs, "_INDEX", None)
+    monkeypatch.setattr(vs, "_MANIFEST_CHECK_INTERVAL", 0.0)
+    monkeypatch.setattr(vs, "get_embedding_provider", RemoteProvider)
+    monkeypatch.setattr(vs, "_load_contract_chunks", lambda: split_clauses(contract, "msa"))
+
+    first = vs.retrieve_relevant_clauses("data security", k=1, mode="dense")
+    assert vs.retrieve_relevant_clauses("data security", k=1, mode="dense") == first
+    # Same query, different k: result cache misses but the embedding is reused
+    vs.retrieve_relevant_clauses("data security", k=2, mode="dense")
+    assert RemoteProvider.query_calls == 1
+    stats = vs.retrieval_cache_stats()
+    assert stats["results"]["hits"] >= 1
+    assert stats["embeddings"]["hits"] >= 1
+    version = stats["index_version"]
+
+    # Another worker rewrites the manifest with an extra clause
+    contract += "\nClause 10.2 (Limitation of Liability): capped."
+    other = vs._open_index()
+    assert other.version != version
+    assert "Clause 10.2" in vs.retrieve_relevant_clauses("limitation of liability", k=1, mode="dense")
+    assert vs.retrieval_cache_stats()["index_version"] == other.version
+
+
+def test_local_index_follows_contract_edits(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    from backend.services import vectorstore as vs
+    from backend.services.embeddings import HashedNgramEmbedder
+
+    contract = tmp_path / "msa.txt"
+    contract.write_text("Clause 9.1 (Confidentiality): keep secrets.\nClause 9.2 (Data Security): protect data.\n")
+    monkeypatch.setattr(vs, "_CONTRACT_DIR", str(tmp_path))
+    monkeypatch.setattr(vs, "_INDEX", None)
+    monkeypatch.setattr(vs, "_MANIFEST_CHECK_INTERVAL", 0.0)
+    monkeypatch.setattr(vs, "get_embedding_provider", lambda: HashedNgramEmbedder(dim=1024))
+
+    assert "Termination" not in vs.retrieve_relevant_clauses("termination notice period", k=3)
+    with contract.open("a") as f:
+        f.write("Clause 12.1 (Termination): either party may terminate on 30 days notice.\n")
+    assert vs.retrieve_relevant_clauses("termination notice period", k=1).startswith("Clause 12.1")
+    # A new file is picked up as well, and a removed one drops out
+    (tmp_path / "sow.txt").write_text("Clause 3.1 (Deliverables): monthly status reports.\n")
+    assert vs.retrieve_relevant_clauses("monthly status reports", k=1).startswith("Clause 3.1")
+    contract.unlink()
+    assert "Clause 12.1" not in vs.retrieve_relevant_clauses("termination notice period", k=3)
+
+
+def test_local_embedder_ranks_clauses_offline(monkeypatch):
+    pytest.importorskip("numpy")
+    from backend.services import vectorstore as vs
+    from backend.services.embeddings import HashedNgramEmbedder
+
+    monkeypatch.setattr(vs, "_INDEX", None)
+    monkeypatch.setattr(vs, "get_embedding_provider", lambda: HashedNgramEmbedder(dim=1024))
+    assert vs.retrieve_relevant_clauses("limitation of liability for damages", k=1).startswith("Clause 10.2")
+    assert vs.retrieve_relevant_clauses("confidential information disclosure", k=1).startswith("Clause 9.1")
+    top2 = vs.retrieve_relevant_clauses("data security", k=2)
+    assert top2.startswith("Clause 9.2") and top2.count("Clause") == 2
+
+
+def test_split_clauses_metadata():
+    from backend.services.ingest import load_corpus, split_clauses
+
+    chunks = load_corpus(os.path.join(os.path.dirname(__file__), "..", "contract"))
+    assert [(c.contract_id, c.clause_number) for c in chunks] == [
+        ("default_snippet", "9.1"), ("default_snippet", "9.2"), ("default_snippet", "10.2"),
+    ]
+    assert chunks[2].title == "Limitation of Liability"
+    assert chunks[2].text.startswith("Clause 10.2")
+
+    parts = split_clauses("Recitals.\n\nCLAUSE 12 - Termination. Either party may terminate.", "sow-7")
+    assert [(c.clause_number, c.title) for c in parts] == [("", "preamble"), ("12", "Termination")]
+    assert split_clauses("No headings here.", "memo")[0].clause_number == ""
+
+
+def test_bm25_pruned_search_matches_exhaustive():
+    pytest.importorskip("numpy")
+    import random
+    from backend.services.bm25 import BM25Index, tokenize
+
+    rng = random.Random(3)
+    vocab = [f"w{i}" for i in range(300)]
+    weights = [1.0 / (i + 1) for i in range(300)]
+    texts = [" ".join(rng.choices(vocab, weights=weights, k=rng.randint(5, 40))) for _ in range(3000)]
+    index = BM25Index(texts, min_depth=8)
+    for _ in range(200):
+        query = " ".join(rng.sample(vocab[:60], rng.randint(2, 4)))
+        terms = [index._postings[t] for t in set(tokenize(query)) if t in index._postings]
+        got = [score for _, score in index.search(query, 5)]
+        want = [score for _, score in index._search_exhaustive(terms, 5)]
+        assert got == pytest.approx(want, rel=1e-5)
+
+
+def test_sparse_and_hybrid_retrieval_match_clause_numbers(monkeypatch):
+    pytest.importorskip("numpy")
+    from backend.services import vectorstore as vs
+    from backend.services.embeddings import HashedNgramEmbedder
+
+    monkeypatch.setattr(vs, "_INDEX", None)
+    monkeypatch.setattr(vs, "get_embedding_provider", lambda: HashedNgramEmbedder(dim=1024))
+    assert vs.retrieve_relevant_clauses("what does 10.2 say", k=1, mode="sparse").startswith("Clause 10.2")
+    assert vs.retrieve_relevant_clauses("clause 9.2", k=1, mode="hybrid").startswith("Clause 9.2")
+    with pytest.raises(ValueError):
+        vs.retrieve_relevant_clauses("x", mode="bogus")
+
+
+def test_async_retrieval_does_not_block_event_loop(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    import asyncio
+    import time
+    from backend.services import vectorstore as vs
+    from backend.services.embeddings import EmbeddingProvider, HashedNgramEmbedder
+    from backend.services.ingest import split_clauses
+
+    class SlowRemoteProvider(EmbeddingProvider):
+        name = "slow-remote"
+        remote = True
+
+        def __init__(self):
+            self._local = HashedNgramEmbedder(dim=64)
+
+        def embed_documents(self, texts):
+            return self._local.embed_documents(texts)
+
+        def embed_query(self, text):
+            time.sleep(0.2)  # a blocking network round trip
+            return self._local.embed_query(text)
+
+    contract = "Clause 9.1 (Confidentiality): keep secrets.\nClause 9.2 (Data Security): protect data."
+    monkeypatch.setattr(vs, "_VECTOR_DIR", str(tmp_path))
+    monkeypatch.setattr(vs, "_INDEX", None)
+    monkeypatch.setattr(vs, "get_embedding_provider", SlowRemoteProvider)
+    monkeypatch.setattr(vs, "_load_contract_chunks", lambda: split_clauses(contract, "msa"))
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        queries = ["data security", "confidential secrets", "protect data", "keep secrets"]
+        start = time.perf_counter()
+        results = await asyncio.gather(*(vs.aretrieve_relevant_clauses(q, k=1, mode="dense") for q in queries))
+        elapsed = time.perf_counter() - start
+        task.cancel()
+        return ticks, elapsed, results
+
+    ticks, elapsed, results = asyncio.run(main())
+    # Four 200ms embeddings ran concurrently off the loop, which kept ticking
+    assert elapsed < 0.6
+    assert ticks >= 10
+    assert "Clause 9.2" in results[0]
+    assert results == [vs.retrieve_relevant_clauses(q, k=1, mode="dense") for q in
+                       ["data security", "confidential secrets", "protect data", "keep secrets"]]
+    assert asyncio.run(vs.aretrieve_relevant_clauses("")) == vs._default_snippet()